@@ -501,6 +501,12 @@ ETHEREUM_ACCOUNT_MODEL = os.getenv(
 
 BLOCKCHAIN_NETWORK_ID = os.getenv("HUB20_BLOCKCHAIN_NETWORK_ID")
 BLOCKCHAIN_START_BLOCK_NUMBER = os.getenv("HUB20_BLOCKCHAIN_STARTING_BLOCK")
+BLOCKCHAIN_BLOCK_STORE_PATH = os.getenv("HUB20_BLOCKCHAIN_BLOCK_STORE_PATH")
+BLOCKCHAIN_INGEST_MODE = os.getenv("HUB20_BLOCKCHAIN_INGEST_MODE", "full")
+BLOCKCHAIN_WATCHED_ADDRESSES_LOADER = "hub20.apps.ethereum_money.client.get_watched_address_sets"
+BLOCKCHAIN_PROVIDER_POOL_URIS = [
+    uri for uri in os.getenv("HUB20_BLOCKCHAIN_PROVIDER_POOL_URIS", "").split(",") if uri
+]
 
 
 ETHEREUM_MONEY_TRACKED_TOKENS = [t for t in os.getenv("HUB20_TRACKED_TOKENS", "").split(",") if t]
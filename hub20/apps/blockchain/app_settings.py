@@ -4,3 +4,24 @@ START_BLOCK_NUMBER = int(getattr(settings, "BLOCKCHAIN_START_BLOCK_NUMBER", 0) o
 BLOCK_SCAN_RANGE = int(getattr(settings, "BLOCKCHAIN_SCAN_BLOCK_RANGE", 0) or 5000)
 FETCH_BLOCK_TASK_PRIORITY = int(getattr(settings, "BLOCKCHAIN_FETCH_BLOCK_PRIORITY", 0) or 9)
 DEFAULT_GAS_PRICE_GWEI = float(getattr(settings, "BLOCKCHAIN_DEFAULT_GAS_PRICE_GWEI", 0) or 1.2)
+RPC_BATCH_SIZE = int(getattr(settings, "BLOCKCHAIN_RPC_BATCH_SIZE", 0) or 100)
+RPC_CACHE_SIZE = int(getattr(settings, "BLOCKCHAIN_RPC_CACHE_SIZE", 0) or 2048)
+BLOCK_STORE_PATH = getattr(settings, "BLOCKCHAIN_BLOCK_STORE_PATH", None)
+BLOCK_STORE_SEGMENT_SIZE = int(
+    getattr(settings, "BLOCKCHAIN_BLOCK_STORE_SEGMENT_SIZE", 0) or 2**30
+)
+BLOCK_STORE_CONFIRMATIONS = int(getattr(settings, "BLOCKCHAIN_BLOCK_STORE_CONFIRMATIONS", 0) or 64)
+GAS_PRICE_HISTORY_SIZE = int(getattr(settings, "BLOCKCHAIN_GAS_PRICE_HISTORY_SIZE", 0) or 100)
+PARTITION_SIZE = int(getattr(settings, "BLOCKCHAIN_PARTITION_SIZE", 0) or 1_000_000)
+INGEST_MODE = getattr(settings, "BLOCKCHAIN_INGEST_MODE", None) or "full"
+WATCHED_ADDRESSES_LOADER = getattr(settings, "BLOCKCHAIN_WATCHED_ADDRESSES_LOADER", None)
+PROVIDER_POOL_URIS = getattr(settings, "BLOCKCHAIN_PROVIDER_POOL_URIS", None) or []
+PROVIDER_HEALTH_CHECK_INTERVAL = int(
+    getattr(settings, "BLOCKCHAIN_PROVIDER_HEALTH_CHECK_INTERVAL", 0) or 30
+)
+PROVIDER_POOL_CONNECTIONS = int(getattr(settings, "BLOCKCHAIN_PROVIDER_POOL_CONNECTIONS", 0) or 10)
+PROVIDER_POOL_MAX_BLOCK_LAG = int(
+    getattr(settings, "BLOCKCHAIN_PROVIDER_POOL_MAX_BLOCK_LAG", 0) or 3
+)
+NONCE_SYNC_INTERVAL = int(getattr(settings, "BLOCKCHAIN_NONCE_SYNC_INTERVAL", 0) or 30)
+NONCE_DROP_TIMEOUT = int(getattr(settings, "BLOCKCHAIN_NONCE_DROP_TIMEOUT", 0) or 600)
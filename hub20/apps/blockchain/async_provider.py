@@ -0,0 +1,491 @@
+import asyncio
+import itertools
+import json
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import aiohttp
+import websockets
+from hexbytes import HexBytes
+from web3 import Web3
+from web3._utils.method_formatters import log_entry_formatter
+from web3.datastructures import AttributeDict
+from web3.providers import HTTPProvider, WebsocketProvider
+
+from .app_settings import RPC_BATCH_SIZE
+from .batch import (
+    BLOCK_RECEIPTS_SUPPORT,
+    _chunks,
+    _format_result,
+    _get_tx_hashes,
+    _is_unsupported_method_error,
+    get_block_receipts as batch_get_block_receipts,
+)
+from .provider_pool import ProviderPool
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT = 30  # In seconds
+RECONNECT_INTERVAL = 5  # In seconds
+REQUEST_COUNTER = itertools.count()
+
+# Adaptive eth_getLogs ranges grow while queries return less than half of this
+LOG_RANGE_TARGET_RESULTS = 1000
+MAX_LOG_RANGE = 100_000
+# Fragments of the errors of nodes that refuse eth_getLogs queries for being too large
+LOG_QUERY_LIMIT_ERRORS = (
+    "more than",
+    "too many",
+    "limit exceeded",
+    "response size",
+    "too large",
+    "timeout",
+    "block range",
+)
+
+
+class RPCError(Exception):
+    pass
+
+
+def _make_payload(method: str, params: Sequence) -> Dict:
+    request_id = next(REQUEST_COUNTER)
+    return {"jsonrpc": "2.0", "method": method, "params": list(params), "id": request_id}
+
+
+def _format_header(header: Dict) -> AttributeDict:
+    return _format_result("eth_getBlockByHash", header)
+
+
+def _format_log(log: Dict) -> AttributeDict:
+    return AttributeDict.recursive(log_entry_formatter(log))
+
+
+SUBSCRIPTION_FORMATTERS: Dict[str, Callable] = {"newHeads": _format_header, "logs": _format_log}
+
+
+class BaseAsyncProvider:
+    endpoint_uri: str
+
+    async def send(self, payload: Union[Dict, List[Dict]]) -> Any:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    async def make_request(self, method: str, params: Sequence) -> Dict:
+        return await self.send(_make_payload(method, params))
+
+    async def make_batch_request(self, method: str, params_list: Sequence[Tuple]) -> List[Dict]:
+        payload = [_make_payload(method, params) for params in params_list]
+        if not payload:
+            return []
+
+        responses = await self.send(payload)
+        if not isinstance(responses, list):
+            raise RPCError(responses.get("error", responses))
+
+        responses_by_id = {response.get("id"): response for response in responses}
+        return [responses_by_id.get(request["id"], {}) for request in payload]
+
+    def __str__(self):
+        return self.endpoint_uri
+
+
+class AsyncHTTPProvider(BaseAsyncProvider):
+    def __init__(self, endpoint_uri: str, timeout: int = REQUEST_TIMEOUT):
+        self.endpoint_uri = endpoint_uri
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=self.timeout, raise_for_status=True)
+        return self._session
+
+    async def send(self, payload):
+        session = await self._get_session()
+        async with session.post(self.endpoint_uri, json=payload) as response:
+            return await response.json(content_type=None)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+class AsyncWebsocketProvider(BaseAsyncProvider):
+    def __init__(self, endpoint_uri: str, timeout: int = REQUEST_TIMEOUT):
+        self.endpoint_uri = endpoint_uri
+        self.timeout = timeout
+        self._connection = None
+        self._connection_lock: Optional[asyncio.Lock] = None
+        self._reader: Optional[asyncio.Future] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._subscriptions: Dict[str, asyncio.Queue] = {}
+
+    async def _connect(self):
+        if self._connection_lock is None:
+            self._connection_lock = asyncio.Lock()
+
+        async with self._connection_lock:
+            if self._connection is None or self._connection.closed:
+                logger.info(f"Connecting to {self.endpoint_uri}")
+                self._connection = await websockets.connect(self.endpoint_uri, max_size=None)
+                self._reader = asyncio.ensure_future(self._read_messages(self._connection))
+        return self._connection
+
+    def _get_subscription_queue(self, subscription_id: str) -> asyncio.Queue:
+        # Notifications may arrive before the subscriber gets to register its queue
+        return self._subscriptions.setdefault(subscription_id, asyncio.Queue())
+
+    def _dispatch(self, message: Dict):
+        if message.get("method") == "eth_subscription":
+            params = message["params"]
+            self._get_subscription_queue(params["subscription"]).put_nowait(params["result"])
+            return
+
+        future = self._pending.pop(message.get("id"), None)
+        if future is not None and not future.done():
+            future.set_result(message)
+
+    async def _read_messages(self, connection):
+        try:
+            async for raw_message in connection:
+                message = json.loads(raw_message)
+                for item in message if isinstance(message, list) else [message]:
+                    self._dispatch(item)
+        except websockets.ConnectionClosed:
+            logger.warning(f"Connection to {self.endpoint_uri} closed")
+        finally:
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"{self.endpoint_uri} disconnected"))
+
+    async def send(self, payload):
+        connection = await self._connect()
+        requests = payload if isinstance(payload, list) else [payload]
+
+        loop = asyncio.get_event_loop()
+        futures = [loop.create_future() for _ in requests]
+        self._pending.update({request["id"]: future for request, future in zip(requests, futures)})
+
+        await connection.send(json.dumps(payload))
+        responses = await asyncio.wait_for(asyncio.gather(*futures), timeout=self.timeout)
+        return list(responses) if isinstance(payload, list) else responses[0]
+
+    async def _read_subscription(self, subscription_id: str) -> AsyncIterator[Dict]:
+        queue = self._get_subscription_queue(subscription_id)
+        reader = self._reader
+        try:
+            while True:
+                next_item = asyncio.ensure_future(queue.get())
+                await asyncio.wait({next_item, reader}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_item.done():
+                    next_item.cancel()
+                    raise ConnectionError(f"{self.endpoint_uri} disconnected")
+                yield next_item.result()
+        finally:
+            self._subscriptions.pop(subscription_id, None)
+
+    async def subscribe(self, subscription_type: str, *params) -> AsyncIterator:
+        """
+        Yields the (formatted) notifications of an `eth_subscribe` call.
+        Whenever the connection drops, it reconnects and subscribes again,
+        so notifications sent while disconnected are lost and callers that
+        can not afford that need to catch up on their own.
+        """
+        formatter = SUBSCRIPTION_FORMATTERS.get(subscription_type, lambda result: result)
+        subscription_id = None
+
+        try:
+            while True:
+                try:
+                    subscription_id = await request(
+                        self, "eth_subscribe", subscription_type, *params
+                    )
+                    logger.info(f"Subscribed to {subscription_type} on {self.endpoint_uri}")
+                    async for result in self._read_subscription(subscription_id):
+                        yield formatter(result)
+                except (
+                    ConnectionError,
+                    OSError,
+                    asyncio.TimeoutError,
+                    websockets.WebSocketException,
+                ):
+                    subscription_id = None
+                    logger.warning(
+                        f"Lost {subscription_type} subscription on {self.endpoint_uri}, "
+                        f"reconnecting in {RECONNECT_INTERVAL} seconds"
+                    )
+                    await asyncio.sleep(RECONNECT_INTERVAL)
+        finally:
+            # Subscribers that stop listening (e.g, to change the filter) cancel it on the node
+            if subscription_id is not None:
+                await self._unsubscribe(subscription_id)
+
+    async def _unsubscribe(self, subscription_id: str):
+        try:
+            if self._connection is not None and not self._connection.closed:
+                await request(self, "eth_unsubscribe", subscription_id)
+        except (
+            RPCError,
+            ConnectionError,
+            OSError,
+            asyncio.TimeoutError,
+            websockets.WebSocketException,
+        ):
+            logger.info(f"Could not cancel subscription {subscription_id} on {self.endpoint_uri}")
+        finally:
+            self._subscriptions.pop(subscription_id, None)
+
+    async def close(self):
+        if self._connection is not None:
+            await self._connection.close()
+
+
+class AsyncExecutorProvider(BaseAsyncProvider):
+    """
+    Runs the requests from a synchronous web3 provider (e.g, IPC) on an
+    executor thread, so that at least they do not block the event loop.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.endpoint_uri = str(provider)
+
+    async def send(self, payload):
+        loop = asyncio.get_event_loop()
+        requests = payload if isinstance(payload, list) else [payload]
+        responses = await asyncio.gather(
+            *(
+                loop.run_in_executor(None, self.provider.make_request, r["method"], r["params"])
+                for r in requests
+            )
+        )
+        # The sync provider assigns its own request ids, so we restore ours
+        responses = [{**response, "id": r["id"]} for response, r in zip(responses, requests)]
+        return responses if isinstance(payload, list) else responses[0]
+
+
+def make_async_provider(w3: Web3) -> BaseAsyncProvider:
+    provider = w3.provider
+    if isinstance(provider, HTTPProvider):
+        return AsyncHTTPProvider(provider.endpoint_uri)
+    if isinstance(provider, WebsocketProvider):
+        return AsyncWebsocketProvider(provider.endpoint_uri)
+    return AsyncExecutorProvider(provider)
+
+
+def _get_result(method: str, response: Dict) -> Any:
+    if "error" in response:
+        raise RPCError(response["error"])
+    return _format_result(method, response.get("result"))
+
+
+async def request(provider: BaseAsyncProvider, method: str, *params) -> Any:
+    return _get_result(method, await provider.make_request(method, params))
+
+
+async def batch_request(
+    provider: BaseAsyncProvider, method: str, params_list: Sequence[Tuple]
+) -> List[Any]:
+    results: List[Any] = []
+    for chunk in _chunks(params_list, RPC_BATCH_SIZE):
+        responses = await provider.make_batch_request(method, chunk)
+        results.extend(_get_result(method, response) for response in responses)
+    return results
+
+
+async def get_chain_id(provider: BaseAsyncProvider) -> int:
+    return int(await request(provider, "net_version"))
+
+
+async def get_block_number(provider: BaseAsyncProvider) -> int:
+    return await request(provider, "eth_blockNumber")
+
+
+async def is_syncing(provider: BaseAsyncProvider) -> bool:
+    return bool(await request(provider, "eth_syncing"))
+
+
+async def get_block(provider: BaseAsyncProvider, block_identifier, full_transactions=False):
+    if isinstance(block_identifier, int):
+        return await request(
+            provider, "eth_getBlockByNumber", hex(block_identifier), full_transactions
+        )
+    block_hash = HexBytes(block_identifier).hex()
+    return await request(provider, "eth_getBlockByHash", block_hash, full_transactions)
+
+
+async def get_transactions(provider: BaseAsyncProvider, transaction_hashes: Sequence) -> List:
+    params = [(HexBytes(tx_hash).hex(),) for tx_hash in transaction_hashes]
+    return await batch_request(provider, "eth_getTransactionByHash", params)
+
+
+async def new_pending_transaction_filter(provider: BaseAsyncProvider) -> str:
+    return await request(provider, "eth_newPendingTransactionFilter")
+
+
+async def get_filter_changes(provider: BaseAsyncProvider, filter_id: str) -> List:
+    return await request(provider, "eth_getFilterChanges", filter_id)
+
+
+async def _poll_filter(
+    provider: BaseAsyncProvider, method: str, params: Sequence, poll_interval: float
+) -> AsyncIterator:
+    filter_id = None
+    while True:
+        try:
+            if filter_id is None:
+                filter_id = await request(provider, method, *params)
+            else:
+                await asyncio.sleep(poll_interval)
+
+            for entry in await get_filter_changes(provider, filter_id):
+                yield entry
+        except RPCError as exc:
+            # Nodes drop filters that have not been polled for a while, so we need a new one
+            logger.info(f"Filter {filter_id} on {provider} failed ({exc}), installing a new one")
+            filter_id = None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            logger.warning(f"Failed to poll {provider}: {exc}")
+            await asyncio.sleep(poll_interval)
+
+
+async def block_hash_stream(
+    provider: BaseAsyncProvider, poll_interval: float
+) -> AsyncIterator[HexBytes]:
+    """
+    Yields the hash of every new block, pushed by a `newHeads`
+    subscription on websocket providers or polled from a block filter
+    every `poll_interval` seconds otherwise.
+    """
+    if isinstance(provider, AsyncWebsocketProvider):
+        async for header in provider.subscribe("newHeads"):
+            yield header.hash
+    else:
+        async for block_hash in _poll_filter(provider, "eth_newBlockFilter", (), poll_interval):
+            yield block_hash
+
+
+async def log_stream(
+    provider: BaseAsyncProvider, filter_params: Dict, poll_interval: float
+) -> AsyncIterator[AttributeDict]:
+    """
+    Yields the logs matching `filter_params` (address/topics), with a
+    `logs` subscription on websocket providers or by polling a log
+    filter every `poll_interval` seconds otherwise.
+    """
+    if isinstance(provider, AsyncWebsocketProvider):
+        async for log in provider.subscribe("logs", filter_params):
+            yield log
+    else:
+        async for log in _poll_filter(provider, "eth_newFilter", (filter_params,), poll_interval):
+            yield log
+
+
+async def get_logs(provider: BaseAsyncProvider, filter_params: Dict) -> List[AttributeDict]:
+    return await request(provider, "eth_getLogs", filter_params)
+
+
+def _is_log_query_limit_error(exc: RPCError) -> bool:
+    error = exc.args[0] if exc.args else None
+    message = str(error.get("message", "") if isinstance(error, dict) else error).lower()
+    return any(fragment in message for fragment in LOG_QUERY_LIMIT_ERRORS)
+
+
+async def log_range_stream(
+    provider: BaseAsyncProvider,
+    filter_params: Dict,
+    start: int,
+    end: int,
+    range_size: int,
+    max_range_size: int = MAX_LOG_RANGE,
+) -> AsyncIterator[Tuple[int, int, List[AttributeDict]]]:
+    """
+    Yields (lower, upper, logs) with the logs matching `filter_params`
+    (address/topics) for consecutive block ranges covering `start` to
+    `end` (exclusive), so that only the logs of one range are in memory
+    at a time.
+
+    Ranges that the node rejects for being too large are split in half
+    and tried again. After ranges with few logs, the next one doubles,
+    but never back to a size that was rejected, until a range without
+    any logs shows that the busy stretch of the chain is over.
+    """
+    ceiling = max_range_size
+    lower = start
+    while lower < end:
+        upper = min(lower + range_size, end)
+        params = {**filter_params, "fromBlock": hex(lower), "toBlock": hex(upper - 1)}
+        try:
+            logs = await get_logs(provider, params)
+        except (RPCError, asyncio.TimeoutError) as exc:
+            is_limit_error = not isinstance(exc, RPCError) or _is_log_query_limit_error(exc)
+            if not is_limit_error or range_size == 1:
+                raise
+            ceiling = range_size
+            range_size = max(range_size // 2, 1)
+            logger.info(f"eth_getLogs from {lower} to {upper} failed ({exc}), trying {range_size}")
+            continue
+
+        logs = logs or []
+        yield lower, upper, logs
+        lower = upper
+        if not logs:
+            ceiling = max_range_size
+        if len(logs) < LOG_RANGE_TARGET_RESULTS // 2:
+            range_size = max(min(range_size * 2, ceiling - 1), 1)
+
+
+async def get_block_receipts(provider: BaseAsyncProvider, block_data) -> Dict:
+    """
+    Async counterpart of `batch.get_block_receipts` for a single block:
+    returns {transaction hash: receipt} with whatever the node provided.
+    """
+    if isinstance(provider, AsyncExecutorProvider) and isinstance(provider.provider, ProviderPool):
+        # Requests go to any endpoint of the pool, which tracks the support of each one
+        loop = asyncio.get_event_loop()
+        receipts_by_block = await loop.run_in_executor(
+            None, batch_get_block_receipts, Web3(provider.provider), [block_data]
+        )
+        return receipts_by_block[HexBytes(block_data.hash)]
+
+    if BLOCK_RECEIPTS_SUPPORT.get(provider.endpoint_uri, True):
+        try:
+            block_hash = HexBytes(block_data.hash).hex()
+            receipts = await request(provider, "eth_getBlockReceipts", block_hash)
+            return {r.transactionHash: r for r in receipts or [] if r is not None}
+        except RPCError as exc:
+            if not _is_unsupported_method_error(exc):
+                raise
+            logger.info(f"{provider} has no eth_getBlockReceipts, using tx receipts instead")
+            BLOCK_RECEIPTS_SUPPORT[provider.endpoint_uri] = False
+
+    params = [(tx_hash.hex(),) for tx_hash in _get_tx_hashes(block_data)]
+    receipts = await batch_request(provider, "eth_getTransactionReceipt", params)
+    return {r.transactionHash: r for r in receipts if r is not None}
+
+
+__all__ = [
+    "RPCError",
+    "AsyncHTTPProvider",
+    "AsyncWebsocketProvider",
+    "AsyncExecutorProvider",
+    "make_async_provider",
+    "request",
+    "batch_request",
+    "get_chain_id",
+    "get_block_number",
+    "is_syncing",
+    "get_block",
+    "get_transactions",
+    "new_pending_transaction_filter",
+    "get_filter_changes",
+    "block_hash_stream",
+    "log_stream",
+    "get_logs",
+    "log_range_stream",
+    "get_block_receipts",
+]
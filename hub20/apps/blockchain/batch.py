@@ -0,0 +1,271 @@
+import itertools
+import json
+import logging
+from typing import Any, Collection, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3._utils.method_formatters import PYTHONIC_RESULT_FORMATTERS
+from web3._utils.request import make_post_request
+from web3.datastructures import AttributeDict
+from web3.providers import HTTPProvider
+
+from .app_settings import RPC_BATCH_SIZE
+from .provider_pool import ProviderPool
+
+logger = logging.getLogger(__name__)
+
+REQUEST_COUNTER = itertools.count()
+
+RECEIPT_FORMATTER = PYTHONIC_RESULT_FORMATTERS["eth_getTransactionReceipt"]
+RESULT_FORMATTERS = {
+    **PYTHONIC_RESULT_FORMATTERS,
+    "eth_getBlockReceipts": lambda receipts: [RECEIPT_FORMATTER(r) for r in receipts],
+}
+
+# JSON-RPC error code for "method not found"
+METHOD_NOT_FOUND = -32601
+
+BLOCK_RECEIPTS_SUPPORT: Dict[str, bool] = {}
+
+
+class BatchRequestError(Exception):
+    def __init__(self, error, endpoint_uri: Optional[str] = None):
+        # Endpoint that replied with the error
+        self.endpoint_uri = endpoint_uri
+        super().__init__(error)
+
+
+class MissingReceiptsError(Exception):
+    def __init__(self, block_hash, transaction_hashes: Sequence):
+        self.block_hash = HexBytes(block_hash)
+        self.transaction_hashes = [HexBytes(tx_hash) for tx_hash in transaction_hashes]
+        super().__init__(
+            f"{len(self.transaction_hashes)} receipt(s) not available for block "
+            f"{self.block_hash.hex()}"
+        )
+
+
+def _chunks(items: Sequence, size: int) -> Iterable[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _format_result(method: str, result: Any) -> Any:
+    if result is None:
+        return None
+
+    # Same as geth_poa_middleware, which is bypassed when we talk to the provider directly
+    if method in ("eth_getBlockByNumber", "eth_getBlockByHash") and "extraData" in result:
+        result["proofOfAuthorityData"] = HexBytes(result.pop("extraData"))
+
+    formatter = RESULT_FORMATTERS.get(method)
+    formatted = formatter(result) if formatter else result
+    return AttributeDict.recursive(formatted)
+
+
+def _get_provider_uri(provider) -> str:
+    return str(getattr(provider, "endpoint_uri", None) or provider)
+
+
+def _get_endpoint_uris(provider) -> List[str]:
+    if isinstance(provider, ProviderPool):
+        return [endpoint.uri for endpoint in provider.endpoints]
+    return [_get_provider_uri(provider)]
+
+
+def _get_response_result(response: dict, endpoint_uri: Optional[str] = None) -> Any:
+    if "error" in response:
+        raise BatchRequestError(response["error"], endpoint_uri=endpoint_uri)
+    return response.get("result")
+
+
+def _send_batch(
+    w3: Web3, method: str, params_list: Sequence[Tuple], exclude_endpoints: Collection[str] = ()
+) -> List[Any]:
+    provider = w3.provider
+    endpoint_uri = _get_provider_uri(provider)
+
+    if not isinstance(provider, (HTTPProvider, ProviderPool)):
+        # Websocket and IPC providers do not take batches, so we just go one by one
+        return [
+            _get_response_result(provider.make_request(method, list(params)), endpoint_uri)
+            for params in params_list
+        ]
+
+    request_ids = [next(REQUEST_COUNTER) for _ in params_list]
+    payload = [
+        {"jsonrpc": "2.0", "method": method, "params": list(params), "id": request_id}
+        for request_id, params in zip(request_ids, params_list)
+    ]
+
+    if isinstance(provider, ProviderPool):
+        endpoint_uri, responses = provider.send_batch(payload, exclude=exclude_endpoints)
+    else:
+        raw_response = make_post_request(
+            provider.endpoint_uri, json.dumps(payload).encode(), **provider.get_request_kwargs()
+        )
+        responses = json.loads(raw_response)
+
+    if not isinstance(responses, list):
+        # Nodes that do not support batches reply with a single error object
+        raise BatchRequestError(responses.get("error", responses), endpoint_uri=endpoint_uri)
+
+    results_by_id = {response.get("id"): response for response in responses}
+    try:
+        return [
+            _get_response_result(results_by_id[request_id], endpoint_uri)
+            for request_id in request_ids
+        ]
+    except KeyError as exc:
+        raise BatchRequestError(f"Missing response for request {exc}", endpoint_uri=endpoint_uri)
+
+
+def _send_chunk(
+    w3: Web3, method: str, params_list: Sequence[Tuple], exclude_endpoints: Collection[str]
+) -> List[Any]:
+    try:
+        return _send_batch(w3, method, params_list, exclude_endpoints)
+    except BatchRequestError as exc:
+        # Unsupported methods fail on every call, only single calls are worth failing on
+        if len(params_list) == 1 or _is_unsupported_method_error(exc):
+            raise
+
+        logger.info(f"Batch of {len(params_list)} {method} calls failed ({exc}), splitting it")
+        middle = len(params_list) // 2
+        return _send_chunk(w3, method, params_list[:middle], exclude_endpoints) + _send_chunk(
+            w3, method, params_list[middle:], exclude_endpoints
+        )
+
+
+def make_batch_request(
+    w3: Web3,
+    method: str,
+    params_list: Sequence[Tuple],
+    batch_size: Optional[int] = None,
+    exclude_endpoints: Collection[str] = (),
+) -> List[Any]:
+    """
+    Sends one JSON-RPC call of `method` for each entry of `params_list`,
+    grouping them in batches of at most `batch_size` calls per HTTP
+    request. Results are returned in the same order as `params_list`,
+    formatted in the same way that the Web3 methods would do.
+
+    Batches that fail (e.g, because of a single bad call, or because the
+    node does not answer all of them) are split in halves and sent
+    again, down to the calls that fail on their own.
+
+    With a provider pool, batches are not sent to `exclude_endpoints`.
+    """
+    batch_size = batch_size or RPC_BATCH_SIZE
+
+    results: List[Any] = []
+    for chunk in _chunks(params_list, batch_size):
+        logger.debug(f"Sending batch of {len(chunk)} {method} calls")
+        results.extend(
+            _format_result(method, result)
+            for result in _send_chunk(w3, method, chunk, exclude_endpoints)
+        )
+    return results
+
+
+def get_blocks_by_number(
+    w3: Web3, block_numbers: Sequence[int], full_transactions: bool = True
+) -> List[Optional[AttributeDict]]:
+    params = [(hex(number), full_transactions) for number in block_numbers]
+    return make_batch_request(w3, "eth_getBlockByNumber", params)
+
+
+def get_blocks_by_hash(
+    w3: Web3, block_hashes: Sequence, full_transactions: bool = False
+) -> List[Optional[AttributeDict]]:
+    params = [(HexBytes(block_hash).hex(), full_transactions) for block_hash in block_hashes]
+    return make_batch_request(w3, "eth_getBlockByHash", params)
+
+
+def get_transactions(w3: Web3, transaction_hashes: Sequence) -> List[Optional[AttributeDict]]:
+    params = [(HexBytes(tx_hash).hex(),) for tx_hash in transaction_hashes]
+    return make_batch_request(w3, "eth_getTransactionByHash", params)
+
+
+def get_transaction_receipts(
+    w3: Web3, transaction_hashes: Sequence
+) -> List[Optional[AttributeDict]]:
+    params = [(HexBytes(tx_hash).hex(),) for tx_hash in transaction_hashes]
+    return make_batch_request(w3, "eth_getTransactionReceipt", params)
+
+
+def _get_tx_hashes(block_data) -> List[HexBytes]:
+    # Blocks may have been fetched with or without full transaction data
+    return [
+        HexBytes(tx) if isinstance(tx, (bytes, str)) else tx.hash for tx in block_data.transactions
+    ]
+
+
+def _is_unsupported_method_error(exc: BatchRequestError) -> bool:
+    error = exc.args[0] if exc.args else None
+    if not isinstance(error, dict):
+        return False
+    message = str(error.get("message", "")).lower()
+    return error.get("code") == METHOD_NOT_FOUND or "not supported" in message
+
+
+def _get_receipts_by_block(w3: Web3, blocks: Sequence) -> List[Optional[List]]:
+    # Support is tracked per endpoint, as the endpoints of a pool may run different nodes
+    unsupported = {uri for uri, supported in BLOCK_RECEIPTS_SUPPORT.items() if not supported}
+
+    if not set(_get_endpoint_uris(w3.provider)) <= unsupported:
+        try:
+            params = [(HexBytes(block_data.hash).hex(),) for block_data in blocks]
+            return make_batch_request(
+                w3, "eth_getBlockReceipts", params, exclude_endpoints=unsupported
+            )
+        except BatchRequestError as exc:
+            if not _is_unsupported_method_error(exc):
+                raise
+            logger.info(
+                f"{exc.endpoint_uri} has no eth_getBlockReceipts, using tx receipts instead"
+            )
+            BLOCK_RECEIPTS_SUPPORT[exc.endpoint_uri] = False
+
+    block_tx_hashes = [_get_tx_hashes(block_data) for block_data in blocks]
+    all_receipts = iter(
+        get_transaction_receipts(w3, [h for tx_hashes in block_tx_hashes for h in tx_hashes])
+    )
+    return [[next(all_receipts) for _ in tx_hashes] for tx_hashes in block_tx_hashes]
+
+
+def get_block_receipts(w3: Web3, blocks: Sequence) -> Dict[HexBytes, Dict[HexBytes, Any]]:
+    """
+    Gets the receipts of all transactions from each block, using
+    `eth_getBlockReceipts` when the node supports it and batched
+    `eth_getTransactionReceipt` calls otherwise.
+
+    Returns a mapping of block hash -> {transaction hash: receipt}.
+    Receipts that the node could not provide are left out, so callers
+    should use `check_block_receipts` before recording the block.
+    """
+    result = {}
+    for block_data, receipts in zip(blocks, _get_receipts_by_block(w3, blocks)):
+        receipts_by_hash = {r.transactionHash: r for r in (receipts or []) if r is not None}
+        result[HexBytes(block_data.hash)] = receipts_by_hash
+    return result
+
+
+def check_block_receipts(block_data, tx_receipts: Dict):
+    missing = [tx_hash for tx_hash in _get_tx_hashes(block_data) if tx_hash not in tx_receipts]
+    if missing:
+        raise MissingReceiptsError(block_data.hash, missing)
+
+
+__all__ = [
+    "BatchRequestError",
+    "MissingReceiptsError",
+    "make_batch_request",
+    "get_block_receipts",
+    "check_block_receipts",
+    "get_blocks_by_number",
+    "get_blocks_by_hash",
+    "get_transactions",
+    "get_transaction_receipts",
+]
@@ -0,0 +1,167 @@
+import logging
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+from django.db import connection, models, transaction
+from django.db.models.signals import post_save
+from hexbytes import HexBytes
+from psycopg2.extras import execute_values
+
+from .models import Block, Transaction, TransactionLog
+
+logger = logging.getLogger(__name__)
+
+
+class RecordedBlock(NamedTuple):
+    block: Block
+    created: bool
+    transactions: List[Transaction]
+    logs: List[TransactionLog]
+
+
+def _insert_ignoring_conflicts(
+    model, instances: Sequence[models.Model], conflict_fields: Tuple[str, ...]
+) -> List[Tuple]:
+    """
+    Inserts all instances with one multi-row `INSERT ... ON CONFLICT DO
+    NOTHING` and returns the primary key and conflict columns of the
+    rows that were actually created.
+    """
+    if not instances:
+        return []
+
+    opts = model._meta
+    fields = [f for f in opts.concrete_fields if not isinstance(f, models.AutoField)]
+    quote = connection.ops.quote_name
+
+    columns = ", ".join(quote(f.column) for f in fields)
+    conflict_columns = ", ".join(quote(opts.get_field(name).column) for name in conflict_fields)
+    returning = ", ".join(
+        quote(column)
+        for column in [opts.pk.column] + [opts.get_field(name).column for name in conflict_fields]
+    )
+
+    sql = (
+        f"INSERT INTO {quote(opts.db_table)} ({columns}) VALUES %s "
+        f"ON CONFLICT ({conflict_columns}) DO NOTHING RETURNING {returning}"
+    )
+    rows = [
+        tuple(f.get_db_prep_save(getattr(obj, f.attname), connection) for f in fields)
+        for obj in instances
+    ]
+
+    with connection.cursor() as cursor:
+        return execute_values(cursor.cursor, sql, rows, page_size=len(rows), fetch=True)
+
+
+def _normalize_db_value(value):
+    # bytea columns are returned as memoryview, which is not hashable
+    return bytes(value) if isinstance(value, memoryview) else value
+
+
+def _get_conflict_key(model, obj, conflict_fields: Tuple[str, ...]) -> Tuple:
+    return tuple(
+        model._meta.get_field(name).get_prep_value(
+            getattr(obj, model._meta.get_field(name).attname)
+        )
+        for name in conflict_fields
+    )
+
+
+def _bulk_insert(model, instances: Sequence[models.Model], conflict_fields: Tuple[str, ...]):
+    created_rows = _insert_ignoring_conflicts(model, instances, conflict_fields)
+    pk_by_key = {
+        tuple(_normalize_db_value(value) for value in row[1:]): row[0] for row in created_rows
+    }
+
+    created = []
+    for obj in instances:
+        pk = pk_by_key.get(_get_conflict_key(model, obj, conflict_fields))
+        if pk is not None:
+            obj.pk = model._meta.pk.to_python(pk)
+            obj._state.adding = False
+            created.append(obj)
+    return created
+
+
+def bulk_record_block(block_data, tx_receipts: Dict, chain_id: int) -> RecordedBlock:
+    """
+    Persists a block, all of its (non-reverted) transactions and their
+    logs using one multi-row insert per table. Rows that are already on
+    the database are left untouched and are not part of the result.
+    """
+    with transaction.atomic():
+        block = Block(chain_id=chain_id, hash=block_data.hash, **Block.get_data_fields(block_data))
+        block_created = bool(_bulk_insert(Block, [block], ("chain", "hash", "number")))
+
+        if not block_created:
+            block = Block.objects.get(chain_id=chain_id, hash=block.hash)
+
+        tx_pairs = [
+            (tx_data, tx_receipts[tx_data.hash])
+            for tx_data in block_data.transactions
+            if tx_data.hash in tx_receipts
+        ]
+
+        txs = [
+            Transaction(
+                block=block,
+                block_number=block.number,
+                hash=tx_receipt.transactionHash,
+                **Transaction.get_data_fields(tx_data, tx_receipt),
+            )
+            for tx_data, tx_receipt in tx_pairs
+            if Transaction.is_recordable(tx_data, tx_receipt, block)
+        ]
+        created_txs = _bulk_insert(Transaction, txs, ("block", "hash", "block_number"))
+
+        # Transactions that were already recorded still need to have their logs checked
+        tx_by_hash = {HexBytes(tx.hash): tx for tx in created_txs}
+        existing_hashes = [HexBytes(tx.hash) for tx in txs if HexBytes(tx.hash) not in tx_by_hash]
+        if existing_hashes:
+            existing = Transaction.objects.filter(block=block, hash__in=existing_hashes)
+            tx_by_hash.update({HexBytes(tx.hash): tx for tx in existing})
+
+        tx_logs = [
+            TransactionLog(
+                transaction=tx_by_hash[tx_hash],
+                block_number=block.number,
+                index=log_data.logIndex,
+                **TransactionLog.get_data_fields(log_data),
+            )
+            for tx_hash in tx_by_hash
+            for log_data in tx_receipts[tx_hash].logs
+        ]
+        created_logs = _bulk_insert(
+            TransactionLog, tx_logs, ("transaction", "index", "block_number")
+        )
+
+    logger.debug(
+        f"Block {block}: {len(created_txs)} new transactions and {len(created_logs)} new logs"
+    )
+    return RecordedBlock(
+        block=block, created=block_created, transactions=created_txs, logs=created_logs
+    )
+
+
+def send_created_signals(recorded: RecordedBlock):
+    """
+    Sends the post_save signals that Model.save() would have sent for
+    every row created by `bulk_record_block`, so that handlers get the
+    same notifications as they would on the regular write path.
+    """
+    instances: List[models.Model] = [recorded.block] if recorded.created else []
+    instances.extend(recorded.transactions)
+    instances.extend(recorded.logs)
+
+    for instance in instances:
+        post_save.send(
+            sender=instance.__class__,
+            instance=instance,
+            created=True,
+            update_fields=None,
+            raw=False,
+            using=connection.alias,
+        )
+
+
+__all__ = ["RecordedBlock", "bulk_record_block", "send_created_signals"]
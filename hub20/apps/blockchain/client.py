@@ -1,63 +1,93 @@
 import asyncio
 import logging
-from typing import Optional
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
+import django
 from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.db import transaction
-from django.db.models import Avg
+from django.db import connections, transaction
 from hexbytes import HexBytes
 from web3 import Web3
-from web3.exceptions import TimeExhausted, TransactionNotFound
+from web3.exceptions import BlockNotFound, TransactionNotFound
 from web3.middleware import geth_poa_middleware
 from web3.providers import HTTPProvider, IPCProvider, WebsocketProvider
-from web3.types import TxParams, Wei
 
-from . import signals
-from .app_settings import BLOCK_SCAN_RANGE, DEFAULT_GAS_PRICE_GWEI
-from .models import Block, Chain, Transaction
+from . import async_provider, signals
+from .app_settings import (
+    BLOCK_SCAN_RANGE,
+    BLOCK_STORE_CONFIRMATIONS,
+    PROVIDER_POOL_URIS,
+    RPC_BATCH_SIZE,
+)
+from .batch import (
+    MissingReceiptsError,
+    check_block_receipts,
+    get_block_receipts,
+    get_blocks_by_number,
+)
+from .bulk import bulk_record_block, send_created_signals
+from .gas_price import DEFAULT_PRICE, gas_price_oracle_strategy
+from .ingest_filter import get_ingest_filter
+from .middleware import RPCCacheMiddleware
+from .models import Block, BlockRange, Chain, ListenerCursor, Transaction
+from .nonces import reserve_nonce, send_raw_transaction
+from .provider_pool import ProviderPool
+from .store import get_block_store
 
 BLOCK_CREATION_INTERVAL = 10  # In seconds
-DEFAULT_PRICE = Web3.toWei(DEFAULT_GAS_PRICE_GWEI, "gwei")
+RECEIPT_FETCH_ATTEMPTS = 3
+RECEIPT_RETRY_INTERVAL = 1  # In seconds
+# Blocks that a listener goes back when the block of its cursor was reorged out
+CURSOR_REORG_DEPTH = 12
 WEB3_CLIENTS = {}
 
 logger = logging.getLogger(__name__)
 
 
-def database_history_gas_price_strategy(w3: Web3, params: TxParams = None) -> Wei:
-
-    BLOCK_HISTORY_SIZE = 100
-    chain_id = int(w3.net.version)
-    current_block_number = w3.eth.blockNumber
-
-    txs = Transaction.objects.filter(
-        block__chain=chain_id, block__number__gte=current_block_number - BLOCK_HISTORY_SIZE
-    )
-    return Wei(txs.aggregate(avg_price=Avg("gas_price")).get("avg_price")) or DEFAULT_PRICE
-
-
 def send_transaction(
     w3: Web3, contract_function, account_address, account_private_key, gas, *args, **kw
 ):
-    transaction_params = {
-        "chainId": int(w3.net.version),
-        "nonce": w3.eth.getTransactionCount(account_address),
-        "gasPrice": kw.pop("gas_price", DEFAULT_PRICE),
-        "gas": gas,
-    }
+    chain_id = int(w3.net.version)
+    gas_price = kw.pop("gas_price", DEFAULT_PRICE)
+
+    with reserve_nonce(w3, chain_id, account_address) as allocation:
+        transaction_params = {
+            "chainId": chain_id,
+            "nonce": allocation.nonce,
+            "gasPrice": gas_price,
+            "gas": gas,
+        }
+
+        transaction_params.update(**kw)
+
+        result = contract_function(*args)
+        transaction_data = result.buildTransaction(transaction_params)
+        signed = w3.eth.account.signTransaction(transaction_data, account_private_key)
+        tx_hash = send_raw_transaction(w3, allocation, signed.rawTransaction)
+    return w3.eth.waitForTransactionReceipt(tx_hash)
 
-    transaction_params.update(**kw)
 
-    result = contract_function(*args)
-    transaction_data = result.buildTransaction(transaction_params)
-    signed = w3.eth.account.signTransaction(transaction_data, account_private_key)
-    tx_hash = w3.eth.sendRawTransaction(signed.rawTransaction)
-    return w3.eth.waitForTransactionReceipt(tx_hash)
+def _is_http_url(url: str) -> bool:
+    return urlparse(url).scheme in ("http", "https")
 
 
-def make_web3(provider_url: str) -> Web3:
+def make_provider(provider_url: str):
     endpoint = urlparse(provider_url)
+
+    # Additional HTTP endpoints are pooled together with the main one. Other
+    # chains (see Chain.provider_url) are not pooled, as they are on other networks
+    pool_uris = [provider_url] + [
+        uri for uri in PROVIDER_POOL_URIS if uri != provider_url and _is_http_url(uri)
+    ]
+    is_main_provider = provider_url == settings.WEB3_PROVIDER_URI
+    if is_main_provider and _is_http_url(provider_url) and len(pool_uris) > 1:
+        logger.info(f"Instantiating new Web3 for a pool of {len(pool_uris)} endpoints")
+        return ProviderPool(pool_uris)
+
     logger.info(f"Instantiating new Web3 for {endpoint.hostname}")
     provider_class = {
         "http": HTTPProvider,
@@ -65,10 +95,14 @@ def make_web3(provider_url: str) -> Web3:
         "ws": WebsocketProvider,
         "wss": WebsocketProvider,
     }.get(endpoint.scheme, IPCProvider)
+    return provider_class(provider_url)
+
 
-    w3 = Web3(provider_class(provider_url))
+def make_web3(provider_url: str) -> Web3:
+    w3 = Web3(make_provider(provider_url))
     w3.middleware_onion.inject(geth_poa_middleware, layer=0)
-    w3.eth.setGasPriceStrategy(database_history_gas_price_strategy)
+    w3.middleware_onion.inject(RPCCacheMiddleware(), name="rpc_cache", layer=0)
+    w3.eth.setGasPriceStrategy(gas_price_oracle_strategy)
 
     return w3
 
@@ -84,11 +118,25 @@ def get_web3(provider_url: Optional[str] = None, force_new: bool = False) -> Web
     return w3
 
 
+def get_rpc_cache_stats(w3: Web3) -> Dict[str, Dict[str, int]]:
+    try:
+        return w3.middleware_onion["rpc_cache"].stats
+    except ValueError:
+        return {}
+
+
+def get_provider_pool_stats(w3: Web3) -> Dict[str, Dict]:
+    if isinstance(w3.provider, ProviderPool):
+        return w3.provider.stats
+    return {}
+
+
 def get_block_by_hash(w3: Web3, block_hash: HexBytes) -> Optional[Block]:
     try:
         chain = Chain.objects.get(id=int(w3.net.version))
-        block_data = w3.eth.getBlock(block_hash)
-        return Block.make(block_data, chain)
+        stored = get_stored_block(chain.id, block_hash=block_hash)
+        block_data = stored[0] if stored else w3.eth.getBlock(block_hash)
+        return Block.make(block_data, chain_id=chain.id)
     except (AttributeError, Chain.DoesNotExist):
         return None
 
@@ -96,6 +144,12 @@ def get_block_by_hash(w3: Web3, block_hash: HexBytes) -> Optional[Block]:
 def get_transaction_by_hash(
     w3: Web3, transaction_hash: HexBytes, block: Block
 ) -> Optional[Transaction]:
+    block_store = get_block_store(block.chain_id)
+    stored = block_store.get_transaction(transaction_hash) if block_store else None
+    if stored is not None and stored[1] is not None:
+        tx_data, tx_receipt = stored
+        return Transaction.make(tx_data=tx_data, tx_receipt=tx_receipt, block=block)
+
     try:
         return Transaction.make(
             tx_data=w3.eth.getTransaction(transaction_hash),
@@ -106,72 +160,383 @@ def get_transaction_by_hash(
         return None
 
 
+def get_stored_block(
+    chain_id: int, block_hash: Optional[HexBytes] = None, block_number: Optional[int] = None
+) -> Optional[Tuple]:
+    """
+    Returns (block data, {tx hash: receipt}) from the local block store,
+    if one is configured and has the block.
+    """
+    block_store = get_block_store(chain_id)
+    if block_store is None:
+        return None
+
+    if block_hash is not None:
+        block_data = block_store.get_block(block_hash)
+    else:
+        block_data = block_store.get_block_by_number(block_number)
+
+    if block_data is None:
+        return None
+
+    tx_receipts = block_store.get_receipts(block_data.hash)
+    return None if tx_receipts is None else (block_data, tx_receipts)
+
+
+def store_blocks(w3: Web3, chain_id: int, blocks: List[Tuple]):
+    block_store = get_block_store(chain_id)
+    if block_store is not None and blocks:
+        finalized_block_number = w3.eth.blockNumber - BLOCK_STORE_CONFIRMATIONS
+        block_store.put_blocks(blocks, finalized_block_number=finalized_block_number)
+
+
+def select_block_receipts(block_data, tx_receipts: Dict, chain_id: int) -> Dict:
+    ingest_filter = get_ingest_filter(chain_id)
+    if ingest_filter is None:
+        check_block_receipts(block_data, tx_receipts)
+        return tx_receipts
+    return ingest_filter.select_receipts(block_data, tx_receipts)
+
+
+def get_consecutive_ranges(block_numbers: List[int]) -> List[Tuple[int, int]]:
+    """
+    Groups block numbers in [first, last] ranges of consecutive blocks
+    """
+    ranges: List[Tuple[int, int]] = []
+    for block_number in sorted(set(block_numbers)):
+        if ranges and ranges[-1][1] == block_number - 1:
+            ranges[-1] = (ranges[-1][0], block_number)
+        else:
+            ranges.append((block_number, block_number))
+    return ranges
+
+
+def record_blocks(blocks: List[Tuple], chain_id: int) -> List[Block]:
+    """
+    Records (block data, {tx hash: receipt}) pairs, with receipts
+    already selected by `select_block_receipts`, in one transaction
+    that also marks the blocks as ingested.
+    """
+    with transaction.atomic():
+        recorded_blocks = []
+        for block_data, tx_receipts in blocks:
+            recorded = bulk_record_block(block_data, tx_receipts, chain_id=chain_id)
+            send_created_signals(recorded)
+            recorded_blocks.append(recorded.block)
+
+        # Last, so that the lock taken to merge the ingested ranges is only
+        # held for the commit, not while parallel backfills write their blocks
+        for first_block, last_block in get_consecutive_ranges(
+            [block_data.number for block_data, _ in blocks]
+        ):
+            BlockRange.objects.mark_ingested(chain_id, first_block, last_block)
+
+    for block_data, _ in blocks:
+        signals.block_data_received.send(
+            sender=Block,
+            chain_id=chain_id,
+            block_data=block_data,
+            transactions=block_data.transactions,
+        )
+    return recorded_blocks
+
+
+def record_block(block_data, tx_receipts: Dict, chain_id: int) -> Block:
+    tx_receipts = select_block_receipts(block_data, tx_receipts, chain_id)
+    return record_blocks([(block_data, tx_receipts)], chain_id)[0]
+
+
+def fetch_block_receipts(w3: Web3, block_data, attempts: int = RECEIPT_FETCH_ATTEMPTS) -> Dict:
+    ingest_filter = get_ingest_filter(int(w3.net.version))
+    if ingest_filter is not None and not ingest_filter.get_receipts_needed(block_data):
+        return {}
+
+    for attempt in range(1, attempts + 1):
+        tx_receipts = get_block_receipts(w3, [block_data])[HexBytes(block_data.hash)]
+        try:
+            check_block_receipts(block_data, tx_receipts)
+            return tx_receipts
+        except MissingReceiptsError as exc:
+            if attempt == attempts:
+                raise
+            logger.info(f"{exc}. Retrying ({attempt}/{attempts})")
+            time.sleep(RECEIPT_RETRY_INTERVAL)
+    return {}
+
+
 def get_block_by_number(w3: Web3, block_number: int) -> Optional[Block]:
     chain_id = int(w3.net.version)
+    stored = get_stored_block(chain_id, block_number=block_number)
+    if stored:
+        return record_block(*stored, chain_id=chain_id)
+
     try:
         block_data = w3.eth.getBlock(block_number, full_transactions=True)
     except AttributeError:
         return None
 
     logger.info(f"Making block #{block_number} with {len(block_data.transactions)} transactions")
-    with transaction.atomic():
-        block = Block.make(block_data, chain_id=chain_id)
-        for tx_data in block_data.transactions:
-            try:
-                tx_hash = tx_data.hash.hex()
-                Transaction.make(
-                    tx_data=tx_data,
-                    tx_receipt=w3.eth.waitForTransactionReceipt(tx_hash),
-                    block=block,
-                )
-            except TimeExhausted:
-                logger.warning(f"Timeout when trying to get transaction {tx_hash}")
-        return block
+    try:
+        tx_receipts = fetch_block_receipts(w3, block_data)
+    except MissingReceiptsError as exc:
+        logger.warning(f"Block #{block_number} not recorded: {exc}")
+        return None
+
+    store_blocks(w3, chain_id, [(block_data, tx_receipts)])
+    return record_block(block_data, tx_receipts, chain_id=chain_id)
+
+
+def fetch_blocks(w3: Web3, chain_id: int, block_numbers: List[int]) -> List[Tuple]:
+    """
+    Gets (block data, {tx hash: receipt}) for each block number,
+    reading from the local block store first and fetching the rest
+    from the node. Blocks that are not available are left out.
+    """
+    stored_blocks = {}
+    for block_number in block_numbers:
+        stored = get_stored_block(chain_id, block_number=block_number)
+        if stored:
+            stored_blocks[block_number] = stored
+
+    to_fetch = [number for number in block_numbers if number not in stored_blocks]
+    blocks = [block for block in get_blocks_by_number(w3, to_fetch) if block] if to_fetch else []
+
+    # On selective ingest, blocks that can not concern any watched address have no receipts
+    ingest_filter = get_ingest_filter(chain_id)
+    if ingest_filter is not None:
+        receipt_blocks = [block for block in blocks if ingest_filter.get_receipts_needed(block)]
+    else:
+        receipt_blocks = blocks
+    receipts_by_block = get_block_receipts(w3, receipt_blocks) if receipt_blocks else {}
+
+    fetched_blocks = {
+        block_data.number: (block_data, receipts_by_block.get(HexBytes(block_data.hash), {}))
+        for block_data in blocks
+    }
+    store_blocks(
+        w3,
+        chain_id,
+        [
+            (block_data, tx_receipts)
+            for block_data, tx_receipts in fetched_blocks.values()
+            if len(tx_receipts) == len(block_data.transactions)
+        ],
+    )
+
+    all_blocks = {**stored_blocks, **fetched_blocks}
+    return [all_blocks[number] for number in block_numbers if number in all_blocks]
 
 
 def run_backfill(w3: Web3, start: int, end: int):
     chain_id = int(w3.net.version)
-    block_range = (start, end)
-    chain_blocks = Block.objects.filter(chain_id=chain_id, number__range=block_range)
-    recorded_block_set = set(chain_blocks.values_list("number", flat=True))
-    range_set = set(range(*block_range))
-    missing_blocks = list(range_set.difference(recorded_block_set))[::]
-
-    for block_number in missing_blocks:
-        get_block_by_number(w3=w3, block_number=block_number)
+    gaps = BlockRange.objects.get_gaps(chain_id, start, end)
+    missing_count = sum(gap_end - gap_start for gap_start, gap_end in gaps)
+
+    started_at = time.monotonic()
+    for gap_start, gap_end in gaps:
+        for lower, upper in split_block_ranges(gap_start, gap_end, RPC_BATCH_SIZE):
+            signals.block_batch_started.send(
+                sender=Block, chain_id=chain_id, block_numbers=list(range(lower, upper))
+            )
+            blocks = []
+            for block_data, tx_receipts in fetch_blocks(w3, chain_id, list(range(lower, upper))):
+                try:
+                    tx_receipts = select_block_receipts(block_data, tx_receipts, chain_id)
+                    blocks.append((block_data, tx_receipts))
+                except MissingReceiptsError as exc:
+                    # The block is left out, so it will be picked up by the next backfill
+                    logger.warning(f"Block #{block_data.number} not recorded: {exc}")
+            record_blocks(blocks, chain_id=chain_id)
+
+    elapsed = time.monotonic() - started_at
+    if missing_count:
+        logger.info(
+            f"Recorded {missing_count} blocks between {start} and {end} in {elapsed:.2f}s "
+            f"({missing_count / max(elapsed, 1e-6):.1f} blocks/s)"
+        )
 
 
-async def download_all_chain(w3: Web3):
-    start = 0
-    highest = w3.eth.blockNumber
-    while start < highest:
-        await asyncio.sleep(BLOCK_CREATION_INTERVAL)
-        end = min(start + BLOCK_SCAN_RANGE, highest)
-        logger.info(f"Syncing blocks between {start} and {end}")
-        await sync_to_async(run_backfill)(w3=w3, start=start, end=end)
-        start = end
+def get_missing_block_ranges(
+    w3: Web3, start: int = 0, range_size: Optional[int] = None
+) -> List[Tuple[int, int]]:
+    """
+    Splits every gap between `start` and the current block in ranges of
+    at most `range_size` blocks.
+    """
+    chain_id = int(w3.net.version)
+    gaps = BlockRange.objects.get_gaps(chain_id, start, w3.eth.blockNumber)
+    range_size = range_size or BLOCK_SCAN_RANGE
+    return [
+        block_range
+        for gap_start, gap_end in gaps
+        for block_range in split_block_ranges(gap_start, gap_end, range_size)
+    ]
+
+
+def get_resume_block_number(w3: Web3, cursor: ListenerCursor) -> int:
+    """
+    Returns the first block that a listener needs to process to carry
+    on from its cursor. If the block of the cursor is not on the chain
+    anymore, it goes back CURSOR_REORG_DEPTH blocks.
+    """
+    try:
+        block_data = w3.eth.getBlock(cursor.block_number)
+    except BlockNotFound:
+        block_data = None
+
+    if block_data is not None and HexBytes(block_data.hash) == HexBytes(cursor.block_hash):
+        return cursor.block_number + 1
+
+    logger.warning(f"Block #{cursor.block_number} of {cursor.name} cursor is not on the chain")
+    return max(cursor.block_number - CURSOR_REORG_DEPTH, 0)
+
+
+def get_catch_up_ranges(
+    w3: Web3, chain_id: int, cursor_name: str, until_block: int
+) -> List[Tuple[int, int]]:
+    """
+    Ranges of blocks (with exclusive end) that a listener missed since
+    its cursor, up to and including `until_block`, in batches of at
+    most RPC_BATCH_SIZE blocks. Listeners without a cursor have
+    nothing to catch up on.
+    """
+    cursor = ListenerCursor.objects.filter(chain_id=chain_id, name=cursor_name).first()
+    if cursor is None:
+        return []
+
+    start = get_resume_block_number(w3, cursor)
+    if start <= until_block:
+        logger.info(f"{cursor_name} catching up from #{start} to #{until_block}")
+    return split_block_ranges(start, until_block + 1, RPC_BATCH_SIZE)
+
+
+async def download_all_chain(w3: Web3, start: int = 0, range_size: Optional[int] = None):
+    block_ranges = await sync_to_async(get_missing_block_ranges)(w3, start, range_size)
+    for lower, upper in block_ranges:
+        logger.info(f"Syncing blocks between {lower} and {upper}")
+        await sync_to_async(run_backfill)(w3=w3, start=lower, end=upper)
+
+
+def _init_backfill_worker(provider_url: str):
+    # Forked workers must not reuse the database connections or the HTTP
+    # sessions from the parent process, so each one gets its own.
+    django.setup()
+    connections.close_all()
+    get_web3(provider_url, force_new=True)
+
+
+def _run_backfill_worker(provider_url: str, start: int, end: int) -> Tuple[int, int, int]:
+    run_backfill(w3=get_web3(provider_url), start=start, end=end)
+    return os.getpid(), start, end
+
+
+def split_block_ranges(start: int, end: int, range_size: int) -> List[Tuple[int, int]]:
+    return [(lower, min(lower + range_size, end)) for lower in range(start, end, range_size)]
+
+
+def download_chain_in_parallel(
+    provider_url: str, workers: int, start: int = 0, range_size: Optional[int] = None
+) -> List[Tuple[int, int]]:
+    """
+    Syncs the missing blocks from `start` with a pool of worker
+    processes, one range of blocks at a time. Returns the ranges that
+    failed, which are still missing.
+    """
+    block_ranges = get_missing_block_ranges(get_web3(provider_url), start, range_size)
+    total = len(block_ranges)
+    completed_by_worker: Dict[int, int] = {}
+    failed_ranges: List[Tuple[int, int]] = []
+
+    logger.info(f"Syncing {total} ranges of missing blocks with {workers} workers")
+
+    # The database connection can not be shared with the workers
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_backfill_worker, initargs=(provider_url,)
+    ) as executor:
+        futures = {
+            executor.submit(_run_backfill_worker, provider_url, lower, upper): (lower, upper)
+            for lower, upper in block_ranges
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            lower, upper = futures[future]
+            try:
+                pid, _, _ = future.result()
+            except Exception as exc:
+                logger.error(f"Failed to sync blocks {lower}-{upper}: {exc}")
+                failed_ranges.append((lower, upper))
+                continue
+
+            completed_by_worker[pid] = completed_by_worker.get(pid, 0) + 1
+            logger.info(
+                f"Worker {pid} synced blocks {lower}-{upper} "
+                f"({completed_by_worker[pid]} ranges by this worker, {done}/{total} overall)"
+            )
+
+    if failed_ranges:
+        logger.error(f"{len(failed_ranges)} of {total} ranges of blocks failed to sync")
+    return sorted(failed_ranges)
+
+
+async def wait_for_block_receipts(
+    provider: async_provider.BaseAsyncProvider, block_data, attempts: int = RECEIPT_FETCH_ATTEMPTS
+) -> Dict:
+    for attempt in range(1, attempts + 1):
+        tx_receipts = await async_provider.get_block_receipts(provider, block_data)
+        try:
+            check_block_receipts(block_data, tx_receipts)
+            return tx_receipts
+        except MissingReceiptsError as exc:
+            if attempt == attempts:
+                raise
+            logger.info(f"{exc}. Retrying ({attempt}/{attempts})")
+            await asyncio.sleep(RECEIPT_RETRY_INTERVAL)
+    return {}
 
 
 async def listen_new_blocks(w3: Web3):
-    block_filter = w3.eth.filter("latest")
-    while True:
-        await asyncio.sleep(BLOCK_CREATION_INTERVAL)
-        for event in block_filter.get_new_entries():
-            block_hash = event.hex()
-            block_data = w3.eth.getBlock(block_hash, full_transactions=True)
-            block = await sync_to_async(get_block_by_hash)(w3, block_hash)
-
-            for tx_hash in block_data.transactions:
-                await sync_to_async(get_transaction_by_hash)(w3, tx_hash, block)
+    provider = async_provider.make_async_provider(w3)
+    try:
+        chain_id = await async_provider.get_chain_id(provider)
+        async for block_hash in async_provider.block_hash_stream(
+            provider, poll_interval=BLOCK_CREATION_INTERVAL
+        ):
+            block_data = await async_provider.get_block(
+                provider, block_hash, full_transactions=True
+            )
+            if block_data is None:
+                continue
+
+            await sync_to_async(signals.block_batch_started.send)(
+                sender=Block, chain_id=chain_id, block_numbers=[block_data.number]
+            )
+            ingest_filter = await sync_to_async(get_ingest_filter)(chain_id)
+            try:
+                if ingest_filter is None or ingest_filter.get_receipts_needed(block_data):
+                    tx_receipts = await wait_for_block_receipts(provider, block_data)
+                else:
+                    tx_receipts = {}
+            except MissingReceiptsError as exc:
+                logger.warning(f"Block {block_hash.hex()} not recorded: {exc}")
+                continue
+
+            block = await sync_to_async(record_block)(block_data, tx_receipts, chain_id)
             await sync_to_async(signals.block_sealed.send)(sender=Block, block=block)
+    finally:
+        await provider.close()
 
 
 async def sync_chain(w3: Web3):
-    while True:
-        await sync_to_async(signals.chain_status_synced.send)(
-            sender=Chain,
-            chain_id=int(w3.net.version),
-            current_block=w3.eth.blockNumber,
-            synced=bool(not w3.eth.syncing),
-        )
-        await asyncio.sleep(BLOCK_CREATION_INTERVAL)
+    provider = async_provider.make_async_provider(w3)
+    try:
+        chain_id = await async_provider.get_chain_id(provider)
+        while True:
+            current_block, syncing = await asyncio.gather(
+                async_provider.get_block_number(provider), async_provider.is_syncing(provider)
+            )
+            await sync_to_async(signals.chain_status_synced.send)(
+                sender=Chain, chain_id=chain_id, current_block=current_block, synced=not syncing
+            )
+            await asyncio.sleep(BLOCK_CREATION_INTERVAL)
+    finally:
+        await provider.close()
@@ -110,3 +110,33 @@ class Sha3HashField(HexField):
         name, path, args, kwargs = super().deconstruct()
         del kwargs["max_length"]
         return name, path, args, kwargs
+
+
+class BinaryHexField(models.BinaryField):
+    """
+    Field to store hex values as raw bytes. Like `HexField`, returns hex
+    with 0x prefix, but on Database side a bytea column is used, which
+    takes half of the space of the hex representation.
+    """
+
+    description = "Stores a hex value into a BinaryField"
+
+    def from_db_value(self, value, expression, connection):
+        return self.to_python(value)
+
+    def to_python(self, value):
+        return value if value is None else HexBytes(value).hex()
+
+    def get_prep_value(self, value):
+        return value if value is None else bytes(HexBytes(value))
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+
+class BinaryEthereumAddressField(BinaryHexField):
+    default_validators = [validate_checksumed_address]
+    description = "Ethereum address stored as raw bytes"
+
+    def to_python(self, value):
+        return value and checksum_encode(HexBytes(value))
@@ -0,0 +1,121 @@
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+
+from django.core.cache import cache
+from web3 import Web3
+from web3.types import TxParams, Wei
+
+from .app_settings import DEFAULT_GAS_PRICE_GWEI, GAS_PRICE_HISTORY_SIZE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRICE = Web3.toWei(DEFAULT_GAS_PRICE_GWEI, "gwei")
+PERCENTILES = (25, 50, 90)
+# Blocks older than this (in seconds), e.g. those recorded by a backfill, say nothing about
+# the current prices.
+MAX_BLOCK_AGE = 60 * 60
+# The history is read and written back by whichever process ingests a block, so updates
+# are serialized with a lock on the cache. It expires, in case its holder dies.
+UPDATE_LOCK_TIMEOUT = 10  # In seconds
+UPDATE_LOCK_ATTEMPTS = 20
+UPDATE_LOCK_RETRY_INTERVAL = 0.05  # In seconds
+
+
+def _percentile(sorted_values: Sequence[int], percentile: int) -> int:
+    rank = max(0, -(-percentile * len(sorted_values) // 100) - 1)
+    return sorted_values[rank]
+
+
+def _median(values: List[int]) -> int:
+    return _percentile(sorted(values), 50)
+
+
+class GasPriceOracle:
+    """
+    Keeps a ring buffer with the gas price percentiles of the last
+    `history_size` ingested blocks of a chain, along with the estimates
+    derived from them (the median of each percentile across blocks).
+
+    Both live in the django cache, so that every process reads the
+    estimates that were computed by whichever process ingested the
+    block, and getting a gas price is a single cache lookup.
+    """
+
+    def __init__(self, chain_id: int, history_size: int = GAS_PRICE_HISTORY_SIZE):
+        self.chain_id = chain_id
+        self.history_size = history_size
+
+    @property
+    def history_key(self) -> str:
+        return f"blockchain:gas-price-oracle:{self.chain_id}:history"
+
+    @property
+    def estimates_key(self) -> str:
+        return f"blockchain:gas-price-oracle:{self.chain_id}:estimates"
+
+    @property
+    def lock_key(self) -> str:
+        return f"blockchain:gas-price-oracle:{self.chain_id}:lock"
+
+    def _acquire_lock(self) -> bool:
+        for _ in range(UPDATE_LOCK_ATTEMPTS):
+            if cache.add(self.lock_key, os.getpid(), timeout=UPDATE_LOCK_TIMEOUT):
+                return True
+            time.sleep(UPDATE_LOCK_RETRY_INTERVAL)
+        return False
+
+    def get_estimates(self) -> Optional[Dict[str, Wei]]:
+        return cache.get(self.estimates_key)
+
+    def get_gas_price(self, percentile: int = 50) -> Wei:
+        estimates = self.get_estimates()
+        return Wei(estimates[f"p{percentile}"]) if estimates else DEFAULT_PRICE
+
+    def update(self, block_number: int, gas_prices: Sequence[int]):
+        if not gas_prices:
+            return
+
+        if not self._acquire_lock():
+            logger.warning(f"Gas prices of block #{block_number} left out, oracle is locked")
+            return
+
+        try:
+            self._update(block_number, gas_prices)
+        finally:
+            cache.delete(self.lock_key)
+
+    def _update(self, block_number: int, gas_prices: Sequence[int]):
+        history: List[List[int]] = cache.get(self.history_key) or []
+
+        if history and block_number <= history[-1][0]:
+            # Re-ingested or out-of-order blocks would skew the window
+            return
+
+        sorted_prices = sorted(gas_prices)
+        history.append([block_number] + [_percentile(sorted_prices, p) for p in PERCENTILES])
+        history = history[-self.history_size :]
+
+        estimates = {
+            f"p{percentile}": Wei(_median([entry[index] for entry in history]))
+            for index, percentile in enumerate(PERCENTILES, start=1)
+        }
+        cache.set_many({self.history_key: history, self.estimates_key: estimates}, timeout=None)
+
+    def update_from_block(self, block_data):
+        if block_data.timestamp < time.time() - MAX_BLOCK_AGE:
+            return
+
+        transactions = [tx for tx in block_data.transactions if not isinstance(tx, (bytes, str))]
+        self.update(block_data.number, [tx.gasPrice for tx in transactions])
+
+    def clear(self):
+        cache.delete_many([self.history_key, self.estimates_key, self.lock_key])
+
+
+def gas_price_oracle_strategy(w3: Web3, params: TxParams = None) -> Wei:
+    return GasPriceOracle(chain_id=int(w3.net.version)).get_gas_price()
+
+
+__all__ = ["GasPriceOracle", "gas_price_oracle_strategy"]
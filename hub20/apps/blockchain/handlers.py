@@ -4,7 +4,8 @@ from django.db import transaction
 from django.dispatch import receiver
 
 from . import signals
-from .models import Chain
+from .gas_price import GasPriceOracle
+from .models import Block, BlockRange, Chain
 
 logger = logging.getLogger(__name__)
 
@@ -59,7 +60,9 @@ def on_chain_reorganization_clear_blocks(sender, **kw):
     block_number = kw["new_block_height"]
 
     logger.warning(f"Re-org detected. Rewinding to block #{block_number}")
-    chain.blocks.filter(number__gt=block_number).delete()
+    with transaction.atomic():
+        chain.blocks.filter(number__gt=block_number).delete()
+        BlockRange.objects.truncate(chain.id, block_number)
 
 
 @receiver(signals.ethereum_node_sync_lost, sender=Chain)
@@ -79,9 +82,15 @@ def on_sync_recovered_update_chain(sender, **kw):
     chain.save()
 
 
+@receiver(signals.block_data_received, sender=Block)
+def on_block_data_received_update_gas_price_oracle(sender, **kw):
+    GasPriceOracle(chain_id=kw["chain_id"]).update_from_block(kw["block_data"])
+
+
 __all__ = [
     "on_sync_lost_update_chain",
     "on_sync_recovered_update_chain",
     "on_chain_status_synced_update_database",
     "on_chain_reorganization_clear_blocks",
+    "on_block_data_received_update_gas_price_oracle",
 ]
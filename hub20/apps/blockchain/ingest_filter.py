@@ -0,0 +1,117 @@
+import functools
+import logging
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+from django.utils.module_loading import import_string
+from eth_utils import keccak
+from hexbytes import HexBytes
+
+from .app_settings import INGEST_MODE, WATCHED_ADDRESSES_LOADER
+from .batch import MissingReceiptsError
+
+logger = logging.getLogger(__name__)
+
+BLOOM_BITS = 2048
+
+
+def get_bloom_mask(value: bytes) -> int:
+    """
+    Bits that `value` sets on a 2048-bit logs bloom: the low 11 bits of
+    each of the first three byte pairs of its keccak hash.
+    """
+    value_hash = keccak(value)
+    mask = 0
+    for index in (0, 2, 4):
+        mask |= 1 << (int.from_bytes(value_hash[index : index + 2], "big") % BLOOM_BITS)
+    return mask
+
+
+def _to_topic(address: bytes) -> bytes:
+    return address.rjust(32, b"\0")
+
+
+class IngestFilter:
+    """
+    Selects the parts of a block that concern the watched accounts and
+    contracts. The logs bloom of a block tells (with false positives)
+    if any of its logs was emitted by a watched contract or has a watched
+    account as a topic, so receipts only need to be fetched for blocks
+    that pass the bloom test or have a transaction to/from a watched
+    address.
+    """
+
+    def __init__(self, accounts: Iterable[str], contracts: Iterable[str]):
+        self.accounts: FrozenSet[bytes] = frozenset(bytes(HexBytes(a)) for a in accounts)
+        self.contracts: FrozenSet[bytes] = frozenset(bytes(HexBytes(c)) for c in contracts)
+        self.recipients: FrozenSet[bytes] = self.accounts | self.contracts
+        self.account_topics: FrozenSet[bytes] = frozenset(_to_topic(a) for a in self.accounts)
+        self.bloom_masks: List[int] = [
+            get_bloom_mask(value) for value in self.contracts | self.account_topics
+        ]
+
+    def bloom_may_match(self, logs_bloom) -> bool:
+        bloom = int.from_bytes(HexBytes(logs_bloom), "big")
+        return any(bloom & mask == mask for mask in self.bloom_masks)
+
+    def is_relevant_transaction(self, tx_data) -> bool:
+        recipient = tx_data.to and bytes(HexBytes(tx_data.to))
+        sender = bytes(HexBytes(tx_data["from"]))
+        return sender in self.accounts or recipient in self.recipients
+
+    def is_relevant_log(self, log_data) -> bool:
+        if bytes(HexBytes(log_data.address)) in self.contracts:
+            return True
+        return any(bytes(HexBytes(topic)) in self.account_topics for topic in log_data.topics)
+
+    def get_receipts_needed(self, block_data) -> List[HexBytes]:
+        """
+        Hashes of the transactions of the block whose receipts are
+        required to select the relevant ones. All of them if the
+        bloom matches, as any transaction may have emitted the logs.
+        """
+        if self.bloom_may_match(block_data.logsBloom):
+            return [tx.hash for tx in block_data.transactions]
+
+        return [tx.hash for tx in block_data.transactions if self.is_relevant_transaction(tx)]
+
+    def select_receipts(self, block_data, tx_receipts: Dict) -> Dict:
+        needed = self.get_receipts_needed(block_data)
+        missing = [tx_hash for tx_hash in needed if tx_hash not in tx_receipts]
+        if missing:
+            raise MissingReceiptsError(block_data.hash, missing)
+
+        selected = {}
+        for tx_data in block_data.transactions:
+            tx_receipt = tx_receipts.get(tx_data.hash)
+            if tx_receipt is None:
+                continue
+
+            if self.is_relevant_transaction(tx_data) or any(
+                self.is_relevant_log(log_data) for log_data in tx_receipt.logs
+            ):
+                selected[tx_data.hash] = tx_receipt
+        return selected
+
+
+@functools.lru_cache(maxsize=8)
+def _make_ingest_filter(accounts: FrozenSet[str], contracts: FrozenSet[str]) -> IngestFilter:
+    return IngestFilter(accounts=accounts, contracts=contracts)
+
+
+def get_ingest_filter(chain_id: int) -> Optional[IngestFilter]:
+    """
+    Returns the filter for selective ingest, or None when every
+    transaction of every block is to be recorded.
+    """
+    if INGEST_MODE != "selective":
+        return None
+
+    if not WATCHED_ADDRESSES_LOADER:
+        logger.warning("Selective ingest requires BLOCKCHAIN_WATCHED_ADDRESSES_LOADER")
+        return None
+
+    accounts, contracts = import_string(WATCHED_ADDRESSES_LOADER)(chain_id)
+    return _make_ingest_filter(frozenset(accounts), frozenset(contracts))
+
+
+__all__ = ["IngestFilter", "get_bloom_mask", "get_ingest_filter"]
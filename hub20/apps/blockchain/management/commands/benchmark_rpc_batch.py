@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from hexbytes import HexBytes
+
+from hub20.apps.blockchain.app_settings import RPC_BATCH_SIZE
+from hub20.apps.blockchain.batch import (
+    check_block_receipts,
+    get_block_receipts,
+    get_blocks_by_number,
+)
+from hub20.apps.blockchain.client import get_web3
+
+
+class Command(BaseCommand):
+    help = "Times fetching blocks with their receipts one call at a time and in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=int, default=None, help="First block to fetch")
+        parser.add_argument("--count", type=int, default=RPC_BATCH_SIZE, help="Blocks to fetch")
+
+    def _fetch_one_by_one(self, w3, block_numbers):
+        blocks = []
+        for block_number in block_numbers:
+            block_data = w3.eth.getBlock(block_number, full_transactions=True)
+            receipts = [w3.eth.getTransactionReceipt(tx.hash) for tx in block_data.transactions]
+            blocks.append((block_data, {receipt.transactionHash: receipt for receipt in receipts}))
+        return blocks
+
+    def _fetch_in_batches(self, w3, block_numbers):
+        blocks = get_blocks_by_number(w3, block_numbers)
+        receipts_by_block = get_block_receipts(w3, blocks)
+        return [
+            (block_data, receipts_by_block[HexBytes(block_data.hash)]) for block_data in blocks
+        ]
+
+    def _time(self, fetch, w3, block_numbers):
+        started = time.perf_counter()
+        blocks = fetch(w3, block_numbers)
+        return blocks, time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        w3 = get_web3()
+        count = options["count"]
+        start = options["start"]
+        if start is None:
+            start = max(w3.eth.blockNumber - count, 0)
+        block_numbers = list(range(start, start + count))
+
+        expected, single_time = self._time(self._fetch_one_by_one, w3, block_numbers)
+        blocks, batch_time = self._time(self._fetch_in_batches, w3, block_numbers)
+
+        for (reference, reference_receipts), (block_data, tx_receipts) in zip(expected, blocks):
+            check_block_receipts(block_data, tx_receipts)
+            same_receipts = tx_receipts.keys() == reference_receipts.keys()
+            if block_data.hash != reference.hash or not same_receipts:
+                raise CommandError(f"Batched results differ on block #{block_data.number}")
+
+        total_transactions = sum(len(block_data.transactions) for block_data, _ in blocks)
+        self.stdout.write(
+            f"{count} blocks ({total_transactions} transactions) from #{start}: "
+            f"one by one {single_time:.3f}s, batched {batch_time:.3f}s, "
+            f"{single_time / batch_time:.1f}x faster"
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from hub20.apps.blockchain.client import get_web3
+from hub20.apps.blockchain.provider_pool import ProviderPool
+
+
+class Command(BaseCommand):
+    help = "Checks the health of the web3 endpoints and shows their stats"
+
+    def handle(self, *args, **options):
+        w3 = get_web3()
+        provider = w3.provider
+
+        if not isinstance(provider, ProviderPool):
+            self.stdout.write(f"{provider}: connected={provider.isConnected()}")
+            return
+
+        provider.check_health()
+        for uri, stats in provider.stats.items():
+            details = ", ".join(f"{key}={value}" for key, value in stats.items())
+            self.stdout.write(f"{uri}: {details}")
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from hub20.apps.blockchain.app_settings import PARTITION_SIZE
+from hub20.apps.blockchain.models import Block
+from hub20.apps.blockchain.partitions import (
+    convert_to_partitioned_tables,
+    create_partitions,
+    detach_partitions,
+    get_default_partition,
+    get_partitions,
+    is_partitioned,
+)
+
+
+class Command(BaseCommand):
+    help = "Manages the block number partitions of the block, transaction and log tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            default=False,
+            help="Convert the existing tables to partitioned tables (locks them while running)",
+        )
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=2,
+            help="Number of partitions to have ready past the highest block",
+        )
+        parser.add_argument(
+            "--partition-size", type=int, default=PARTITION_SIZE, help="Blocks per partition"
+        )
+        parser.add_argument(
+            "--detach-before",
+            type=int,
+            default=None,
+            help="Detach (for archival) all partitions holding only blocks before this one",
+        )
+        parser.add_argument(
+            "--list", action="store_true", default=False, help="Only list existing partitions"
+        )
+
+    def handle(self, *args, **options):
+        if options["list"]:
+            for partition in get_partitions(Block._meta.db_table):
+                self.stdout.write(f"{partition.name}: {partition.lower}-{partition.upper - 1}")
+            default_partition = get_default_partition(Block._meta.db_table)
+            if default_partition is not None:
+                self.stdout.write(f"{default_partition}: blocks past the last partition")
+            return
+
+        if options["convert"]:
+            try:
+                convert_to_partitioned_tables(partition_size=options["partition_size"])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        if not is_partitioned(Block._meta.db_table):
+            raise CommandError("Tables are not partitioned yet, run with --convert first")
+
+        if options["detach_before"] is not None:
+            for partition_name in detach_partitions(options["detach_before"]):
+                self.stdout.write(f"Detached {partition_name}")
+            return
+
+        created = create_partitions(
+            ahead=options["ahead"], partition_size=options["partition_size"]
+        )
+        for partition_name in created:
+            self.stdout.write(f"Created {partition_name}")
@@ -1,15 +1,23 @@
-import binascii
 import logging
 
 from django.core.management.base import BaseCommand
-from web3.exceptions import TransactionNotFound
+from eth_utils import is_hex
 
+from hub20.apps.blockchain.batch import (
+    get_blocks_by_hash,
+    get_transaction_receipts,
+    get_transactions,
+)
 from hub20.apps.blockchain.client import get_web3
 from hub20.apps.blockchain.models import Block, Transaction
 
 logger = logging.getLogger(__name__)
 
 
+def is_transaction_hash(value: str) -> bool:
+    return is_hex(value) and len(value.replace("0x", "")) == 64
+
+
 class Command(BaseCommand):
     help = "Records transaction data into database"
 
@@ -22,21 +30,34 @@ class Command(BaseCommand):
         chain_id = int(w3.net.version)
 
         txs = options["transactions"]
+
+        for tx_hash in [tx for tx in txs if not is_transaction_hash(tx)]:
+            logger.info(f"{tx_hash} is not a valid transaction hash")
+
+        txs = [tx for tx in txs if is_transaction_hash(tx)]
         already_recorded = Transaction.objects.filter(hash__in=txs).values_list("hash", flat=True)
 
         if already_recorded:
             logger.info(f"Transactions {', '.join(already_recorded)} already recorded")
 
-        to_record = set(txs) - set(already_recorded)
-
-        for tx_hash in to_record:
-            try:
-                tx_data = w3.eth.getTransaction(tx_hash)
-                tx_receipt = w3.eth.getTransactionReceipt(tx_hash)
-                block_data = w3.eth.getBlock(tx_data.blockHash)
-                block = Block.make(block_data, chain_id)
-                Transaction.make(tx_data, tx_receipt, block)
-            except binascii.Error:
-                logger.info(f"{tx_hash} is not a valid transaction hash")
-            except TransactionNotFound:
+        to_record = list(set(txs) - set(already_recorded))
+
+        tx_data_list = get_transactions(w3, to_record)
+        tx_receipts = get_transaction_receipts(w3, to_record)
+
+        for tx_hash, tx_data, tx_receipt in zip(to_record, tx_data_list, tx_receipts):
+            if tx_data is None or tx_receipt is None:
                 logger.info(f"{tx_hash} not found")
+
+        found = [
+            (tx_data, tx_receipt)
+            for tx_data, tx_receipt in zip(tx_data_list, tx_receipts)
+            if tx_data is not None and tx_receipt is not None
+        ]
+
+        block_hashes = list({tx_data.blockHash for tx_data, _ in found})
+        blocks_by_hash = dict(zip(block_hashes, get_blocks_by_hash(w3, block_hashes)))
+
+        for tx_data, tx_receipt in found:
+            block = Block.make(blocks_by_hash[tx_data.blockHash], chain_id)
+            Transaction.make(tx_data, tx_receipt, block)
@@ -1,19 +1,68 @@
 import asyncio
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 
-from hub20.apps.blockchain.client import download_all_chain, get_web3
+from hub20.apps.blockchain.client import (
+    download_all_chain,
+    download_chain_in_parallel,
+    get_missing_block_ranges,
+    get_web3,
+)
 
 
 class Command(BaseCommand):
     help = "Downloads all blocks from ethereum client and save the data on the database"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes to split the block ranges across",
+        )
+        parser.add_argument("--start", type=int, default=0, help="First block to sync")
+        parser.add_argument(
+            "--range-size", type=int, default=None, help="Number of blocks per work unit"
+        )
+        parser.add_argument(
+            "--list-gaps",
+            action="store_true",
+            default=False,
+            help="Only list the ranges of blocks that are missing",
+        )
+
     def handle(self, *args, **options):
+        workers = options["workers"]
+
+        if options["list_gaps"]:
+            w3 = get_web3()
+            block_ranges = get_missing_block_ranges(w3, options["start"], options["range_size"])
+            for lower, upper in block_ranges:
+                self.stdout.write(f"{lower}-{upper - 1} ({upper - lower} blocks)")
+            self.stdout.write(f"{sum(upper - lower for lower, upper in block_ranges)} missing")
+            return
+
+        if workers > 1:
+            failed_ranges = download_chain_in_parallel(
+                settings.WEB3_PROVIDER_URI,
+                workers=workers,
+                start=options["start"],
+                range_size=options["range_size"],
+            )
+            for lower, upper in failed_ranges:
+                self.stderr.write(f"{lower}-{upper - 1} ({upper - lower} blocks) failed")
+            if failed_ranges:
+                raise CommandError(f"{len(failed_ranges)} ranges of blocks failed to sync")
+            return
+
         w3 = get_web3()
 
         loop = asyncio.get_event_loop()
 
         try:
-            loop.run_until_complete(download_all_chain(w3))
+            loop.run_until_complete(
+                download_all_chain(w3, start=options["start"], range_size=options["range_size"])
+            )
         finally:
             loop.close()
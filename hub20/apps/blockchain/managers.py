@@ -1,4 +1,6 @@
-from django.db import models
+from typing import List, Optional, Tuple
+
+from django.db import models, transaction
 from django.db.models import Max, Q
 
 
@@ -9,5 +11,82 @@ class TransactionManager(models.Manager):
         )
 
     def last_block_with(self, chain, address):
-        qs = self.involving_address(chain, address).select_related("block")
-        return qs.aggregate(highest=Max("block__number")).get("highest") or 0
+        qs = self.involving_address(chain, address)
+        return qs.aggregate(highest=Max("block_number")).get("highest") or 0
+
+
+class BlockRangeManager(models.Manager):
+    def mark_ingested(self, chain_id: int, first_block: int, last_block: Optional[int] = None):
+        last_block = first_block if last_block is None else last_block
+        chain_model = self.model._meta.get_field("chain").related_model
+
+        with transaction.atomic():
+            # Merges of ranges from the same chain must not run concurrently
+            list(chain_model.objects.select_for_update().filter(id=chain_id).values("id"))
+
+            adjacent = self.filter(
+                chain_id=chain_id, first_block__lte=last_block + 1, last_block__gte=first_block - 1
+            )
+            merged, *others = list(adjacent.order_by("first_block")) or [None]
+
+            if merged is None:
+                return self.create(
+                    chain_id=chain_id, first_block=first_block, last_block=last_block
+                )
+
+            if others:
+                self.filter(pk__in=[block_range.pk for block_range in others]).delete()
+
+            merged.first_block = min(merged.first_block, first_block)
+            merged.last_block = max([last_block] + [r.last_block for r in [merged] + others])
+            merged.save()
+            return merged
+
+    def truncate(self, chain_id: int, block_number: int):
+        with transaction.atomic():
+            self.filter(chain_id=chain_id, first_block__gt=block_number).delete()
+            self.filter(chain_id=chain_id, last_block__gt=block_number).update(
+                last_block=block_number
+            )
+
+    def get_gaps(self, chain_id: int, start: int, end: int) -> List[Tuple[int, int]]:
+        """
+        Returns the [start, end) intervals of block numbers that were
+        not ingested yet, with the same (exclusive) end as `range()`.
+        """
+        ingested = (
+            self.filter(chain_id=chain_id, last_block__gte=start, first_block__lt=end)
+            .order_by("first_block")
+            .values_list("first_block", "last_block")
+        )
+
+        gaps = []
+        cursor = start
+        for first_block, last_block in ingested:
+            if first_block > cursor:
+                gaps.append((cursor, first_block))
+            cursor = max(cursor, last_block + 1)
+
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+
+class ListenerCursorManager(models.Manager):
+    def move_to(self, chain_id: int, name: str, block_number: int, block_hash):
+        cursor, _ = self.update_or_create(
+            chain_id=chain_id,
+            name=name,
+            defaults={"block_number": block_number, "block_hash": block_hash},
+        )
+        return cursor
+
+
+class AccountNonceManager(models.Manager):
+    def lock(self, chain_id: int, address: str):
+        """
+        Returns the nonce counter of the address, locked (SELECT ... FOR
+        UPDATE) until the end of the current transaction, or None if the
+        address has no counter yet.
+        """
+        return self.select_for_update().filter(chain_id=chain_id, address=address).first()
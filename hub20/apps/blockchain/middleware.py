@@ -0,0 +1,130 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+from web3 import Web3
+from web3.types import RPCEndpoint, RPCResponse
+
+from .app_settings import RPC_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Block tags that point to a different block as the chain moves on
+MOVING_BLOCK_TAGS = {"latest", "pending", "safe", "finalized"}
+
+
+def _is_block_hash(value: Any) -> bool:
+    return isinstance(value, str) and len(value) == 66
+
+
+def _is_mined(result: Dict) -> bool:
+    return isinstance(result, dict) and result.get("blockHash") is not None
+
+
+def _has_moving_block_tag(params: list) -> bool:
+    return any(isinstance(param, str) and param in MOVING_BLOCK_TAGS for param in params)
+
+
+class CachePolicy(NamedTuple):
+    ttl: Optional[float] = None  # In seconds, None means "never expires"
+    is_cacheable: Callable[[list, Any], bool] = lambda params, result: True
+
+
+RPC_CACHE_POLICIES: Dict[str, CachePolicy] = {
+    "net_version": CachePolicy(),
+    "eth_chainId": CachePolicy(),
+    "eth_blockNumber": CachePolicy(ttl=1),
+    # Blocks and receipts are immutable once we refer to them by hash.
+    "eth_getBlockByHash": CachePolicy(),
+    "eth_getBlockReceipts": CachePolicy(is_cacheable=lambda params, _: _is_block_hash(params[0])),
+    "eth_getTransactionByHash": CachePolicy(is_cacheable=lambda _, result: _is_mined(result)),
+    "eth_getTransactionReceipt": CachePolicy(is_cacheable=lambda _, result: _is_mined(result)),
+}
+
+
+class RPCCacheMiddleware:
+    """
+    Web3 middleware that keeps the responses of the methods listed in
+    `policies` on a bounded LRU cache, so that repeated lookups of data
+    that does not change (chain id, blocks and receipts by hash) or
+    that changes slowly (current block number) do not reach the node.
+
+    Errors and empty results are never cached, and neither are calls
+    that refer to a block by a tag like "latest" or "pending".
+    """
+
+    def __init__(self, policies: Optional[Dict[str, CachePolicy]] = None, max_size: int = 0):
+        self.policies = policies or RPC_CACHE_POLICIES
+        self.max_size = max_size or RPC_CACHE_SIZE
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = {}
+        self._misses: Dict[str, int] = {}
+
+    def _get(self, key) -> Optional[RPCResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, response = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return response
+
+    def _set(self, key, response: RPCResponse, ttl: Optional[float]):
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = (expires_at, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _count(self, counter: Dict[str, int], method: str):
+        with self._lock:
+            counter[method] = counter.get(method, 0) + 1
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                method: {"hits": self._hits.get(method, 0), "misses": self._misses.get(method, 0)}
+                for method in sorted(set(self._hits) | set(self._misses))
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._hits.clear()
+            self._misses.clear()
+
+    def __call__(self, make_request: Callable, w3: Web3) -> Callable:
+        def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            policy = self.policies.get(method)
+            if policy is None or _has_moving_block_tag(list(params or [])):
+                return make_request(method, params)
+
+            key = (method, json.dumps(params, sort_keys=True, default=str))
+            response = self._get(key)
+            if response is not None:
+                self._count(self._hits, method)
+                return response
+
+            self._count(self._misses, method)
+            response = make_request(method, params)
+            result = response.get("result")
+            if "error" not in response and result is not None:
+                if policy.is_cacheable(list(params or []), result):
+                    self._set(key, response, policy.ttl)
+            return response
+
+        return middleware
+
+
+__all__ = ["CachePolicy", "RPC_CACHE_POLICIES", "RPCCacheMiddleware"]
@@ -0,0 +1,17 @@
+# Generated by Django 3.0.7 on 2026-10-17 09:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='transaction',
+            unique_together={('block', 'hash')},
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.0.7 on 2026-10-17 11:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+POPULATE_BLOCK_RANGES = """
+INSERT INTO blockchain_blockrange (chain_id, first_block, last_block)
+SELECT chain_id, MIN(number), MAX(number)
+FROM (
+    SELECT chain_id, number, number - ROW_NUMBER() OVER (
+        PARTITION BY chain_id ORDER BY number
+    ) AS island
+    FROM (SELECT DISTINCT chain_id, number FROM blockchain_block) AS block_numbers
+) AS islands
+GROUP BY chain_id, island
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0002_transaction_unique_block_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlockRange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_block', models.PositiveIntegerField()),
+                ('last_block', models.PositiveIntegerField()),
+                ('chain', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingested_ranges', to='blockchain.Chain')),
+            ],
+            options={
+                'unique_together': {('chain', 'first_block')},
+            },
+        ),
+        migrations.RunSQL(POPULATE_BLOCK_RANGES, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.0.7 on 2026-10-17 13:05
+
+from django.db import migrations, models
+
+
+POPULATE_TRANSACTION_BLOCK_NUMBER = """
+UPDATE blockchain_transaction AS tx SET block_number = block.number
+FROM blockchain_block AS block
+WHERE tx.block_id = block.hash
+"""
+
+POPULATE_TRANSACTIONLOG_BLOCK_NUMBER = """
+UPDATE blockchain_transactionlog AS tx_log SET block_number = tx.block_number
+FROM blockchain_transaction AS tx
+WHERE tx_log.transaction_id = tx.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0003_blockrange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='block_number',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='transactionlog',
+            name='block_number',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.RunSQL(POPULATE_TRANSACTION_BLOCK_NUMBER, reverse_sql=migrations.RunSQL.noop),
+        migrations.RunSQL(
+            POPULATE_TRANSACTIONLOG_BLOCK_NUMBER, reverse_sql=migrations.RunSQL.noop
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.0.7 on 2026-10-17 13:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0004_block_number_partition_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='block_number',
+            field=models.PositiveIntegerField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='transactionlog',
+            name='block_number',
+            field=models.PositiveIntegerField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='block',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='blockchain.Block'),
+        ),
+        migrations.AlterField(
+            model_name='transactionlog',
+            name='transaction',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='logs', to='blockchain.Transaction'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='transaction',
+            unique_together={('block', 'hash', 'block_number')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='transactionlog',
+            unique_together={('transaction', 'index', 'block_number')},
+        ),
+    ]
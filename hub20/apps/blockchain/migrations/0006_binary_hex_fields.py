@@ -0,0 +1,147 @@
+# Generated by Django 3.0.7 on 2026-10-17 14:20
+
+from django.db import migrations
+import django.contrib.postgres.fields
+import hub20.apps.blockchain.fields
+
+
+# varchar_pattern_ops indexes (for LIKE queries) can not be converted to bytea
+DROP_LIKE_INDEXES = """
+DO $$
+DECLARE
+    like_index record;
+BEGIN
+    FOR like_index IN
+        SELECT indexname FROM pg_indexes
+        WHERE schemaname = current_schema()
+        AND tablename IN ('blockchain_block', 'blockchain_transaction')
+        AND indexname LIKE '%\\_like'
+    LOOP
+        EXECUTE format('DROP INDEX %I', like_index.indexname);
+    END LOOP;
+END
+$$
+"""
+
+CREATE_HEX_ARRAY_FUNCTIONS = """
+CREATE OR REPLACE FUNCTION pg_temp.hex_array_to_bytea(hex_values text[], prefix_length int) RETURNS bytea[]
+AS $$
+    SELECT COALESCE(
+        array_agg(decode(substr(value, prefix_length + 1), 'hex') ORDER BY position),
+        '{}'
+    )
+    FROM unnest(hex_values) WITH ORDINALITY AS hex_value(value, position)
+$$ LANGUAGE SQL IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION pg_temp.bytea_array_to_hex(binary_values bytea[], prefix text) RETURNS text[]
+AS $$
+    SELECT COALESCE(array_agg(prefix || encode(value, 'hex') ORDER BY position), '{}')
+    FROM unnest(binary_values) WITH ORDINALITY AS binary_value(value, position)
+$$ LANGUAGE SQL IMMUTABLE;
+"""
+
+# Hashes were stored without 0x, addresses and data with it. Each table
+# is rewritten only once.
+CONVERT_TO_BINARY = """
+ALTER TABLE blockchain_block
+    ALTER COLUMN hash TYPE bytea USING decode(hash, 'hex'),
+    ALTER COLUMN parent_hash TYPE bytea USING decode(parent_hash, 'hex'),
+    ALTER COLUMN uncle_hashes TYPE bytea[]
+        USING pg_temp.hex_array_to_bytea(uncle_hashes::text[], 0);
+
+ALTER TABLE blockchain_transaction
+    ALTER COLUMN block_id TYPE bytea USING decode(block_id, 'hex'),
+    ALTER COLUMN hash TYPE bytea USING decode(hash, 'hex'),
+    ALTER COLUMN from_address TYPE bytea USING decode(substr(from_address, 3), 'hex'),
+    ALTER COLUMN to_address TYPE bytea USING decode(substr(to_address, 3), 'hex'),
+    ALTER COLUMN data TYPE bytea USING decode(substr(data, 3), 'hex');
+
+ALTER TABLE blockchain_transactionlog
+    ALTER COLUMN data TYPE bytea USING decode(substr(data, 3), 'hex'),
+    ALTER COLUMN topics TYPE bytea[] USING pg_temp.hex_array_to_bytea(topics, 2);
+"""
+
+CONVERT_TO_TEXT = """
+ALTER TABLE blockchain_block
+    ALTER COLUMN hash TYPE varchar(64) USING encode(hash, 'hex'),
+    ALTER COLUMN parent_hash TYPE varchar(64) USING encode(parent_hash, 'hex'),
+    ALTER COLUMN uncle_hashes TYPE varchar(64)[]
+        USING pg_temp.bytea_array_to_hex(uncle_hashes, '');
+
+ALTER TABLE blockchain_transaction
+    ALTER COLUMN block_id TYPE varchar(64) USING encode(block_id, 'hex'),
+    ALTER COLUMN hash TYPE varchar(64) USING encode(hash, 'hex'),
+    ALTER COLUMN from_address TYPE varchar(42) USING '0x' || encode(from_address, 'hex'),
+    ALTER COLUMN to_address TYPE varchar(42) USING '0x' || encode(to_address, 'hex'),
+    ALTER COLUMN data TYPE text USING '0x' || encode(data, 'hex');
+
+ALTER TABLE blockchain_transactionlog
+    ALTER COLUMN data TYPE text USING '0x' || encode(data, 'hex'),
+    ALTER COLUMN topics TYPE text[] USING pg_temp.bytea_array_to_hex(topics, '0x');
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0005_partition_ready_constraints'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(DROP_LIKE_INDEXES, reverse_sql=migrations.RunSQL.noop),
+                migrations.RunSQL(
+                    CREATE_HEX_ARRAY_FUNCTIONS + CONVERT_TO_BINARY,
+                    reverse_sql=CREATE_HEX_ARRAY_FUNCTIONS + CONVERT_TO_TEXT,
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='block',
+                    name='hash',
+                    field=hub20.apps.blockchain.fields.BinaryHexField(primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name='block',
+                    name='parent_hash',
+                    field=hub20.apps.blockchain.fields.BinaryHexField(),
+                ),
+                migrations.AlterField(
+                    model_name='block',
+                    name='uncle_hashes',
+                    field=django.contrib.postgres.fields.ArrayField(base_field=hub20.apps.blockchain.fields.BinaryHexField(), size=None),
+                ),
+                migrations.AlterField(
+                    model_name='transaction',
+                    name='hash',
+                    field=hub20.apps.blockchain.fields.BinaryHexField(db_index=True),
+                ),
+                migrations.AlterField(
+                    model_name='transaction',
+                    name='from_address',
+                    field=hub20.apps.blockchain.fields.BinaryEthereumAddressField(db_index=True),
+                ),
+                migrations.AlterField(
+                    model_name='transaction',
+                    name='to_address',
+                    field=hub20.apps.blockchain.fields.BinaryEthereumAddressField(db_index=True),
+                ),
+                migrations.AlterField(
+                    model_name='transaction',
+                    name='data',
+                    field=hub20.apps.blockchain.fields.BinaryHexField(),
+                ),
+                migrations.AlterField(
+                    model_name='transactionlog',
+                    name='data',
+                    field=hub20.apps.blockchain.fields.BinaryHexField(),
+                ),
+                migrations.AlterField(
+                    model_name='transactionlog',
+                    name='topics',
+                    field=django.contrib.postgres.fields.ArrayField(base_field=hub20.apps.blockchain.fields.BinaryHexField(), size=None),
+                ),
+            ],
+        ),
+    ]
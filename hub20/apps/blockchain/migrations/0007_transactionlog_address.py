@@ -0,0 +1,19 @@
+# Generated by Django 3.0.7 on 2026-10-17 15:02
+
+from django.db import migrations
+import hub20.apps.blockchain.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0006_binary_hex_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionlog',
+            name='address',
+            field=hub20.apps.blockchain.fields.BinaryEthereumAddressField(null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.0.7 on 2026-10-17 16:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+import hub20.apps.blockchain.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0007_transactionlog_address'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListenerCursor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('block_number', models.PositiveIntegerField()),
+                ('block_hash', hub20.apps.blockchain.fields.BinaryHexField()),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('chain', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listener_cursors', to='blockchain.Chain')),
+            ],
+            options={
+                'unique_together': {('chain', 'name')},
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.0.7 on 2026-10-17 17:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+import hub20.apps.blockchain.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0008_listenercursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountNonce',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', hub20.apps.blockchain.fields.EthereumAddressField()),
+                ('next_nonce', models.PositiveIntegerField()),
+                ('confirmed_nonce', models.PositiveIntegerField()),
+                ('synced', models.DateTimeField(null=True)),
+                ('chain', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='account_nonces', to='blockchain.Chain')),
+            ],
+            options={
+                'unique_together': {('chain', 'address')},
+            },
+        ),
+        migrations.CreateModel(
+            name='NonceAllocation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nonce', models.PositiveIntegerField()),
+                ('transaction_hash', hub20.apps.blockchain.fields.BinaryHexField(null=True)),
+                ('released', models.BooleanField(default=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('account_nonce', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='blockchain.AccountNonce')),
+            ],
+            options={
+                'unique_together': {('account_nonce', 'nonce')},
+            },
+        ),
+    ]
@@ -1,37 +1,28 @@
 import datetime
 import logging
+from typing import Dict
 from urllib.parse import urlparse
 
 from django.conf import settings
 from django.contrib.postgres.fields import ArrayField
 from django.db import models
-from django.db.models import Avg, Max
+from django.db.models import Max
 from django.utils import timezone
 from hexbytes import HexBytes
-from web3 import Web3
-from web3.types import TxParams, Wei
 
 from .app_settings import START_BLOCK_NUMBER
 from .choices import ETHEREUM_CHAINS
-from .fields import EthereumAddressField, HexField, Uint256Field
-from .managers import TransactionManager
+from .fields import BinaryEthereumAddressField, BinaryHexField, EthereumAddressField, Uint256Field
+from .managers import (
+    AccountNonceManager,
+    BlockRangeManager,
+    ListenerCursorManager,
+    TransactionManager,
+)
 
 logger = logging.getLogger(__name__)
 
 
-def database_history_gas_price_strategy(w3: Web3, params: TxParams = None) -> Wei:
-
-    BLOCK_HISTORY_SIZE = 100
-    chain_id = int(w3.net.version)
-    current_block_number = w3.eth.blockNumber
-    default_price = Web3.toWei(1.2, "gwei")
-
-    txs = Transaction.objects.filter(
-        block__chain=chain_id, block__number__gte=current_block_number - BLOCK_HISTORY_SIZE
-    )
-    return Wei(txs.aggregate(avg_price=Avg("gas_price")).get("avg_price")) or default_price
-
-
 class Chain(models.Model):
     id = models.PositiveIntegerField(
         primary_key=True, choices=ETHEREUM_CHAINS, default=ETHEREUM_CHAINS.mainnet,
@@ -59,12 +50,12 @@ class Chain(models.Model):
 
 
 class Block(models.Model):
-    hash = HexField(max_length=64, primary_key=True)
+    hash = BinaryHexField(primary_key=True)
     chain = models.ForeignKey(Chain, on_delete=models.CASCADE, related_name="blocks")
     number = models.PositiveIntegerField(db_index=True)
     timestamp = models.DateTimeField()
-    parent_hash = HexField(max_length=64)
-    uncle_hashes = ArrayField(HexField(max_length=64))
+    parent_hash = BinaryHexField()
+    uncle_hashes = ArrayField(BinaryHexField())
 
     def __str__(self) -> str:
         hash_hex = self.hash if type(self.hash) is str else self.hash.hex()
@@ -82,18 +73,20 @@ class Block(models.Model):
     def confirmations(self) -> int:
         return self.chain.highest_block - self.number
 
+    @staticmethod
+    def get_data_fields(block_data) -> Dict:
+        block_time = datetime.datetime.fromtimestamp(block_data.timestamp)
+        return {
+            "number": block_data.number,
+            "timestamp": timezone.make_aware(block_time),
+            "parent_hash": block_data.parentHash,
+            "uncle_hashes": block_data.uncles,
+        }
+
     @classmethod
     def make(cls, block_data, chain_id: int):
-        block_time = datetime.datetime.fromtimestamp(block_data.timestamp)
         block, _ = cls.objects.update_or_create(
-            chain_id=chain_id,
-            hash=block_data.hash,
-            defaults={
-                "number": block_data.number,
-                "timestamp": timezone.make_aware(block_time),
-                "parent_hash": block_data.parentHash,
-                "uncle_hashes": block_data.uncles,
-            },
+            chain_id=chain_id, hash=block_data.hash, defaults=cls.get_data_fields(block_data)
         )
         return block
 
@@ -105,17 +98,100 @@ class Block(models.Model):
         unique_together = ("chain", "hash", "number")
 
 
+class BlockRange(models.Model):
+    chain = models.ForeignKey(Chain, on_delete=models.CASCADE, related_name="ingested_ranges")
+    first_block = models.PositiveIntegerField()
+    last_block = models.PositiveIntegerField()
+
+    objects = BlockRangeManager()
+
+    def __str__(self) -> str:
+        return f"#{self.first_block} - #{self.last_block}"
+
+    class Meta:
+        unique_together = ("chain", "first_block")
+
+
+class ListenerCursor(models.Model):
+    """
+    Last block fully processed by a listener, so that it can catch up
+    on the blocks it missed when it starts again.
+    """
+
+    chain = models.ForeignKey(Chain, on_delete=models.CASCADE, related_name="listener_cursors")
+    name = models.CharField(max_length=100)
+    block_number = models.PositiveIntegerField()
+    block_hash = BinaryHexField()
+    updated = models.DateTimeField(auto_now=True)
+
+    objects = ListenerCursorManager()
+
+    def __str__(self) -> str:
+        return f"{self.name} @ #{self.block_number}"
+
+    class Meta:
+        unique_together = ("chain", "name")
+
+
+class AccountNonce(models.Model):
+    """
+    Nonce counter of an address that we send transactions from, so that
+    parallel workers sending from the same account get sequential nonces
+    instead of all reading the same transaction count from the node.
+    """
+
+    chain = models.ForeignKey(Chain, on_delete=models.CASCADE, related_name="account_nonces")
+    address = EthereumAddressField()
+    next_nonce = models.PositiveIntegerField()
+    # Transaction count of the address (mined transactions) on the last sync with the chain
+    confirmed_nonce = models.PositiveIntegerField()
+    synced = models.DateTimeField(null=True)
+
+    objects = AccountNonceManager()
+
+    def __str__(self) -> str:
+        return f"{self.address} @ {self.next_nonce}"
+
+    class Meta:
+        unique_together = ("chain", "address")
+
+
+class NonceAllocation(models.Model):
+    """
+    Nonce handed out and not mined yet. Released allocations (the
+    transaction was never sent, or was dropped by the network) are
+    given out again before any new nonce.
+    """
+
+    account_nonce = models.ForeignKey(
+        AccountNonce, on_delete=models.CASCADE, related_name="allocations"
+    )
+    nonce = models.PositiveIntegerField()
+    transaction_hash = BinaryHexField(null=True)
+    released = models.BooleanField(default=False)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("account_nonce", "nonce")
+
+
 class Transaction(models.Model):
-    block = models.ForeignKey(Block, on_delete=models.CASCADE, related_name="transactions")
-    hash = HexField(max_length=64, db_index=True)
-    from_address = EthereumAddressField(db_index=True)
-    to_address = EthereumAddressField(db_index=True)
+    # Database constraints can not point at partitioned tables, so the
+    # references to blocks/transactions are only enforced by the ORM.
+    block = models.ForeignKey(
+        Block, on_delete=models.CASCADE, related_name="transactions", db_constraint=False
+    )
+    # Copy of block.number, used as the partition key
+    block_number = models.PositiveIntegerField(db_index=True)
+    hash = BinaryHexField(db_index=True)
+    from_address = BinaryEthereumAddressField(db_index=True)
+    to_address = BinaryEthereumAddressField(db_index=True)
     gas_used = Uint256Field()
     gas_price = Uint256Field()
     nonce = Uint256Field()
     index = Uint256Field()
     value = Uint256Field()
-    data = models.TextField()
+    data = BinaryHexField()
 
     objects = TransactionManager()
 
@@ -123,8 +199,8 @@ class Transaction(models.Model):
     def hash_hex(self):
         return self.hash if type(self.hash) is str else self.hash.hex()
 
-    @classmethod
-    def make(cls, tx_data, tx_receipt, block: Block):
+    @staticmethod
+    def is_recordable(tx_data, tx_receipt, block: Block) -> bool:
         try:
             assert tx_data.blockHash == tx_receipt.blockHash, "tx data/receipt block hash mismatch"
             assert tx_data.blockHash == HexBytes(block.hash), "Block hash mismatch"
@@ -133,23 +209,33 @@ class Transaction(models.Model):
             assert tx_data["to"] == tx_receipt["to"], "Recipient address mismatch"
             assert tx_data.transactionIndex == tx_receipt.transactionIndex, "Tx index mismatch"
             assert tx_receipt.status != 0, "Receipt indicates tx was reverted"
+            return True
         except AssertionError as exc:
             logger.warning(f"Transaction will not be recorded: {exc}")
+            return False
+
+    @staticmethod
+    def get_data_fields(tx_data, tx_receipt) -> Dict:
+        return {
+            "from_address": tx_receipt["from"],
+            "to_address": tx_receipt.to,
+            "index": tx_receipt.transactionIndex,
+            "gas_used": tx_receipt.gasUsed,
+            "gas_price": tx_data.gasPrice,
+            "nonce": tx_data.nonce,
+            "value": tx_data.value,
+            "data": tx_data.input,
+        }
+
+    @classmethod
+    def make(cls, tx_data, tx_receipt, block: Block):
+        if not cls.is_recordable(tx_data, tx_receipt, block):
             return None
 
         tx, _ = cls.objects.get_or_create(
             hash=tx_receipt.transactionHash,
             block=block,
-            defaults={
-                "from_address": tx_receipt["from"],
-                "to_address": tx_receipt.to,
-                "index": tx_receipt.transactionIndex,
-                "gas_used": tx_receipt.gasUsed,
-                "gas_price": tx_data.gasPrice,
-                "nonce": tx_data.nonce,
-                "value": tx_data.value,
-                "data": tx_data.input,
-            },
+            defaults=cls.get_data_fields(tx_data, tx_receipt),
         )
 
         for log_data in tx_receipt.logs:
@@ -157,27 +243,62 @@ class Transaction(models.Model):
 
         return tx
 
+    def save(self, *args, **kw):
+        if self.block_number is None:
+            self.block_number = self.block.number
+        super().save(*args, **kw)
+
     def __str__(self) -> str:
         return f"Tx {self.hash_hex}"
 
+    class Meta:
+        unique_together = ("block", "hash", "block_number")
+
 
 class TransactionLog(models.Model):
-    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name="logs")
+    transaction = models.ForeignKey(
+        Transaction, on_delete=models.CASCADE, related_name="logs", db_constraint=False
+    )
+    block_number = models.PositiveIntegerField(db_index=True)
     index = models.SmallIntegerField()
-    data = models.TextField()
-    topics = ArrayField(models.TextField())
+    # Contract that emitted the event. Unknown for logs recorded before it was stored.
+    address = BinaryEthereumAddressField(null=True)
+    data = BinaryHexField()
+    topics = ArrayField(BinaryHexField())
+
+    @staticmethod
+    def get_data_fields(log_data) -> Dict:
+        return {
+            "address": log_data.address,
+            "data": log_data.data,
+            "topics": [topic.hex() for topic in log_data.topics],
+        }
 
     @classmethod
     def make(cls, log_data, transaction: Transaction):
         tx_log, _ = cls.objects.get_or_create(
             index=log_data.logIndex,
             transaction=transaction,
-            defaults={"data": log_data.data, "topics": [topic.hex() for topic in log_data.topics]},
+            defaults=cls.get_data_fields(log_data),
         )
         return tx_log
 
-    class Meta:
-        unique_together = ("transaction", "index")
-
+    def save(self, *args, **kw):
+        if self.block_number is None:
+            self.block_number = self.transaction.block_number
+        super().save(*args, **kw)
 
-__all__ = ["Block", "Chain", "Transaction", "TransactionLog"]
+    class Meta:
+        unique_together = ("transaction", "index", "block_number")
+
+
+__all__ = [
+    "Block",
+    "BlockRange",
+    "Chain",
+    "ListenerCursor",
+    "AccountNonce",
+    "NonceAllocation",
+    "Transaction",
+    "TransactionLog",
+]
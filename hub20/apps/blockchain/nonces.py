@@ -0,0 +1,207 @@
+import contextlib
+import datetime
+import logging
+from typing import Iterator
+
+from django.db import transaction
+from django.utils import timezone
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+from .app_settings import NONCE_DROP_TIMEOUT, NONCE_SYNC_INTERVAL
+from .models import AccountNonce, NonceAllocation
+
+logger = logging.getLogger(__name__)
+
+# Node replies to transactions with a nonce that is already taken
+NONCE_ERRORS = ("nonce too low",)
+# Node replies to a transaction that it already has, e.g, when a request is retried
+KNOWN_TRANSACTION_ERRORS = ("already known", "known transaction")
+
+
+def _is_error(exc: Exception, errors) -> bool:
+    message = str(exc).lower()
+    return any(error in message for error in errors)
+
+
+def is_nonce_error(exc: Exception) -> bool:
+    return _is_error(exc, NONCE_ERRORS)
+
+
+def is_known_transaction_error(exc: Exception) -> bool:
+    return _is_error(exc, KNOWN_TRANSACTION_ERRORS)
+
+
+def _is_known_transaction(w3: Web3, tx_hash) -> bool:
+    try:
+        w3.eth.getTransaction(tx_hash)
+        return True
+    except TransactionNotFound:
+        return False
+
+
+def sync_account_nonce(w3: Web3, account_nonce: AccountNonce):
+    """
+    Brings a (locked) nonce counter in line with the chain: forgets the
+    allocations that were mined, skips the nonces used by transactions
+    that did not come from us and releases the allocations whose
+    transactions were never sent or were dropped by the network.
+    """
+    address = account_nonce.address
+    confirmed_nonce = w3.eth.getTransactionCount(address)
+    pending_nonce = w3.eth.getTransactionCount(address, "pending")
+
+    account_nonce.allocations.filter(nonce__lt=confirmed_nonce).delete()
+    # Nonces below the pending count are taken, whoever sent the transaction
+    account_nonce.allocations.filter(released=True, nonce__lt=pending_nonce).delete()
+
+    stale_before = timezone.now() - datetime.timedelta(seconds=NONCE_DROP_TIMEOUT)
+    stale_allocations = account_nonce.allocations.filter(released=False, created__lt=stale_before)
+    for allocation in stale_allocations:
+        tx_hash = allocation.transaction_hash
+        if tx_hash is not None and _is_known_transaction(w3, tx_hash):
+            continue
+
+        if allocation.nonce < pending_nonce:
+            logger.warning(
+                f"Nonce {allocation.nonce} of {address} was used by another transaction"
+            )
+            allocation.delete()
+        else:
+            logger.warning(f"Nonce {allocation.nonce} of {address} was not used, releasing it")
+            allocation.released = True
+            allocation.save(update_fields=["released"])
+
+    account_nonce.confirmed_nonce = confirmed_nonce
+    account_nonce.next_nonce = max(account_nonce.next_nonce, pending_nonce)
+    account_nonce.synced = timezone.now()
+    account_nonce.save()
+
+
+def _get_account_nonce(w3: Web3, chain_id: int, address: str) -> AccountNonce:
+    account_nonce = AccountNonce.objects.lock(chain_id, address)
+    if account_nonce is None:
+        AccountNonce.objects.get_or_create(
+            chain_id=chain_id,
+            address=address,
+            defaults={"next_nonce": 0, "confirmed_nonce": 0, "synced": None},
+        )
+        account_nonce = AccountNonce.objects.lock(chain_id, address)
+
+    sync_due = timezone.now() - datetime.timedelta(seconds=NONCE_SYNC_INTERVAL)
+    if account_nonce.synced is None or account_nonce.synced < sync_due:
+        sync_account_nonce(w3, account_nonce)
+
+    return account_nonce
+
+
+def _ensure_own_transaction():
+    # Counters are locked only while a nonce is handed out. Inside an
+    # outer transaction the lock (and the allocation) would depend on it
+    if transaction.get_connection().in_atomic_block:
+        raise transaction.TransactionManagementError(
+            "Nonces are allocated in their own transaction, not inside an atomic block"
+        )
+
+
+def allocate_nonce(w3: Web3, chain_id: int, address: str) -> NonceAllocation:
+    """
+    Hands out the lowest released nonce of the address, or the next one.
+    The allocation is committed before returning, so other workers can
+    allocate right away and the nonce is kept even if the caller fails.
+    """
+    _ensure_own_transaction()
+
+    with transaction.atomic():
+        account_nonce = _get_account_nonce(w3, chain_id, address)
+
+        allocation = account_nonce.allocations.filter(released=True).order_by("nonce").first()
+        if allocation is not None:
+            allocation.released = False
+            allocation.transaction_hash = None
+            allocation.created = timezone.now()
+            allocation.save()
+            return allocation
+
+        allocation = account_nonce.allocations.create(nonce=account_nonce.next_nonce)
+        account_nonce.next_nonce += 1
+        account_nonce.save(update_fields=["next_nonce"])
+        return allocation
+
+
+def mark_nonce_sent(allocation: NonceAllocation, tx_hash):
+    allocation.transaction_hash = tx_hash
+    allocation.save(update_fields=["transaction_hash"])
+
+
+def send_raw_transaction(w3: Web3, allocation: NonceAllocation, raw_transaction) -> HexBytes:
+    """
+    Sends a transaction signed with the nonce of `allocation` and marks
+    the nonce as sent. A node that already has this same transaction
+    (e.g, it got it on a request that timed out) means it was sent, so
+    its hash is returned instead of trying again with another nonce.
+    """
+    try:
+        tx_hash = w3.eth.sendRawTransaction(raw_transaction)
+    except ValueError as exc:
+        if not is_known_transaction_error(exc):
+            raise
+        tx_hash = Web3.keccak(raw_transaction)
+        logger.info(f"Transaction {tx_hash.hex()} was already sent: {exc}")
+
+    mark_nonce_sent(allocation, tx_hash)
+    return tx_hash
+
+
+def release_nonce(allocation: NonceAllocation):
+    _ensure_own_transaction()
+
+    with transaction.atomic():
+        account_nonce = AccountNonce.objects.select_for_update().get(
+            id=allocation.account_nonce_id
+        )
+
+        if allocation.nonce == account_nonce.next_nonce - 1:
+            allocation.delete()
+            account_nonce.next_nonce -= 1
+            account_nonce.save(update_fields=["next_nonce"])
+        else:
+            allocation.released = True
+            allocation.save(update_fields=["released"])
+
+
+def resync_nonce(allocation: NonceAllocation):
+    # The allocation is kept until it is mined, and the next allocation syncs with the chain
+    AccountNonce.objects.filter(id=allocation.account_nonce_id).update(synced=None)
+
+
+@contextlib.contextmanager
+def reserve_nonce(w3: Web3, chain_id: int, address: str) -> Iterator[NonceAllocation]:
+    """
+    Allocates a nonce for a transaction from `address`. The caller
+    should sign the transaction and send it with `send_raw_transaction`;
+    if anything fails before that, the nonce is given back.
+    """
+    allocation = allocate_nonce(w3, chain_id, address)
+    try:
+        yield allocation
+    except Exception as exc:
+        if is_nonce_error(exc):
+            logger.warning(f"Nonce {allocation.nonce} of {address} is taken: {exc}")
+            resync_nonce(allocation)
+        elif allocation.transaction_hash is None:
+            release_nonce(allocation)
+        raise
+
+
+__all__ = [
+    "allocate_nonce",
+    "is_known_transaction_error",
+    "is_nonce_error",
+    "mark_nonce_sent",
+    "release_nonce",
+    "reserve_nonce",
+    "send_raw_transaction",
+    "sync_account_nonce",
+]
@@ -0,0 +1,283 @@
+import logging
+import re
+from typing import List, NamedTuple, Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Max
+
+from .app_settings import PARTITION_SIZE
+from .models import Block, Chain, Transaction, TransactionLog
+
+logger = logging.getLogger(__name__)
+
+# Range-partitioned tables and their partition keys. Logs come first, so
+# that detaching old partitions never leaves logs without a transaction.
+PARTITIONED_MODELS = (
+    (TransactionLog, "block_number"),
+    (Transaction, "block_number"),
+    (Block, "number"),
+)
+PARTITION_BOUND_REGEX = re.compile(r"FROM \('?(\d+)'?\) TO \('?(\d+)'?\)")
+MAX_IDENTIFIER_LENGTH = 63
+
+
+class Partition(NamedTuple):
+    name: str
+    lower: int
+    upper: int
+
+
+def _quote(name: str) -> str:
+    return connection.ops.quote_name(name)
+
+
+def _partition_name(table: str, lower: int) -> str:
+    return f"{table}_p{lower}"
+
+
+def _default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def _legacy_name(name: str) -> str:
+    suffix = "_p0"
+    return f"{name[:MAX_IDENTIFIER_LENGTH - len(suffix)]}{suffix}"
+
+
+def is_partitioned(table: str) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table]
+        )
+        return cursor.fetchone() is not None
+
+
+def _get_partition_bounds(table: str) -> List[Tuple[str, str]]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            """,
+            [table],
+        )
+        return cursor.fetchall()
+
+
+def get_partitions(table: str) -> List[Partition]:
+    partitions = [
+        Partition(name, *map(int, PARTITION_BOUND_REGEX.search(bound).groups()))
+        for name, bound in _get_partition_bounds(table)
+        if bound != "DEFAULT"
+    ]
+    return sorted(partitions, key=lambda partition: partition.lower)
+
+
+def get_default_partition(table: str) -> Optional[str]:
+    return next((name for name, bound in _get_partition_bounds(table) if bound == "DEFAULT"), None)
+
+
+def _create_default_partition(table: str) -> str:
+    partition_name = _default_partition_name(table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE {_quote(partition_name)} PARTITION OF {_quote(table)} DEFAULT"
+        )
+    return partition_name
+
+
+def _create_partition(table: str, key: str, lower: int, upper: int, default: Optional[str]):
+    partition_name = _partition_name(table, lower)
+    bounds = f"FOR VALUES FROM ({lower}) TO ({upper})"
+    in_range = f"{_quote(key)} >= {lower} AND {_quote(key)} < {upper}"
+
+    with connection.cursor() as cursor:
+        if default is not None:
+            cursor.execute(f"SELECT 1 FROM {_quote(default)} WHERE {in_range} LIMIT 1")
+            has_default_rows = cursor.fetchone() is not None
+        else:
+            has_default_rows = False
+
+        if not has_default_rows:
+            cursor.execute(
+                f"CREATE TABLE {_quote(partition_name)} PARTITION OF {_quote(table)} {bounds}"
+            )
+            return partition_name
+
+        # Postgres refuses to create a partition for rows that are in the
+        # default partition, so they are moved into the new partition first
+        logger.info(f"Moving rows of {default} into {partition_name}")
+        cursor.execute(f"ALTER TABLE {_quote(table)} DETACH PARTITION {_quote(default)}")
+        cursor.execute(
+            f"CREATE TABLE {_quote(partition_name)} PARTITION OF {_quote(table)} {bounds}"
+        )
+        cursor.execute(
+            f"INSERT INTO {_quote(partition_name)} SELECT * FROM {_quote(default)} "
+            f"WHERE {in_range}"
+        )
+        cursor.execute(f"DELETE FROM {_quote(default)} WHERE {in_range}")
+        cursor.execute(f"ALTER TABLE {_quote(table)} ATTACH PARTITION {_quote(default)} DEFAULT")
+    return partition_name
+
+
+def _convert_table(table: str, key: str, pk: str, partition_size: int):
+    legacy_table = _partition_name(table, 0)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MAX({_quote(key)}) FROM {_quote(table)}")
+        highest = cursor.fetchone()[0] or 0
+        upper = (highest // partition_size + 1) * partition_size
+
+        cursor.execute(
+            """
+            SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u')
+            """,
+            [table],
+        )
+        constraints = cursor.fetchall()
+        cursor.execute("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s", [table])
+        indexes = [
+            (name, definition)
+            for name, definition in cursor.fetchall()
+            if name not in {constraint_name for constraint_name, _, _ in constraints}
+        ]
+        cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [table, pk])
+        sequence = cursor.fetchone()[0]
+
+        # The current table becomes the first partition, so its constraints
+        # and indexes are renamed to leave the original names to the parent.
+        cursor.execute(f"ALTER TABLE {_quote(table)} RENAME TO {_quote(legacy_table)}")
+        for name, kind, _ in constraints:
+            if kind == "p":
+                cursor.execute(
+                    f"ALTER TABLE {_quote(legacy_table)} DROP CONSTRAINT {_quote(name)}"
+                )
+            else:
+                cursor.execute(
+                    f"ALTER TABLE {_quote(legacy_table)} "
+                    f"RENAME CONSTRAINT {_quote(name)} TO {_quote(_legacy_name(name))}"
+                )
+        for name, _ in indexes:
+            cursor.execute(f"ALTER INDEX {_quote(name)} RENAME TO {_quote(_legacy_name(name))}")
+
+        cursor.execute(
+            f"CREATE TABLE {_quote(table)} "
+            f"(LIKE {_quote(legacy_table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE ({_quote(key)})"
+        )
+
+        for name, kind, definition in constraints:
+            if kind == "p":
+                definition = f"PRIMARY KEY ({_quote(pk)}, {_quote(key)})"
+            elif not re.search(rf"\b{key}\b", definition):
+                raise ValueError(f"Unique constraint {name} of {table} does not include {key}")
+
+            cursor.execute(
+                f"ALTER TABLE {_quote(table)} ADD CONSTRAINT {_quote(name)} {definition}"
+            )
+
+        for name, definition in indexes:
+            _, index_definition = definition.split(" USING ", 1)
+            cursor.execute(
+                f"CREATE INDEX {_quote(name)} ON {_quote(table)} USING {index_definition}"
+            )
+
+        if sequence:
+            cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {_quote(table)}.{_quote(pk)}")
+
+        cursor.execute(
+            f"ALTER TABLE {_quote(table)} ATTACH PARTITION {_quote(legacy_table)} "
+            f"FOR VALUES FROM (0) TO ({upper})"
+        )
+    _create_default_partition(table)
+    logger.info(f"{table} converted to partitioned table, {legacy_table} holds blocks < {upper}")
+
+
+def convert_to_partitioned_tables(partition_size: int = PARTITION_SIZE):
+    """
+    Turns the block, transaction and log tables into tables partitioned by
+    block number ranges. The existing tables are kept as one partition
+    covering all blocks recorded so far, so the conversion does not copy
+    any rows, but it still needs an exclusive lock on all three tables.
+    """
+    with transaction.atomic():
+        for model, key in PARTITIONED_MODELS:
+            table = model._meta.db_table
+            if is_partitioned(table):
+                logger.info(f"{table} is already partitioned")
+                continue
+            _convert_table(
+                table, model._meta.get_field(key).column, model._meta.pk.column, partition_size
+            )
+
+
+def create_partitions(
+    highest_block: Optional[int] = None, ahead: int = 2, partition_size: int = PARTITION_SIZE
+) -> List[str]:
+    """
+    Makes sure that there are partitions ready for at least `ahead`
+    partitions worth of blocks past the highest block of all chains.
+    Blocks past the last partition go to the default partition, and are
+    moved out of it when the partition for them is created.
+    """
+    if highest_block is None:
+        highest_block = Chain.objects.aggregate(highest=Max("highest_block"))["highest"] or 0
+
+    target = (highest_block // partition_size + 1 + ahead) * partition_size
+    created = []
+    for model, key in PARTITIONED_MODELS:
+        table = model._meta.db_table
+        if not is_partitioned(table):
+            continue
+
+        with transaction.atomic():
+            # Tables converted before there were default partitions get theirs now
+            default = get_default_partition(table)
+            if default is None:
+                default = _create_default_partition(table)
+                created.append(default)
+
+            partitions = get_partitions(table)
+            lower = max([partition.upper for partition in partitions], default=0)
+            column = model._meta.get_field(key).column
+            while lower < target:
+                upper = lower + partition_size
+                created.append(_create_partition(table, column, lower, upper, default))
+                lower = upper
+    return created
+
+
+def detach_partitions(before_block: int) -> List[str]:
+    """
+    Detaches all partitions that only hold blocks lower than
+    `before_block`. Their tables are left in place, to be archived
+    (e.g. with pg_dump) and dropped by the operator.
+    """
+    detached = []
+    with transaction.atomic():
+        for model, _ in PARTITIONED_MODELS:
+            table = model._meta.db_table
+            if not is_partitioned(table):
+                continue
+
+            with connection.cursor() as cursor:
+                for partition in get_partitions(table):
+                    if partition.upper > before_block:
+                        continue
+                    cursor.execute(
+                        f"ALTER TABLE {_quote(table)} DETACH PARTITION {_quote(partition.name)}"
+                    )
+                    detached.append(partition.name)
+    return detached
+
+
+__all__ = [
+    "convert_to_partitioned_tables",
+    "create_partitions",
+    "detach_partitions",
+    "get_default_partition",
+    "get_partitions",
+    "is_partitioned",
+]
@@ -0,0 +1,320 @@
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Any, Collection, Dict, List, Optional, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3.providers.base import JSONBaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from .app_settings import (
+    PROVIDER_HEALTH_CHECK_INTERVAL,
+    PROVIDER_POOL_CONNECTIONS,
+    PROVIDER_POOL_MAX_BLOCK_LAG,
+)
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT = 30  # In seconds
+HEALTH_CHECK_TIMEOUT = 5  # In seconds
+DEFAULT_LATENCY = 0.5  # In seconds, assumed for endpoints that were not measured yet
+LATENCY_SMOOTHING = 0.3  # Weight of the newest sample on the moving average
+RETRY_BACKOFF = 1  # In seconds, doubled on each consecutive failure
+MAX_RETRY_BACKOFF = 60  # In seconds
+
+# Filters only exist on the node where they were installed
+FILTER_CREATION_METHODS = {
+    "eth_newFilter",
+    "eth_newBlockFilter",
+    "eth_newPendingTransactionFilter",
+}
+FILTER_METHODS = {"eth_getFilterChanges", "eth_getFilterLogs", "eth_uninstallFilter"}
+FILTER_NOT_FOUND = -32000
+
+REQUEST_COUNTER = itertools.count()
+
+
+class EndpointUnavailable(Exception):
+    pass
+
+
+def _run_health_checks(pool_ref: weakref.ref, interval: float):
+    # Only a weak reference is kept, so the thread ends when the pool is discarded
+    while True:
+        pool = pool_ref()
+        if pool is None:
+            return
+        pool.check_health()
+        del pool
+        time.sleep(interval)
+
+
+class Endpoint:
+    def __init__(self, uri: str, pool_connections: int):
+        self.uri = uri
+        self.pool_connections = pool_connections
+        self.latency: Optional[float] = None
+        self.block_number: Optional[int] = None
+        self.syncing = False
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.unavailable_until = 0.0
+        self._session: Optional[requests.Session] = None
+        self._session_pid: Optional[int] = None
+
+    @property
+    def session(self) -> requests.Session:
+        # Sockets can not be shared with forked processes (e.g, celery workers)
+        if self._session is None or self._session_pid != os.getpid():
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_connections)
+            self._session = requests.Session()
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+            self._session_pid = os.getpid()
+        return self._session
+
+    def is_available(self, now: float) -> bool:
+        return self.unavailable_until <= now
+
+    def post(self, data: bytes, timeout: float = REQUEST_TIMEOUT) -> bytes:
+        response = self.session.post(
+            self.uri,
+            data=data,
+            headers={"Content-Type": "application/json"},
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        return response.content
+
+    def record_success(self, latency: float):
+        self.requests += 1
+        self.consecutive_failures = 0
+        self.unavailable_until = 0.0
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+
+    def record_failure(self, now: float):
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        backoff = RETRY_BACKOFF * 2 ** (self.consecutive_failures - 1)
+        self.unavailable_until = now + min(backoff, MAX_RETRY_BACKOFF)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": self.is_available(time.monotonic()),
+            "syncing": self.syncing,
+            "block_number": self.block_number,
+            "latency_ms": None if self.latency is None else round(self.latency * 1000, 1),
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+    def __str__(self):
+        return self.uri
+
+
+class ProviderPool(JSONBaseProvider):
+    """
+    Web3 provider that spreads the requests over a set of HTTP
+    endpoints of the same chain.
+
+    Requests go preferably to the fastest endpoints (by a moving average
+    of their response times) among those that are in sync with the
+    highest block seen on the pool. When an endpoint fails to respond,
+    it is put aside for an exponentially growing interval and the
+    request is retried on the next best one. A background thread checks
+    the block number and sync status of every endpoint periodically.
+
+    JSON-RPC errors are replies from the node and are not retried.
+    """
+
+    def __init__(
+        self,
+        endpoint_uris: Sequence[str],
+        health_check_interval: float = PROVIDER_HEALTH_CHECK_INTERVAL,
+        pool_connections: int = PROVIDER_POOL_CONNECTIONS,
+        max_block_lag: int = PROVIDER_POOL_MAX_BLOCK_LAG,
+    ):
+        if not endpoint_uris:
+            raise ValueError("Provider pool needs at least one endpoint")
+
+        self.endpoints = [Endpoint(uri, pool_connections) for uri in endpoint_uris]
+        self.health_check_interval = health_check_interval
+        self.max_block_lag = max_block_lag
+        self._lock = threading.Lock()
+        self._filter_endpoints: Dict[str, Endpoint] = {}
+        self._health_checker: Optional[threading.Thread] = None
+        self._health_checker_pid: Optional[int] = None
+        super().__init__()
+
+    def _ensure_health_checker(self):
+        if self._health_checker_pid == os.getpid() or not self.health_check_interval:
+            return
+
+        with self._lock:
+            if self._health_checker_pid != os.getpid():
+                self._health_checker = threading.Thread(
+                    target=_run_health_checks,
+                    args=(weakref.ref(self), self.health_check_interval),
+                    name="provider-pool-health",
+                    daemon=True,
+                )
+                self._health_checker.start()
+                self._health_checker_pid = os.getpid()
+
+    def _check_endpoint(self, endpoint: Endpoint):
+        try:
+            started = time.monotonic()
+            block_number = self._call(endpoint, "eth_blockNumber", [], HEALTH_CHECK_TIMEOUT)
+            latency = time.monotonic() - started
+            syncing = self._call(endpoint, "eth_syncing", [], HEALTH_CHECK_TIMEOUT)
+        except (requests.RequestException, ValueError, KeyError) as exc:
+            logger.warning(f"Health check of {endpoint} failed: {exc}")
+            with self._lock:
+                endpoint.record_failure(time.monotonic())
+            return
+
+        with self._lock:
+            endpoint.block_number = int(block_number, 16)
+            endpoint.syncing = bool(syncing)
+            endpoint.record_success(latency)
+
+    def check_health(self):
+        for endpoint in self.endpoints:
+            self._check_endpoint(endpoint)
+
+    def _call(self, endpoint: Endpoint, method: str, params: List, timeout: float) -> Any:
+        request_data = self.encode_rpc_request(RPCEndpoint(method), params)
+        response = self.decode_rpc_response(endpoint.post(request_data, timeout=timeout))
+        if "error" in response:
+            raise ValueError(response["error"])
+        return response["result"]
+
+    def _is_in_sync(self, endpoint: Endpoint, highest_block: int) -> bool:
+        if endpoint.syncing:
+            return False
+        if endpoint.block_number is None:
+            return True
+        return endpoint.block_number + self.max_block_lag >= highest_block
+
+    def get_endpoints(self) -> List[Endpoint]:
+        """
+        Endpoints in the order in which they should be tried: one of the
+        available and synced endpoints, picked at random with weights
+        inversely proportional to their latency, followed by the others
+        from the fastest to the slowest. Endpoints that failed recently
+        go last.
+        """
+        now = time.monotonic()
+
+        def latency(endpoint):
+            return endpoint.latency or DEFAULT_LATENCY
+
+        with self._lock:
+            available = [e for e in self.endpoints if e.is_available(now)]
+            unavailable = sorted(
+                [e for e in self.endpoints if not e.is_available(now)],
+                key=lambda e: e.unavailable_until,
+            )
+            highest_block = max([e.block_number or 0 for e in available], default=0)
+            synced = sorted(
+                [e for e in available if self._is_in_sync(e, highest_block)], key=latency
+            )
+            lagging = sorted([e for e in available if e not in synced], key=latency)
+
+        if synced:
+            weights = [1 / latency(endpoint) for endpoint in synced]
+            preferred = random.choices(synced, weights=weights)[0]
+            synced.remove(preferred)
+            synced.insert(0, preferred)
+
+        return synced + lagging + unavailable
+
+    def _send(self, request_data: bytes, endpoints: List[Endpoint]):
+        for endpoint in endpoints:
+            started = time.monotonic()
+            try:
+                raw_response = endpoint.post(request_data)
+                response = json.loads(raw_response)
+            except (requests.RequestException, ValueError) as exc:
+                logger.warning(f"Request to {endpoint} failed: {exc}")
+                with self._lock:
+                    endpoint.record_failure(time.monotonic())
+                continue
+
+            with self._lock:
+                endpoint.record_success(time.monotonic() - started)
+            return endpoint, response
+
+        raise EndpointUnavailable(f"None of the {len(endpoints)} endpoint(s) could be reached")
+
+    def _filter_not_found(self, filter_id) -> RPCResponse:
+        return {
+            "jsonrpc": "2.0",
+            "id": next(REQUEST_COUNTER),
+            "error": {"code": FILTER_NOT_FOUND, "message": f"filter {filter_id} not found"},
+        }
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        self._ensure_health_checker()
+        request_data = self.encode_rpc_request(method, params)
+
+        if method in FILTER_METHODS:
+            filter_id = params[0] if params else None
+            endpoint = self._filter_endpoints.get(filter_id)
+            if endpoint is None:
+                return self._filter_not_found(filter_id)
+            try:
+                _, response = self._send(request_data, [endpoint])
+            except EndpointUnavailable:
+                # The filter is lost with the endpoint, so the caller needs to make a new one
+                self._filter_endpoints.pop(filter_id, None)
+                return self._filter_not_found(filter_id)
+            if method == "eth_uninstallFilter":
+                self._filter_endpoints.pop(filter_id, None)
+            return response
+
+        endpoint, response = self._send(request_data, self.get_endpoints())
+        if method in FILTER_CREATION_METHODS and "result" in response:
+            self._filter_endpoints[response["result"]] = endpoint
+        return response
+
+    def send_batch(self, payload: List[Dict], exclude: Collection[str] = ()) -> Tuple[str, Any]:
+        """
+        Sends a batch to the best endpoint whose URI is not in `exclude`,
+        and returns the URI of the endpoint that replied with the responses.
+        """
+        self._ensure_health_checker()
+        endpoints = [endpoint for endpoint in self.get_endpoints() if endpoint.uri not in exclude]
+        endpoint, responses = self._send(json.dumps(payload).encode(), endpoints)
+        return endpoint.uri, responses
+
+    def make_batch_request(self, payload: List[Dict]) -> Any:
+        _, responses = self.send_batch(payload)
+        return responses
+
+    def isConnected(self) -> bool:
+        return any(endpoint.is_available(time.monotonic()) for endpoint in self.endpoints)
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {endpoint.uri: endpoint.stats for endpoint in self.endpoints}
+
+    def __str__(self):
+        return f"Provider pool ({', '.join(endpoint.uri for endpoint in self.endpoints)})"
+
+
+__all__ = ["EndpointUnavailable", "ProviderPool"]
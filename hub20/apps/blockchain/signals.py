@@ -1,5 +1,6 @@
 from django.dispatch import Signal
 
+block_batch_started = Signal(providing_args=["chain_id", "block_numbers"])
 block_data_received = Signal(providing_args=["chain_id", "block_data", "transactions"])
 block_sealed = Signal(providing_args=["block"])
 chain_status_synced = Signal(providing_args=["chain_id", "current_block", "synced"])
@@ -0,0 +1,253 @@
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.datastructures import AttributeDict
+
+from .app_settings import BLOCK_STORE_PATH, BLOCK_STORE_SEGMENT_SIZE
+from .batch import _format_result
+
+logger = logging.getLogger(__name__)
+
+# Index entries: key, kind, segment number, offset and length of the record
+INDEX_ENTRY = struct.Struct("<32sBIQI")
+INDEX_FILE_NAME = "index"
+SEGMENT_FILE_PREFIX = "segment-"
+
+
+class RecordKind:
+    BLOCK = 1
+    RECEIPTS = 2
+    TRANSACTION = 3  # Points at the record of the block that includes the transaction
+    NUMBER = 4  # Points at the record of the finalized block with that number
+
+
+class RecordLocation(NamedTuple):
+    segment: int
+    offset: int
+    length: int
+
+
+def _encode(data) -> bytes:
+    return zlib.compress(Web3.toJSON(data).encode())
+
+
+def _decode(payload: bytes):
+    return json.loads(zlib.decompress(payload))
+
+
+def _to_raw_block(block_data) -> Dict:
+    # Blocks are stored in the same form as they come from the node, so
+    # that they go through the same result formatters when read back.
+    raw_block = dict(block_data)
+    if "proofOfAuthorityData" in raw_block:
+        raw_block["extraData"] = raw_block.pop("proofOfAuthorityData")
+    return raw_block
+
+
+def _number_key(block_number: int) -> bytes:
+    return block_number.to_bytes(32, "big")
+
+
+class BlockStore:
+    """
+    Append-only, content-addressed store of blocks (with full transaction
+    data) and their receipts, keyed by block hash.
+
+    Records are zlib-compressed JSON appended to segment files that are
+    read through mmap. Every record gets a fixed-size entry appended to
+    the index file, which is loaded incrementally so that records written
+    by other processes become visible on the next lookup miss. Writers
+    serialize on an exclusive lock of the index file.
+    """
+
+    def __init__(self, path: str, segment_size: int = BLOCK_STORE_SEGMENT_SIZE):
+        self.path = path
+        self.segment_size = segment_size
+        self._index: Dict[Tuple[int, bytes], RecordLocation] = {}
+        self._index_offset = 0
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._lock = threading.RLock()
+
+        os.makedirs(path, exist_ok=True)
+        self._index_file = open(os.path.join(path, INDEX_FILE_NAME), "a+b")
+        self._load_index()
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.path, f"{SEGMENT_FILE_PREFIX}{segment:05d}")
+
+    def _get_writable_segment(self) -> int:
+        segments = [
+            int(file_name[len(SEGMENT_FILE_PREFIX) :])
+            for file_name in os.listdir(self.path)
+            if file_name.startswith(SEGMENT_FILE_PREFIX)
+        ]
+        segment = max(segments, default=0)
+        segment_path = self._segment_path(segment)
+        if os.path.exists(segment_path) and os.path.getsize(segment_path) >= self.segment_size:
+            segment += 1
+        return segment
+
+    def _load_index(self):
+        with self._lock:
+            self._index_file.seek(self._index_offset)
+            data = self._index_file.read()
+            complete = len(data) - len(data) % INDEX_ENTRY.size
+            for key, kind, segment, offset, length in INDEX_ENTRY.iter_unpack(data[:complete]):
+                self._index[(kind, key)] = RecordLocation(segment, offset, length)
+            self._index_offset += complete
+
+    def _lookup(self, kind: int, key: bytes) -> Optional[RecordLocation]:
+        location = self._index.get((kind, key))
+        if location is None:
+            self._load_index()
+            location = self._index.get((kind, key))
+        return location
+
+    def _read(self, location: RecordLocation) -> bytes:
+        with self._lock:
+            end = location.offset + location.length
+            segment_map = self._maps.get(location.segment)
+            if segment_map is None or len(segment_map) < end:
+                if segment_map is not None:
+                    segment_map.close()
+                with open(self._segment_path(location.segment), "rb") as segment_file:
+                    segment_map = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[location.segment] = segment_map
+            return segment_map[location.offset : end]
+
+    def _get_record(self, kind: int, key: bytes):
+        location = self._lookup(kind, key)
+        if location is None:
+            return None
+        return _decode(self._read(location))
+
+    def _append(self, records: Dict[Tuple[int, bytes], bytes], aliases: Dict):
+        with self._lock:
+            fcntl.flock(self._index_file.fileno(), fcntl.LOCK_EX)
+            try:
+                self._load_index()
+                segment = self._get_writable_segment()
+
+                entries = []
+                with open(self._segment_path(segment), "ab") as segment_file:
+                    for (kind, key), payload in records.items():
+                        location = RecordLocation(segment, segment_file.tell(), len(payload))
+                        segment_file.write(payload)
+                        entries.append(((kind, key), location))
+                    segment_file.flush()
+                    os.fsync(segment_file.fileno())
+
+                locations = dict(entries)
+                for (kind, key), target in aliases.items():
+                    entries.append(((kind, key), locations[target]))
+
+                self._index_file.write(
+                    b"".join(
+                        INDEX_ENTRY.pack(key, kind, *location) for (kind, key), location in entries
+                    )
+                )
+                self._index_file.flush()
+            finally:
+                fcntl.flock(self._index_file.fileno(), fcntl.LOCK_UN)
+            self._load_index()
+
+    def has_block(self, block_hash) -> bool:
+        return self._lookup(RecordKind.BLOCK, HexBytes(block_hash)) is not None
+
+    def get_block(self, block_hash) -> Optional[AttributeDict]:
+        raw_block = self._get_record(RecordKind.BLOCK, HexBytes(block_hash))
+        return raw_block and _format_result("eth_getBlockByHash", raw_block)
+
+    def get_block_by_number(self, block_number: int) -> Optional[AttributeDict]:
+        raw_block = self._get_record(RecordKind.NUMBER, _number_key(block_number))
+        return raw_block and _format_result("eth_getBlockByHash", raw_block)
+
+    def get_receipts(self, block_hash) -> Optional[Dict[HexBytes, AttributeDict]]:
+        raw_receipts = self._get_record(RecordKind.RECEIPTS, HexBytes(block_hash))
+        if raw_receipts is None:
+            return None
+        receipts = _format_result("eth_getBlockReceipts", raw_receipts)
+        return {receipt.transactionHash: receipt for receipt in receipts}
+
+    def get_transaction(self, transaction_hash) -> Optional[Tuple[AttributeDict, AttributeDict]]:
+        transaction_hash = HexBytes(transaction_hash)
+        raw_block = self._get_record(RecordKind.TRANSACTION, transaction_hash)
+        if raw_block is None:
+            return None
+
+        block_data = _format_result("eth_getBlockByHash", raw_block)
+        tx_receipt = (self.get_receipts(block_data.hash) or {}).get(transaction_hash)
+        tx_data = next(tx for tx in block_data.transactions if tx.hash == transaction_hash)
+        return tx_data, tx_receipt
+
+    def put_blocks(self, blocks: Sequence[Tuple], finalized_block_number: int = -1):
+        """
+        Stores (block data, {tx hash: receipt}) pairs, where blocks were
+        fetched with full transactions and have the receipts of all of
+        their transactions. Only blocks up to `finalized_block_number` are
+        indexed by number, as the block at any later height may still be
+        replaced by a reorg.
+        """
+        records: Dict[Tuple[int, bytes], bytes] = {}
+        aliases: Dict[Tuple[int, bytes], Tuple[int, bytes]] = {}
+
+        for block_data, tx_receipts in blocks:
+            block_hash = HexBytes(block_data.hash)
+            block_key = (RecordKind.BLOCK, block_hash)
+            if block_key in records or self.has_block(block_hash):
+                continue
+
+            records[block_key] = _encode(_to_raw_block(block_data))
+            records[(RecordKind.RECEIPTS, block_hash)] = _encode(
+                [tx_receipts[tx.hash] for tx in block_data.transactions]
+            )
+            aliases.update(
+                {
+                    (RecordKind.TRANSACTION, HexBytes(tx.hash)): block_key
+                    for tx in block_data.transactions
+                }
+            )
+            if block_data.number <= finalized_block_number:
+                aliases[(RecordKind.NUMBER, _number_key(block_data.number))] = block_key
+
+        if records:
+            self._append(records, aliases)
+
+    def put_block(self, block_data, tx_receipts: Dict, finalized: bool = False):
+        self.put_blocks(
+            [(block_data, tx_receipts)],
+            finalized_block_number=block_data.number if finalized else -1,
+        )
+
+    def close(self):
+        with self._lock:
+            for segment_map in self._maps.values():
+                segment_map.close()
+            self._maps.clear()
+            self._index_file.close()
+
+
+BLOCK_STORES: Dict[Tuple[int, int], BlockStore] = {}
+
+
+def get_block_store(chain_id: int) -> Optional[BlockStore]:
+    if not BLOCK_STORE_PATH:
+        return None
+
+    # Forked processes can not share the open files, so each gets its own store
+    store_key = (os.getpid(), chain_id)
+    if store_key not in BLOCK_STORES:
+        BLOCK_STORES[store_key] = BlockStore(os.path.join(BLOCK_STORE_PATH, str(chain_id)))
+    return BLOCK_STORES[store_key]
+
+
+__all__ = ["BlockStore", "get_block_store"]
@@ -0,0 +1,118 @@
+import asyncio
+import functools
+import logging
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import async_provider
+from .client import make_web3, sync_chain
+from .models import Chain
+
+logger = logging.getLogger(__name__)
+
+RESTART_BACKOFF = 1  # In seconds, doubled on each consecutive failure
+MAX_RESTART_BACKOFF = 300  # In seconds
+# Listeners that ran for this long before failing start again from the minimum backoff
+STABLE_RUN_INTERVAL = 600  # In seconds
+
+
+async def supervise(name: str, make_coroutine: Callable[[], Awaitable]):
+    """
+    Runs the coroutine returned by `make_coroutine` until it finishes
+    normally, making a new one whenever it fails, after an exponentially
+    growing delay.
+    """
+    loop = asyncio.get_event_loop()
+    failures = 0
+
+    while True:
+        started_at = loop.time()
+        try:
+            await make_coroutine()
+            logger.info(f"{name} finished")
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"{name} failed")
+
+        if loop.time() - started_at >= STABLE_RUN_INTERVAL:
+            failures = 0
+
+        delay = min(RESTART_BACKOFF * 2**failures, MAX_RESTART_BACKOFF)
+        failures += 1
+        logger.info(f"Restarting {name} in {delay} seconds")
+        await asyncio.sleep(delay)
+
+
+def get_chain_providers(chain_ids: Optional[Sequence[int]] = None) -> List[Tuple[int, str]]:
+    """
+    Returns (chain id, provider url) of the configured chains, or of the
+    ones in `chain_ids`.
+    """
+    chains = Chain.objects.order_by("id")
+    if chain_ids:
+        chains = chains.filter(id__in=chain_ids)
+    return list(chains.values_list("id", "provider_url"))
+
+
+async def _get_provider_chain_id(provider_url: str) -> int:
+    provider = async_provider.make_async_provider(make_web3(provider_url))
+    try:
+        return await async_provider.get_chain_id(provider)
+    finally:
+        await provider.close()
+
+
+async def run_chain_listeners(
+    chain_id: Optional[int], provider_url: str, listener_names: Sequence[str]
+):
+    """
+    Runs all listeners (and `sync_chain`, which keeps the chain status
+    updated) against the provider of one chain, each one with its own
+    web3 instance and restarted independently when it fails.
+    """
+    if chain_id is not None:
+        provider_chain_id = await _get_provider_chain_id(provider_url)
+        if provider_chain_id != chain_id:
+            logger.error(f"{provider_url} is on chain {provider_chain_id}, expected {chain_id}")
+            return
+
+    def make_listener_coroutine(listener):
+        # Every (re)start gets a fresh web3, so no connection state survives a failure
+        return lambda: listener(make_web3(provider_url))
+
+    listeners = [import_string(name) for name in listener_names] + [sync_chain]
+
+    await asyncio.gather(
+        *(
+            supervise(f"{listener.__name__} (chain {chain_id})", make_listener_coroutine(listener))
+            for listener in listeners
+        )
+    )
+
+
+async def run_all_chain_listeners(
+    listener_names: Sequence[str], chain_ids: Optional[Sequence[int]] = None
+):
+    chain_providers = await sync_to_async(get_chain_providers)(chain_ids)
+
+    if not chain_providers and not chain_ids:
+        # Nothing recorded yet, the chain row is created once the listeners connect
+        chain_providers = [(None, settings.WEB3_PROVIDER_URI)]
+
+    await asyncio.gather(
+        *(
+            supervise(
+                f"Listeners of chain {chain_id}",
+                functools.partial(run_chain_listeners, chain_id, provider_url, listener_names),
+            )
+            for chain_id, provider_url in chain_providers
+        )
+    )
+
+
+__all__ = ["supervise", "get_chain_providers", "run_chain_listeners", "run_all_chain_listeners"]
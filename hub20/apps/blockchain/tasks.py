@@ -0,0 +1,13 @@
+import logging
+
+from celery import shared_task
+
+from .partitions import create_partitions
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def create_block_partitions():
+    for partition_name in create_partitions():
+        logger.info(f"Created partition {partition_name}")
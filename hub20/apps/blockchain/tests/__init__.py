@@ -0,0 +1,14 @@
+from .test_async_provider import *  # noqa
+from .test_batch import *  # noqa
+from .test_bulk import *  # noqa
+from .test_client import *  # noqa
+from .test_commands import *  # noqa
+from .test_gas_price import *  # noqa
+from .test_ingest_filter import *  # noqa
+from .test_managers import *  # noqa
+from .test_middleware import *  # noqa
+from .test_nonces import *  # noqa
+from .test_partitions import *  # noqa
+from .test_provider_pool import *  # noqa
+from .test_store import *  # noqa
+from .test_supervisor import *  # noqa
@@ -0,0 +1,86 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+METHOD_NOT_FOUND = -32601
+SERVER_ERROR = -32000
+
+
+class NodeError(Exception):
+    """
+    Raised by method handlers to answer with a JSON-RPC error.
+    """
+
+
+class JSONRPCServer:
+    """
+    Stand-in for an ethereum node on a local port, answering the
+    JSON-RPC methods (and batches) given as {method: handler(*params)}.
+    """
+
+    def __init__(self, methods: Dict[str, Callable]):
+        self.methods = methods
+        self.requests: List[Dict] = []
+        self.batch_sizes: List[int] = []
+        # Like nodes that only answer the first calls of large batches
+        self.max_batch_size: Optional[int] = None
+        self.delay = 0.0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def uri(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def answer(self, request: Dict) -> Dict:
+        self.requests.append(request)
+        handler = self.methods.get(request["method"])
+        if handler is None:
+            error = {"code": METHOD_NOT_FOUND, "message": "the method does not exist"}
+            return {"jsonrpc": "2.0", "id": request["id"], "error": error}
+        try:
+            result = handler(*request.get("params", []))
+        except NodeError as exc:
+            error = {"code": SERVER_ERROR, "message": str(exc)}
+            return {"jsonrpc": "2.0", "id": request["id"], "error": error}
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if server.delay:
+                    threading.Event().wait(server.delay)
+                if isinstance(payload, list):
+                    server.batch_sizes.append(len(payload))
+                    response = [server.answer(request) for request in payload]
+                    response = response[: server.max_batch_size]
+                else:
+                    response = server.answer(payload)
+                body = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread.is_alive():
+            self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, method: str) -> int:
+        return len([request for request in self.requests if request["method"] == method])
@@ -0,0 +1,168 @@
+import asyncio
+from unittest import TestCase
+
+from hexbytes import HexBytes
+
+from hub20.apps.blockchain import async_provider
+from hub20.apps.blockchain.async_provider import AsyncHTTPProvider, RPCError
+from hub20.apps.blockchain.constants import ERC20_721_TRANSFER_TOPIC
+from hub20.apps.blockchain.tests.base import JSONRPCServer, NodeError
+
+TOKEN_ADDRESS = "0x" + "11" * 20
+BLOCK_HASH = "0x" + "aa" * 32
+TX_HASH = "0x" + "bb" * 32
+
+
+def make_log(block_number: int, log_index: int = 0):
+    return {
+        "address": TOKEN_ADDRESS,
+        "topics": [ERC20_721_TRANSFER_TOPIC],
+        "data": "0x01",
+        "blockNumber": hex(block_number),
+        "blockHash": BLOCK_HASH,
+        "transactionHash": TX_HASH,
+        "transactionIndex": "0x0",
+        "logIndex": hex(log_index),
+        "removed": False,
+    }
+
+
+async def take(stream, total: int):
+    items = []
+    try:
+        async for item in stream:
+            items.append(item)
+            if len(items) == total:
+                return items
+    finally:
+        await stream.aclose()
+
+
+class LogStreamTestCase(TestCase):
+    def setUp(self):
+        self.filter_changes = [[make_log(10), make_log(10, 1)], [], [make_log(11)]]
+        self.node = JSONRPCServer(
+            {
+                "eth_newFilter": lambda filter_params: "0x1",
+                "eth_getFilterChanges": lambda filter_id: self.filter_changes.pop(0),
+            }
+        ).start()
+
+    def tearDown(self):
+        self.node.stop()
+
+    def get_logs(self, filter_params, total):
+        async def run():
+            provider = AsyncHTTPProvider(self.node.uri)
+            try:
+                stream = async_provider.log_stream(provider, filter_params, poll_interval=0)
+                return await take(stream, total)
+            finally:
+                await provider.close()
+
+        return asyncio.run(run())
+
+    def test_http_providers_poll_a_log_filter(self):
+        filter_params = {"address": [TOKEN_ADDRESS], "topics": [ERC20_721_TRANSFER_TOPIC]}
+        logs = self.get_logs(filter_params, total=3)
+
+        self.assertEqual([log.blockNumber for log in logs], [10, 10, 11])
+        self.assertEqual([log.logIndex for log in logs], [0, 1, 0])
+        self.assertEqual(logs[0].transactionHash, HexBytes(TX_HASH))
+
+        self.assertEqual(self.node.count("eth_newFilter"), 1)
+        self.assertEqual(self.node.requests[0]["params"], [filter_params])
+
+    def test_dropped_filters_are_installed_again(self):
+        def get_filter_changes(filter_id):
+            if self.node.count("eth_newFilter") == 1:
+                raise NodeError("filter not found")
+            return [make_log(12)]
+
+        self.node.methods["eth_getFilterChanges"] = get_filter_changes
+        logs = self.get_logs({"topics": [ERC20_721_TRANSFER_TOPIC]}, total=1)
+
+        self.assertEqual(logs[0].blockNumber, 12)
+        self.assertEqual(self.node.count("eth_newFilter"), 2)
+
+
+class LogRangeStreamTestCase(TestCase):
+    def setUp(self):
+        # Like nodes that refuse to return the logs of more than a few blocks of a busy stretch
+        self.max_blocks = 4
+        self.busy_until = 100
+        self.node = JSONRPCServer({"eth_getLogs": self.get_logs}).start()
+
+    def tearDown(self):
+        self.node.stop()
+
+    def get_logs(self, filter_params):
+        lower, upper = int(filter_params["fromBlock"], 16), int(filter_params["toBlock"], 16)
+        busy_blocks = range(lower, min(upper + 1, self.busy_until))
+        if len(busy_blocks) > self.max_blocks:
+            raise NodeError("query returned more than 10000 results")
+        return [make_log(block_number) for block_number in busy_blocks]
+
+    def get_ranges(self, start, end, range_size, **kw):
+        async def run():
+            provider = AsyncHTTPProvider(self.node.uri)
+            try:
+                return [
+                    item
+                    async for item in async_provider.log_range_stream(
+                        provider, {"address": [TOKEN_ADDRESS]}, start, end, range_size, **kw
+                    )
+                ]
+            finally:
+                await provider.close()
+
+        return asyncio.run(run())
+
+    def get_requested_sizes(self):
+        return [
+            int(request["params"][0]["toBlock"], 16)
+            - int(request["params"][0]["fromBlock"], 16)
+            + 1
+            for request in self.node.requests
+        ]
+
+    def test_ranges_with_too_many_results_are_split(self):
+        ranges = self.get_ranges(0, 20, range_size=16)
+
+        self.assertEqual((ranges[0][0], ranges[-1][1]), (0, 20))
+        for (_, upper, _), (next_lower, _, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(upper, next_lower)
+        self.assertTrue(all(upper - lower <= self.max_blocks for lower, upper, _ in ranges))
+        self.assertEqual(
+            [log.blockNumber for _, _, logs in ranges for log in logs], list(range(20))
+        )
+        self.assertEqual(self.get_requested_sizes()[:3], [16, 8, 4])
+
+    def test_ranges_grow_again_after_the_busy_stretch(self):
+        self.busy_until = 10
+        ranges = self.get_ranges(0, 200, range_size=16, max_range_size=64)
+
+        self.assertEqual(ranges[-1][1], 200)
+        quiet_sizes = [upper - lower for lower, upper, _ in ranges if lower >= 10]
+        self.assertGreater(max(quiet_sizes), 16)
+        self.assertTrue(all(size < 64 for size in self.get_requested_sizes()))
+
+    def test_other_errors_are_raised(self):
+        def get_logs(filter_params):
+            raise NodeError("invalid argument")
+
+        self.node.methods["eth_getLogs"] = get_logs
+
+        with self.assertRaises(RPCError):
+            self.get_ranges(0, 20, range_size=16)
+        self.assertEqual(self.get_requested_sizes(), [16])
+
+    def test_single_blocks_with_too_many_results_are_raised(self):
+        self.max_blocks = 0
+
+        with self.assertRaises(RPCError):
+            self.get_ranges(0, 20, range_size=4)
+        self.assertEqual(self.get_requested_sizes(), [4, 2, 1])
+
+
+__all__ = ["LogStreamTestCase", "LogRangeStreamTestCase"]
@@ -0,0 +1,154 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.datastructures import AttributeDict
+from web3.providers import BaseProvider, HTTPProvider
+
+from hub20.apps.blockchain import batch, client
+from hub20.apps.blockchain.batch import (
+    BatchRequestError,
+    MissingReceiptsError,
+    check_block_receipts,
+    get_block_receipts,
+    get_transaction_receipts,
+    make_batch_request,
+)
+from hub20.apps.blockchain.tests.base import JSONRPCServer, NodeError
+
+BLOCK_HASH = "0x" + "aa" * 32
+
+
+def make_tx_hash(index: int) -> str:
+    return "0x" + f"{index:064x}"
+
+
+def make_receipt(tx_hash):
+    return {
+        "transactionHash": tx_hash,
+        "blockHash": BLOCK_HASH,
+        "blockNumber": "0x1",
+        "transactionIndex": "0x0",
+        "status": "0x1",
+        "logs": [],
+    }
+
+
+def make_block_data(total_transactions: int) -> AttributeDict:
+    tx_hashes = [HexBytes(make_tx_hash(index)) for index in range(total_transactions)]
+    return AttributeDict({"hash": HexBytes(BLOCK_HASH), "number": 1, "transactions": tx_hashes})
+
+
+class StubProvider(BaseProvider):
+    """
+    Provider without batches (like the websocket and IPC ones)
+    """
+
+    def __init__(self, methods):
+        self.methods = methods
+        self.calls = []
+
+    def make_request(self, method, params):
+        self.calls.append((method, params))
+        return {"jsonrpc": "2.0", "id": len(self.calls), "result": self.methods[method](*params)}
+
+
+class BatchRequestTestCase(TestCase):
+    def setUp(self):
+        self.node = JSONRPCServer(
+            {"net_version": lambda: "2", "eth_getTransactionReceipt": make_receipt}
+        ).start()
+        self.w3 = Web3(HTTPProvider(self.node.uri))
+
+        patcher = patch.dict(batch.BLOCK_RECEIPTS_SUPPORT, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.node.stop()
+
+    def test_calls_are_sent_in_batches(self):
+        tx_hashes = [make_tx_hash(index) for index in range(5)]
+        receipts = get_transaction_receipts(self.w3, tx_hashes)
+
+        self.assertEqual(self.node.batch_sizes, [5])
+        self.assertEqual([r.transactionHash for r in receipts], [HexBytes(h) for h in tx_hashes])
+
+        make_batch_request(self.w3, "eth_getTransactionReceipt", [(h,) for h in tx_hashes], 2)
+        self.assertEqual(self.node.batch_sizes, [5, 2, 2, 1])
+
+    def test_calls_are_sent_one_by_one_without_batch_support(self):
+        provider = StubProvider({"eth_getTransactionReceipt": make_receipt})
+        tx_hashes = [make_tx_hash(index) for index in range(3)]
+
+        receipts = get_transaction_receipts(Web3(provider), tx_hashes)
+
+        self.assertEqual(len(provider.calls), 3)
+        self.assertEqual([r.transactionHash for r in receipts], [HexBytes(h) for h in tx_hashes])
+
+    def test_incomplete_batches_are_split(self):
+        self.node.max_batch_size = 2
+        tx_hashes = [make_tx_hash(index) for index in range(5)]
+
+        receipts = get_transaction_receipts(self.w3, tx_hashes)
+
+        self.assertEqual([r.transactionHash for r in receipts], [HexBytes(h) for h in tx_hashes])
+        self.assertEqual(self.node.batch_sizes, [5, 2, 3, 1, 2])
+
+    def test_failing_calls_are_retried_on_their_own(self):
+        failed = set()
+
+        def get_receipt(tx_hash):
+            # Fails once, like a node that is momentarily overloaded
+            if tx_hash == make_tx_hash(3) and tx_hash not in failed:
+                failed.add(tx_hash)
+                raise NodeError("request timed out")
+            return make_receipt(tx_hash)
+
+        self.node.methods["eth_getTransactionReceipt"] = get_receipt
+        receipts = get_transaction_receipts(self.w3, [make_tx_hash(i) for i in range(4)])
+
+        self.assertEqual(len(receipts), 4)
+        self.assertEqual(self.node.batch_sizes, [4, 2, 2])
+
+    def test_calls_that_always_fail_are_raised(self):
+        def get_receipt(tx_hash):
+            if tx_hash == make_tx_hash(1):
+                raise NodeError("request timed out")
+            return make_receipt(tx_hash)
+
+        self.node.methods["eth_getTransactionReceipt"] = get_receipt
+        with self.assertRaises(BatchRequestError) as context:
+            get_transaction_receipts(self.w3, [make_tx_hash(i) for i in range(4)])
+
+        self.assertEqual(context.exception.endpoint_uri, self.node.uri)
+        self.assertEqual(self.node.batch_sizes, [4, 2, 1, 1])
+
+    def test_unsupported_methods_are_not_split(self):
+        block_data = make_block_data(total_transactions=2)
+
+        receipts = get_block_receipts(self.w3, [block_data, block_data, block_data])
+
+        self.assertEqual(self.node.count("eth_getBlockReceipts"), 3)
+        self.assertEqual(batch.BLOCK_RECEIPTS_SUPPORT, {self.node.uri: False})
+        self.assertEqual(len(receipts[HexBytes(BLOCK_HASH)]), 2)
+
+    def test_missing_receipts_are_reported(self):
+        self.node.methods["eth_getTransactionReceipt"] = (
+            lambda tx_hash: None if tx_hash == make_tx_hash(1) else make_receipt(tx_hash)
+        )
+        block_data = make_block_data(total_transactions=3)
+
+        tx_receipts = get_block_receipts(self.w3, [block_data])[HexBytes(BLOCK_HASH)]
+        with self.assertRaises(MissingReceiptsError) as context:
+            check_block_receipts(block_data, tx_receipts)
+        self.assertEqual(context.exception.transaction_hashes, [HexBytes(make_tx_hash(1))])
+
+        with patch.object(client, "RECEIPT_RETRY_INTERVAL", 0):
+            with self.assertRaises(MissingReceiptsError):
+                client.fetch_block_receipts(self.w3, block_data, attempts=2)
+        self.assertEqual(self.node.count("eth_getTransactionReceipt"), 9)
+
+
+__all__ = ["BatchRequestTestCase"]
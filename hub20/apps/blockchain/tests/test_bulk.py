@@ -0,0 +1,163 @@
+import os
+
+import pytest
+from django.db.models.signals import post_save
+from django.test import TestCase
+from hexbytes import HexBytes
+
+from hub20.apps.blockchain.bulk import bulk_record_block, send_created_signals
+from hub20.apps.blockchain.factories import SyncedChainFactory
+from hub20.apps.blockchain.models import Block, Transaction, TransactionLog
+from hub20.apps.blockchain.tests.mocks import (
+    BlockMock,
+    TransactionDataMock,
+    TransactionReceiptDataMock,
+    Web3Model,
+)
+
+
+def random_hash() -> HexBytes:
+    return HexBytes(os.urandom(32))
+
+
+def make_block_data(total_transactions=3):
+    block_hash = random_hash()
+    block_data = BlockMock(hash=block_hash, parentHash=random_hash(), transactions=[])
+    block_data.transactions.extend(
+        TransactionDataMock(
+            hash=random_hash(),
+            blockHash=block_hash,
+            blockNumber=block_data.number,
+            transactionIndex=index,
+        )
+        for index in range(total_transactions)
+    )
+    return block_data
+
+
+def make_receipt(tx_data, status=1):
+    return TransactionReceiptDataMock(
+        hash=tx_data.hash,
+        blockHash=tx_data.blockHash,
+        blockNumber=tx_data.blockNumber,
+        from_address=tx_data["from"],
+        to=tx_data.to,
+        transactionIndex=tx_data.transactionIndex,
+        status=status,
+        logs=[
+            Web3Model(logIndex=index, address=tx_data.to, data="0x01", topics=[random_hash()])
+            for index in range(2)
+        ],
+    )
+
+
+def get_recorded_rows():
+    return (
+        list(Block.objects.values("hash", "chain", "number", "parent_hash", "uncle_hashes")),
+        list(
+            Transaction.objects.order_by("index").values(
+                "hash", "block", "block_number", "from_address", "to_address", "index", "data"
+            )
+        ),
+        list(
+            TransactionLog.objects.order_by("transaction__index", "index").values(
+                "transaction__hash", "block_number", "index", "address", "data", "topics"
+            )
+        ),
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+class BulkRecordBlockTestCase(TestCase):
+    def setUp(self):
+        self.chain = SyncedChainFactory()
+        self.block_data = make_block_data()
+        first_tx, second_tx, reverted_tx = self.block_data.transactions
+        # Transactions without a receipt are left out, reverted ones are not recordable
+        self.tx_receipts = {
+            first_tx.hash: make_receipt(first_tx),
+            reverted_tx.hash: make_receipt(reverted_tx, status=0),
+        }
+
+    def record_with_make(self):
+        block = Block.make(self.block_data, chain_id=self.chain.id)
+        for tx_data in self.block_data.transactions:
+            tx_receipt = self.tx_receipts.get(tx_data.hash)
+            if tx_receipt is not None:
+                Transaction.make(tx_data=tx_data, tx_receipt=tx_receipt, block=block)
+
+    def test_bulk_insert_records_same_rows_as_make(self):
+        self.record_with_make()
+        expected = get_recorded_rows()
+        Block.objects.filter(hash=self.block_data.hash).delete()
+        TransactionLog.objects.all().delete()
+        Transaction.objects.all().delete()
+
+        recorded = bulk_record_block(self.block_data, self.tx_receipts, chain_id=self.chain.id)
+
+        self.assertTrue(recorded.created)
+        self.assertEqual(len(recorded.transactions), 1)
+        self.assertEqual(len(recorded.logs), 2)
+        self.assertEqual(get_recorded_rows(), expected)
+
+    def test_recording_again_leaves_rows_untouched(self):
+        bulk_record_block(self.block_data, self.tx_receipts, chain_id=self.chain.id)
+        expected = get_recorded_rows()
+
+        recorded = bulk_record_block(self.block_data, self.tx_receipts, chain_id=self.chain.id)
+
+        self.assertFalse(recorded.created)
+        self.assertEqual(HexBytes(recorded.block.hash), self.block_data.hash)
+        self.assertEqual(recorded.transactions, [])
+        self.assertEqual(recorded.logs, [])
+        self.assertEqual(get_recorded_rows(), expected)
+
+    def test_bulk_insert_completes_blocks_recorded_with_make(self):
+        self.record_with_make()
+        expected = get_recorded_rows()
+        TransactionLog.objects.filter(index=1).delete()
+        second_tx = self.block_data.transactions[1]
+        self.tx_receipts[second_tx.hash] = make_receipt(second_tx)
+
+        recorded = bulk_record_block(self.block_data, self.tx_receipts, chain_id=self.chain.id)
+
+        self.assertFalse(recorded.created)
+        self.assertEqual([HexBytes(tx.hash) for tx in recorded.transactions], [second_tx.hash])
+        # The missing log of the transaction that was there is recorded as well
+        self.assertEqual(len(recorded.logs), 3)
+        blocks, transactions, logs = get_recorded_rows()
+        self.assertEqual(blocks, expected[0])
+        self.assertEqual(len(transactions), 2)
+        self.assertEqual(len(logs), 4)
+
+    def test_signals_are_sent_only_for_created_rows(self):
+        created = []
+
+        def on_saved(sender, **kw):
+            created.append((sender, kw["created"]))
+
+        post_save.connect(on_saved)
+        try:
+            send_created_signals(
+                bulk_record_block(self.block_data, self.tx_receipts, chain_id=self.chain.id)
+            )
+            self.assertEqual(
+                created,
+                [
+                    (Block, True),
+                    (Transaction, True),
+                    (TransactionLog, True),
+                    (TransactionLog, True),
+                ],
+            )
+
+            created.clear()
+            send_created_signals(
+                bulk_record_block(self.block_data, self.tx_receipts, chain_id=self.chain.id)
+            )
+            self.assertEqual(created, [])
+        finally:
+            post_save.disconnect(on_saved)
+
+
+__all__ = ["BulkRecordBlockTestCase"]
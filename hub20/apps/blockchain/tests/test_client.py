@@ -0,0 +1,158 @@
+from unittest.mock import Mock, patch
+
+from django.test import TestCase
+from hexbytes import HexBytes
+from web3.datastructures import AttributeDict
+from web3.exceptions import BlockNotFound
+
+from hub20.apps.blockchain import client
+from hub20.apps.blockchain.app_settings import RPC_BATCH_SIZE
+from hub20.apps.blockchain.batch import MissingReceiptsError
+from hub20.apps.blockchain.factories import ChainFactory
+from hub20.apps.blockchain.models import Block, BlockRange, ListenerCursor
+from hub20.apps.blockchain.signals import block_batch_started
+
+
+class RunBackfillTestCase(TestCase):
+    def setUp(self):
+        self.w3 = Mock()
+        self.w3.net.version = "2"
+
+    @patch.object(client, "fetch_blocks", return_value=[])
+    def test_batches_of_blocks_are_announced(self, fetch_blocks):
+        receiver = Mock()
+        block_batch_started.connect(receiver, sender=Block)
+        self.addCleanup(block_batch_started.disconnect, receiver, sender=Block)
+
+        gaps = [(0, 2 * RPC_BATCH_SIZE + 1)]
+        with patch.object(BlockRange.objects, "get_gaps", return_value=gaps):
+            client.run_backfill(self.w3, 0, 2 * RPC_BATCH_SIZE + 1)
+
+        self.assertEqual(receiver.call_count, 3)
+        self.assertEqual(fetch_blocks.call_count, 3)
+        self.assertEqual(receiver.call_args[1]["block_numbers"], [2 * RPC_BATCH_SIZE])
+
+
+class RecordBlocksTestCase(TestCase):
+    def setUp(self):
+        self.chain = ChainFactory()
+        self.w3 = Mock()
+        self.w3.net.version = str(self.chain.id)
+
+        self.recorded = []
+        patchers = [
+            patch.object(client, "bulk_record_block", side_effect=self.bulk_record_block),
+            patch.object(client, "send_created_signals"),
+            patch.object(client, "get_ingest_filter", return_value=None),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def bulk_record_block(self, block_data, tx_receipts, chain_id):
+        if block_data.number == 13:
+            raise ValueError("Block can not be recorded")
+        self.recorded.append(block_data.number)
+        return Mock(block=block_data.number)
+
+    def make_blocks(self, *block_numbers):
+        return [
+            (AttributeDict({"number": n, "timestamp": 0, "transactions": []}), {})
+            for n in block_numbers
+        ]
+
+    def get_ranges(self):
+        return list(
+            BlockRange.objects.filter(chain=self.chain)
+            .order_by("first_block")
+            .values_list("first_block", "last_block")
+        )
+
+    def test_ingested_ranges_are_marked_once_per_batch(self):
+        with patch.object(
+            BlockRange.objects, "mark_ingested", wraps=BlockRange.objects.mark_ingested
+        ) as mark_ingested:
+            client.record_blocks(self.make_blocks(7, 10, 11, 12), chain_id=self.chain.id)
+
+        self.assertEqual(self.recorded, [7, 10, 11, 12])
+        self.assertEqual(mark_ingested.call_count, 2)
+        self.assertEqual(self.get_ranges(), [(7, 7), (10, 12)])
+
+    def test_ingested_ranges_are_marked_in_the_same_transaction(self):
+        with self.assertRaises(ValueError):
+            client.record_blocks(self.make_blocks(10, 11, 12, 13), chain_id=self.chain.id)
+
+        self.assertEqual(self.get_ranges(), [])
+
+    def test_backfill_leaves_out_blocks_with_missing_receipts(self):
+        def select_block_receipts(block_data, tx_receipts, chain_id):
+            if block_data.number == 11:
+                raise MissingReceiptsError("0x" + "aa" * 32, [])
+            return tx_receipts
+
+        with patch.object(
+            client, "fetch_blocks", return_value=self.make_blocks(10, 11, 12)
+        ), patch.object(client, "select_block_receipts", select_block_receipts):
+            client.run_backfill(self.w3, 10, 13)
+
+        self.assertEqual(self.recorded, [10, 12])
+        self.assertEqual(self.get_ranges(), [(10, 10), (12, 12)])
+
+
+def make_block_hash(block_number: int, fork: int = 0) -> HexBytes:
+    return HexBytes(bytes([fork]) + block_number.to_bytes(31, "big"))
+
+
+class ListenerCursorTestCase(TestCase):
+    def setUp(self):
+        self.chain = ChainFactory()
+        self.w3 = Mock()
+        self.w3.eth.getBlock.side_effect = lambda number: AttributeDict(
+            {"number": number, "hash": make_block_hash(number)}
+        )
+
+    def move_cursor(self, block_number: int, fork: int = 0) -> ListenerCursor:
+        return ListenerCursor.objects.move_to(
+            self.chain.id, "listener", block_number, make_block_hash(block_number, fork)
+        )
+
+    def test_cursors_are_moved_in_place(self):
+        self.move_cursor(10)
+        cursor = self.move_cursor(20)
+
+        self.assertEqual(ListenerCursor.objects.get(), cursor)
+        self.assertEqual(cursor.block_number, 20)
+        self.assertEqual(HexBytes(cursor.block_hash), make_block_hash(20))
+
+    def test_listeners_resume_after_the_block_of_their_cursor(self):
+        cursor = self.move_cursor(100)
+
+        self.assertEqual(client.get_resume_block_number(self.w3, cursor), 101)
+
+    def test_listeners_go_back_when_their_block_was_reorged_out(self):
+        cursor = self.move_cursor(100, fork=1)
+        self.assertEqual(
+            client.get_resume_block_number(self.w3, cursor), 100 - client.CURSOR_REORG_DEPTH
+        )
+
+        self.w3.eth.getBlock.side_effect = BlockNotFound
+        self.assertEqual(
+            client.get_resume_block_number(self.w3, cursor), 100 - client.CURSOR_REORG_DEPTH
+        )
+
+        cursor = self.move_cursor(3, fork=1)
+        self.assertEqual(client.get_resume_block_number(self.w3, cursor), 0)
+
+    def test_missed_blocks_are_caught_up_in_batches(self):
+        self.assertEqual(client.get_catch_up_ranges(self.w3, self.chain.id, "listener", 110), [])
+
+        self.move_cursor(100)
+        with patch.object(client, "RPC_BATCH_SIZE", 4):
+            ranges = client.get_catch_up_ranges(self.w3, self.chain.id, "listener", 110)
+            self.assertEqual(ranges, [(101, 105), (105, 109), (109, 111)])
+            self.assertEqual(
+                client.get_catch_up_ranges(self.w3, self.chain.id, "listener", 100), []
+            )
+
+
+__all__ = ["RunBackfillTestCase", "RecordBlocksTestCase", "ListenerCursorTestCase"]
@@ -0,0 +1,119 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest.mock import Mock, patch
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from web3 import Web3
+from web3.providers import HTTPProvider
+
+from hub20.apps.blockchain import batch, client
+from hub20.apps.blockchain.tests.base import JSONRPCServer
+
+
+def make_block(block_number: int):
+    block_hash = "0x" + f"{block_number:064x}"
+    tx_hashes = ["0x" + f"{block_number:032x}{index:032x}" for index in range(3)]
+    transactions = [
+        {
+            "hash": tx_hash,
+            "blockHash": block_hash,
+            "blockNumber": hex(block_number),
+            "from": "0x" + "11" * 20,
+            "to": "0x" + "22" * 20,
+            "value": "0x0",
+            "gas": "0x5208",
+            "gasPrice": "0x1",
+            "nonce": hex(index),
+            "input": "0x",
+            "transactionIndex": hex(index),
+        }
+        for index, tx_hash in enumerate(tx_hashes)
+    ]
+    return {"number": hex(block_number), "hash": block_hash, "transactions": transactions}
+
+
+def make_receipt(tx_hash):
+    return {"transactionHash": tx_hash, "status": "0x1", "logs": []}
+
+
+class SyncBlockchainTestCase(TestCase):
+    def setUp(self):
+        patcher = patch(
+            "hub20.apps.blockchain.management.commands.sync_blockchain.get_web3",
+            return_value=Mock(),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # The command closes the event loop when done
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        self.addCleanup(asyncio.set_event_loop, None)
+
+    def _sync(self, *args) -> str:
+        out = StringIO()
+        call_command("sync_blockchain", *args, stdout=out)
+        return out.getvalue()
+
+    @patch.object(client, "run_backfill")
+    @patch.object(client, "get_missing_block_ranges", return_value=[(0, 10), (10, 15)])
+    def test_range_size_is_used_without_workers(self, get_missing_block_ranges, run_backfill):
+        self._sync("--start", "5", "--range-size", "10")
+
+        self.assertEqual(get_missing_block_ranges.call_args[0][1:], (5, 10))
+        self.assertEqual(
+            [(call[1]["start"], call[1]["end"]) for call in run_backfill.call_args_list],
+            [(0, 10), (10, 15)],
+        )
+
+    @patch.object(client, "connections")
+    @patch.object(client, "_init_backfill_worker")
+    @patch.object(client, "ProcessPoolExecutor", ThreadPoolExecutor)
+    @patch.object(client, "get_missing_block_ranges", return_value=[(0, 10), (10, 20), (20, 30)])
+    def test_failed_ranges_are_reported(self, *mocks):
+        def run_backfill_worker(provider_url, start, end):
+            if start == 10:
+                raise ConnectionError("node went away")
+            return os.getpid(), start, end
+
+        with patch.object(client, "_run_backfill_worker", run_backfill_worker):
+            with self.assertRaises(CommandError):
+                self._sync("--workers", "2")
+
+            failed_ranges = client.download_chain_in_parallel("http://node", workers=2)
+        self.assertEqual(failed_ranges, [(10, 20)])
+
+
+class BenchmarkRPCBatchTestCase(TestCase):
+    def setUp(self):
+        self.node = JSONRPCServer(
+            {
+                "eth_blockNumber": lambda: hex(100),
+                "eth_getBlockByNumber": lambda number, full: make_block(int(number, 16)),
+                "eth_getTransactionReceipt": make_receipt,
+            }
+        ).start()
+        self.addCleanup(self.node.stop)
+
+        patcher = patch(
+            "hub20.apps.blockchain.management.commands.benchmark_rpc_batch.get_web3",
+            return_value=Web3(HTTPProvider(self.node.uri)),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_blocks_are_fetched_both_ways(self):
+        out = StringIO()
+        with patch.dict(batch.BLOCK_RECEIPTS_SUPPORT, clear=True):
+            call_command("benchmark_rpc_batch", "--count", "4", stdout=out)
+
+        self.assertIn("4 blocks (12 transactions) from #96", out.getvalue())
+        # Each block and receipt is fetched once one by one and once in a batch
+        self.assertEqual(self.node.count("eth_getBlockByNumber"), 8)
+        self.assertEqual(self.node.count("eth_getTransactionReceipt"), 24)
+        self.assertEqual(self.node.batch_sizes, [4, 4, 12])
+
+
+__all__ = ["SyncBlockchainTestCase", "BenchmarkRPCBatchTestCase"]
@@ -0,0 +1,85 @@
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from django.core.cache import cache
+from web3 import Web3
+from web3.datastructures import AttributeDict
+
+from hub20.apps.blockchain import gas_price
+from hub20.apps.blockchain.gas_price import DEFAULT_PRICE, GasPriceOracle, _percentile
+
+
+def make_block_data(number, gas_prices, timestamp=None):
+    return AttributeDict(
+        {
+            "number": number,
+            "timestamp": int(time.time()) if timestamp is None else timestamp,
+            "transactions": [AttributeDict({"gasPrice": price}) for price in gas_prices],
+        }
+    )
+
+
+class GasPriceOracleTestCase(TestCase):
+    def setUp(self):
+        self.oracle = GasPriceOracle(chain_id=2, history_size=3)
+        self.oracle.clear()
+        self.addCleanup(self.oracle.clear)
+
+    def test_percentiles_use_the_nearest_rank(self):
+        values = list(range(1, 11))
+        self.assertEqual(_percentile(values, 25), 3)
+        self.assertEqual(_percentile(values, 50), 5)
+        self.assertEqual(_percentile(values, 90), 9)
+        self.assertEqual(_percentile([7], 90), 7)
+
+    def test_default_price_is_used_without_estimates(self):
+        self.assertIsNone(self.oracle.get_estimates())
+        self.assertEqual(self.oracle.get_gas_price(), DEFAULT_PRICE)
+
+        self.oracle.update(1, [])
+        self.assertEqual(self.oracle.get_gas_price(), DEFAULT_PRICE)
+
+    def test_estimates_are_the_median_of_the_recent_blocks(self):
+        self.oracle.update(1, [10, 20, 30, 40])
+        self.oracle.update(2, [100, 200, 300, 400])
+        self.oracle.update(3, [1, 2, 3, 4])
+
+        self.assertEqual(self.oracle.get_estimates(), {"p25": 10, "p50": 20, "p90": 40})
+        self.assertEqual(self.oracle.get_gas_price(90), 40)
+
+        # Only the last `history_size` blocks count
+        self.oracle.update(4, [1000, 2000, 3000, 4000])
+        self.oracle.update(5, [1000, 2000, 3000, 4000])
+        self.assertEqual(self.oracle.get_gas_price(), 2000)
+
+    def test_reingested_blocks_are_ignored(self):
+        self.oracle.update(10, [50])
+        self.oracle.update(10, [1000])
+        self.oracle.update(9, [1000])
+
+        self.assertEqual(len(cache.get(self.oracle.history_key)), 1)
+        self.assertEqual(self.oracle.get_gas_price(), 50)
+
+    def test_old_blocks_are_ignored(self):
+        self.oracle.update_from_block(make_block_data(1, [Web3.toWei(1, "gwei")], timestamp=0))
+        self.assertIsNone(self.oracle.get_estimates())
+
+        self.oracle.update_from_block(make_block_data(2, [Web3.toWei(1, "gwei")]))
+        self.assertEqual(self.oracle.get_gas_price(), Web3.toWei(1, "gwei"))
+
+    def test_updates_wait_for_the_lock(self):
+        cache.add(self.oracle.lock_key, "other process")
+
+        with patch.object(gas_price, "UPDATE_LOCK_RETRY_INTERVAL", 0):
+            self.oracle.update(1, [10])
+        self.assertIsNone(self.oracle.get_estimates())
+        self.assertEqual(cache.get(self.oracle.lock_key), "other process")
+
+        cache.delete(self.oracle.lock_key)
+        self.oracle.update(1, [10])
+        self.assertEqual(self.oracle.get_gas_price(), 10)
+        self.assertIsNone(cache.get(self.oracle.lock_key))
+
+
+__all__ = ["GasPriceOracleTestCase"]
@@ -0,0 +1,144 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from eth_utils import keccak
+from hexbytes import HexBytes
+from web3.datastructures import AttributeDict
+
+from hub20.apps.blockchain import ingest_filter
+from hub20.apps.blockchain.batch import MissingReceiptsError
+from hub20.apps.blockchain.ingest_filter import IngestFilter, get_ingest_filter
+
+WATCHED_ACCOUNT = "0x" + "aa" * 20
+WATCHED_CONTRACT = "0x" + "bb" * 20
+OTHER_ADDRESS = "0x" + "cc" * 20
+OTHER_CONTRACT = "0x" + "dd" * 20
+TRANSFER_TOPIC = "0x" + "ee" * 32
+
+
+def make_logs_bloom(*values) -> HexBytes:
+    """
+    Bloom as computed by the nodes (see geth's bloom9): each value sets
+    three bits, counted from the last byte of the 256-byte filter.
+    """
+    bloom = bytearray(256)
+    for value in values:
+        value_hash = keccak(HexBytes(value))
+        for index in (0, 2, 4):
+            bit = ((value_hash[index] << 8) + value_hash[index + 1]) & 2047
+            bloom[255 - bit // 8] |= 1 << (bit % 8)
+    return HexBytes(bytes(bloom))
+
+
+def to_topic(address: str) -> HexBytes:
+    return HexBytes(HexBytes(address).rjust(32, b"\0"))
+
+
+def make_transaction(index: int, sender: str = OTHER_ADDRESS, to: str = OTHER_CONTRACT):
+    return AttributeDict({"hash": HexBytes(bytes([index]) * 32), "from": sender, "to": to})
+
+
+def make_block(logs_bloom: HexBytes, *transactions):
+    return AttributeDict(
+        {"hash": HexBytes("0x" + "11" * 32), "logsBloom": logs_bloom, "transactions": transactions}
+    )
+
+
+def make_receipt(tx_data, *logs):
+    return AttributeDict(
+        {
+            "transactionHash": tx_data.hash,
+            "logs": [
+                AttributeDict({"address": address, "topics": topics}) for address, topics in logs
+            ],
+        }
+    )
+
+
+def load_watched_addresses(chain_id):
+    return [WATCHED_ACCOUNT], [WATCHED_CONTRACT]
+
+
+class IngestFilterTestCase(TestCase):
+    def setUp(self):
+        self.filter = IngestFilter(accounts=[WATCHED_ACCOUNT], contracts=[WATCHED_CONTRACT])
+        self.transactions = [make_transaction(index) for index in range(3)]
+
+    def test_blocks_with_logs_of_watched_contracts_pass(self):
+        logs_bloom = make_logs_bloom(WATCHED_CONTRACT, TRANSFER_TOPIC)
+
+        self.assertTrue(self.filter.bloom_may_match(logs_bloom))
+        needed = self.filter.get_receipts_needed(make_block(logs_bloom, *self.transactions))
+        self.assertEqual(needed, [tx.hash for tx in self.transactions])
+
+    def test_blocks_with_watched_accounts_as_topics_pass(self):
+        logs_bloom = make_logs_bloom(
+            OTHER_CONTRACT, TRANSFER_TOPIC, to_topic(OTHER_ADDRESS), to_topic(WATCHED_ACCOUNT)
+        )
+
+        self.assertTrue(self.filter.bloom_may_match(logs_bloom))
+        needed = self.filter.get_receipts_needed(make_block(logs_bloom, *self.transactions))
+        self.assertEqual(len(needed), 3)
+
+    def test_blocks_without_watched_logs_are_skipped(self):
+        logs_bloom = make_logs_bloom(OTHER_CONTRACT, TRANSFER_TOPIC, to_topic(OTHER_ADDRESS))
+
+        self.assertFalse(self.filter.bloom_may_match(logs_bloom))
+        # Watched addresses that are not topics are not in the bloom
+        self.assertFalse(self.filter.bloom_may_match(make_logs_bloom(to_topic(WATCHED_CONTRACT))))
+        self.assertFalse(self.filter.bloom_may_match(make_logs_bloom()))
+        self.assertEqual(
+            self.filter.get_receipts_needed(make_block(logs_bloom, *self.transactions)), []
+        )
+
+    def test_transactions_of_watched_accounts_are_needed_without_logs(self):
+        to_account = make_transaction(3, to=WATCHED_ACCOUNT)
+        from_account = make_transaction(4, sender=WATCHED_ACCOUNT)
+        contract_call = make_transaction(5, to=WATCHED_CONTRACT)
+        contract_creation = make_transaction(6, to=None)
+        block_data = make_block(
+            make_logs_bloom(),
+            *self.transactions,
+            to_account,
+            from_account,
+            contract_call,
+            contract_creation,
+        )
+
+        needed = self.filter.get_receipts_needed(block_data)
+
+        self.assertEqual(needed, [to_account.hash, from_account.hash, contract_call.hash])
+
+    def test_only_relevant_receipts_are_selected(self):
+        transfer, other_transfer, incoming = self.transactions
+        block_data = make_block(make_logs_bloom(WATCHED_CONTRACT), *self.transactions)
+        tx_receipts = {
+            transfer.hash: make_receipt(transfer, (OTHER_CONTRACT, [to_topic(WATCHED_ACCOUNT)])),
+            other_transfer.hash: make_receipt(other_transfer, (OTHER_CONTRACT, [TRANSFER_TOPIC])),
+            incoming.hash: make_receipt(incoming, (WATCHED_CONTRACT, [TRANSFER_TOPIC])),
+        }
+
+        selected = self.filter.select_receipts(block_data, tx_receipts)
+        self.assertEqual(set(selected), {transfer.hash, incoming.hash})
+
+        del tx_receipts[other_transfer.hash]
+        with self.assertRaises(MissingReceiptsError) as context:
+            self.filter.select_receipts(block_data, tx_receipts)
+        self.assertEqual(context.exception.transaction_hashes, [other_transfer.hash])
+
+    def test_filter_is_only_used_on_selective_ingest(self):
+        loader = "hub20.apps.blockchain.tests.test_ingest_filter.load_watched_addresses"
+
+        with patch.object(ingest_filter, "INGEST_MODE", "full"), patch.object(
+            ingest_filter, "WATCHED_ADDRESSES_LOADER", loader
+        ):
+            self.assertIsNone(get_ingest_filter(1))
+
+        with patch.object(ingest_filter, "INGEST_MODE", "selective"), patch.object(
+            ingest_filter, "WATCHED_ADDRESSES_LOADER", loader
+        ):
+            selective_filter = get_ingest_filter(1)
+        self.assertEqual(selective_filter.contracts, {bytes(HexBytes(WATCHED_CONTRACT))})
+
+
+__all__ = ["IngestFilterTestCase"]
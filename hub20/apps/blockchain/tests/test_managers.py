@@ -0,0 +1,74 @@
+from django.test import TestCase
+
+from hub20.apps.blockchain.factories import ChainFactory
+from hub20.apps.blockchain.models import BlockRange
+
+
+class BlockRangeManagerTestCase(TestCase):
+    def setUp(self):
+        self.chain = ChainFactory()
+        self.other_chain = ChainFactory(id=self.chain.id + 1, provider_url="https://other.test")
+
+    def get_ranges(self, chain=None):
+        return list(
+            BlockRange.objects.filter(chain=chain or self.chain)
+            .order_by("first_block")
+            .values_list("first_block", "last_block")
+        )
+
+    def test_separate_ranges_are_kept_apart(self):
+        BlockRange.objects.mark_ingested(self.chain.id, 10, 19)
+        BlockRange.objects.mark_ingested(self.chain.id, 30)
+
+        self.assertEqual(self.get_ranges(), [(10, 19), (30, 30)])
+
+    def test_adjacent_and_overlapping_ranges_are_merged(self):
+        BlockRange.objects.mark_ingested(self.chain.id, 10, 19)
+        BlockRange.objects.mark_ingested(self.chain.id, 20, 24)
+        BlockRange.objects.mark_ingested(self.chain.id, 5, 12)
+        BlockRange.objects.mark_ingested(self.chain.id, 15)
+
+        self.assertEqual(self.get_ranges(), [(5, 24)])
+
+    def test_ranges_that_close_a_gap_are_merged_with_both_sides(self):
+        BlockRange.objects.mark_ingested(self.chain.id, 10, 19)
+        BlockRange.objects.mark_ingested(self.chain.id, 30, 39)
+        BlockRange.objects.mark_ingested(self.chain.id, 50, 59)
+
+        merged = BlockRange.objects.mark_ingested(self.chain.id, 20, 45)
+
+        self.assertEqual((merged.first_block, merged.last_block), (10, 45))
+        self.assertEqual(self.get_ranges(), [(10, 45), (50, 59)])
+
+    def test_ranges_of_other_chains_are_not_merged(self):
+        BlockRange.objects.mark_ingested(self.other_chain.id, 10, 19)
+        BlockRange.objects.mark_ingested(self.chain.id, 20, 29)
+
+        self.assertEqual(self.get_ranges(), [(20, 29)])
+        self.assertEqual(self.get_ranges(self.other_chain), [(10, 19)])
+
+    def test_truncate_drops_blocks_after_reorg(self):
+        BlockRange.objects.mark_ingested(self.chain.id, 10, 19)
+        BlockRange.objects.mark_ingested(self.chain.id, 30, 39)
+        BlockRange.objects.mark_ingested(self.other_chain.id, 10, 39)
+
+        BlockRange.objects.truncate(self.chain.id, 15)
+
+        self.assertEqual(self.get_ranges(), [(10, 15)])
+        self.assertEqual(self.get_ranges(self.other_chain), [(10, 39)])
+        self.assertEqual(BlockRange.objects.get_gaps(self.chain.id, 10, 40), [(16, 40)])
+
+    def test_gaps_are_the_ranges_not_ingested(self):
+        BlockRange.objects.mark_ingested(self.chain.id, 10, 19)
+        BlockRange.objects.mark_ingested(self.chain.id, 30, 39)
+
+        self.assertEqual(
+            BlockRange.objects.get_gaps(self.chain.id, 0, 50), [(0, 10), (20, 30), (40, 50)]
+        )
+        self.assertEqual(BlockRange.objects.get_gaps(self.chain.id, 15, 35), [(20, 30)])
+        self.assertEqual(BlockRange.objects.get_gaps(self.chain.id, 12, 18), [])
+        self.assertEqual(BlockRange.objects.get_gaps(self.chain.id, 20, 30), [(20, 30)])
+        self.assertEqual(BlockRange.objects.get_gaps(self.other_chain.id, 0, 50), [(0, 50)])
+
+
+__all__ = ["BlockRangeManagerTestCase"]
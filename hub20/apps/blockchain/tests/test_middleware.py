@@ -0,0 +1,114 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from hub20.apps.blockchain.middleware import RPC_CACHE_POLICIES, CachePolicy, RPCCacheMiddleware
+
+BLOCK_HASH = "0x" + "aa" * 32
+TX_HASH = "0x" + "bb" * 32
+
+
+class RPCCacheMiddlewareTestCase(TestCase):
+    def setUp(self):
+        self.responses = {}
+        self.requests = []
+
+    def make_request(self, method, params):
+        self.requests.append((method, params))
+        return self.responses.get(method, {"jsonrpc": "2.0", "id": 1, "result": "0x1"})
+
+    def make_middleware(self, **kw):
+        return RPCCacheMiddleware(**kw)(self.make_request, w3=None)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        policies = {"eth_getBlockByHash": CachePolicy()}
+        middleware = self.make_middleware(policies=policies, max_size=2)
+        first, second, third = ([f"0x{n:064x}", False] for n in range(3))
+
+        middleware("eth_getBlockByHash", first)
+        middleware("eth_getBlockByHash", second)
+        middleware("eth_getBlockByHash", first)
+        middleware("eth_getBlockByHash", third)
+        self.assertEqual(len(self.requests), 3)
+
+        # The second one was the least recently used when the third came in
+        middleware("eth_getBlockByHash", first)
+        middleware("eth_getBlockByHash", second)
+        self.assertEqual(len(self.requests), 4)
+
+    def test_entries_expire_after_their_ttl(self):
+        middleware = self.make_middleware()
+
+        with patch("hub20.apps.blockchain.middleware.time.monotonic", return_value=100):
+            middleware("eth_blockNumber", [])
+            middleware("eth_blockNumber", [])
+        self.assertEqual(len(self.requests), 1)
+
+        with patch("hub20.apps.blockchain.middleware.time.monotonic", return_value=102):
+            middleware("eth_blockNumber", [])
+        self.assertEqual(len(self.requests), 2)
+
+    def test_methods_without_policy_are_not_cached(self):
+        middleware = self.make_middleware()
+
+        middleware("eth_gasPrice", [])
+        middleware("eth_gasPrice", [])
+        self.assertEqual(len(self.requests), 2)
+
+    def test_pending_transactions_are_not_cached(self):
+        middleware = self.make_middleware()
+        pending = {"transactionHash": TX_HASH, "blockHash": None}
+        mined = {"transactionHash": TX_HASH, "blockHash": BLOCK_HASH}
+
+        self.responses["eth_getTransactionReceipt"] = {"id": 1, "result": pending}
+        middleware("eth_getTransactionReceipt", [TX_HASH])
+        self.responses["eth_getTransactionReceipt"] = {"id": 1, "result": mined}
+        middleware("eth_getTransactionReceipt", [TX_HASH])
+        response = middleware("eth_getTransactionReceipt", [TX_HASH])
+
+        self.assertEqual(response["result"], mined)
+        self.assertEqual(len(self.requests), 2)
+
+    def test_errors_and_empty_results_are_not_cached(self):
+        middleware = self.make_middleware()
+
+        self.responses["eth_getBlockByHash"] = {"id": 1, "error": {"code": -32000}}
+        middleware("eth_getBlockByHash", [BLOCK_HASH, False])
+        self.responses["eth_getBlockByHash"] = {"id": 1, "result": None}
+        middleware("eth_getBlockByHash", [BLOCK_HASH, False])
+        middleware("eth_getBlockByHash", [BLOCK_HASH, False])
+
+        self.assertEqual(len(self.requests), 3)
+
+    def test_moving_block_tags_are_never_cached(self):
+        # Even with a policy that would take anything
+        policies = {**RPC_CACHE_POLICIES, "eth_getBlockByNumber": CachePolicy()}
+        middleware = self.make_middleware(policies=policies)
+
+        for tag in ("latest", "pending"):
+            middleware("eth_getBlockByNumber", [tag, False])
+            middleware("eth_getBlockByNumber", [tag, False])
+            middleware("eth_getBlockReceipts", [tag])
+            middleware("eth_getBlockReceipts", [tag])
+        self.assertEqual(len(self.requests), 8)
+
+        middleware("eth_getBlockReceipts", [BLOCK_HASH])
+        middleware("eth_getBlockReceipts", [BLOCK_HASH])
+        self.assertEqual(len(self.requests), 9)
+
+    def test_hits_and_misses_are_counted_per_method(self):
+        cache = RPCCacheMiddleware()
+        middleware = cache(self.make_request, w3=None)
+
+        middleware("eth_chainId", [])
+        middleware("eth_chainId", [])
+        middleware("net_version", [])
+
+        self.assertEqual(
+            cache.stats,
+            {"eth_chainId": {"hits": 1, "misses": 1}, "net_version": {"hits": 0, "misses": 1}},
+        )
+        cache.clear()
+        self.assertEqual(cache.stats, {})
+
+
+__all__ = ["RPCCacheMiddlewareTestCase"]
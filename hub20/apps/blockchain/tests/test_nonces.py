@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+import pytest
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+
+from hub20.apps.blockchain.factories import SyncedChainFactory
+from hub20.apps.blockchain.models import AccountNonce, NonceAllocation
+from hub20.apps.blockchain.nonces import (
+    allocate_nonce,
+    mark_nonce_sent,
+    release_nonce,
+    reserve_nonce,
+    resync_nonce,
+)
+from hub20.apps.ethereum_money.factories import EthereumAccountFactory
+
+
+class FakeWeb3:
+    """
+    Answers the transaction counts of the account like a node would,
+    `confirmed` being the mined transactions and `pending` also counting
+    the ones in the mempool
+    """
+
+    def __init__(self, confirmed=0, pending=0):
+        self.confirmed = confirmed
+        self.pending = pending
+        self.eth = Mock()
+        self.eth.getTransactionCount.side_effect = self.get_transaction_count
+
+    def get_transaction_count(self, address, block_identifier="latest"):
+        return self.pending if block_identifier == "pending" else self.confirmed
+
+
+@pytest.mark.django_db(transaction=True)
+class NonceAllocationTestCase(TransactionTestCase):
+    def setUp(self):
+        self.chain = SyncedChainFactory()
+        self.address = EthereumAccountFactory().address
+        self.w3 = FakeWeb3(confirmed=3, pending=4)
+
+    def allocate(self):
+        return allocate_nonce(self.w3, self.chain.id, self.address)
+
+    def test_nonces_start_from_pending_transaction_count(self):
+        self.assertEqual([self.allocate().nonce for _ in range(3)], [4, 5, 6])
+
+    def test_concurrent_allocations_get_different_nonces(self):
+        def allocate():
+            try:
+                return self.allocate().nonce
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            nonces = list(executor.map(lambda _: allocate(), range(12)))
+
+        self.assertEqual(sorted(nonces), list(range(4, 16)))
+
+    def test_allocations_are_committed_on_their_own(self):
+        with self.assertRaises(transaction.TransactionManagementError):
+            with transaction.atomic():
+                self.allocate()
+
+        self.assertFalse(NonceAllocation.objects.exists())
+
+    def test_released_nonces_are_handed_out_again(self):
+        first, second, third = [self.allocate() for _ in range(3)]
+
+        release_nonce(second)
+        self.assertEqual(self.allocate().nonce, second.nonce)
+
+        # The last nonce is given back to the counter
+        release_nonce(third)
+        self.assertEqual(AccountNonce.objects.get().next_nonce, third.nonce)
+        self.assertEqual(self.allocate().nonce, third.nonce)
+
+    def test_failed_sends_give_the_nonce_back(self):
+        with self.assertRaises(ValueError):
+            with reserve_nonce(self.w3, self.chain.id, self.address) as allocation:
+                raise ValueError("insufficient funds for gas")
+
+        self.assertFalse(NonceAllocation.objects.filter(id=allocation.id).exists())
+        self.assertEqual(self.allocate().nonce, allocation.nonce)
+
+    def test_resync_skips_nonces_taken_by_other_transactions(self):
+        allocation = self.allocate()
+        mark_nonce_sent(allocation, "0x" + "ab" * 32)
+
+        # Our transaction got mined, and someone else sent two more from the account
+        self.w3.confirmed = allocation.nonce + 1
+        self.w3.pending = allocation.nonce + 3
+
+        with self.assertRaises(ValueError):
+            with reserve_nonce(self.w3, self.chain.id, self.address):
+                raise ValueError("nonce too low")
+
+        self.assertEqual(AccountNonce.objects.get().synced, None)
+        self.assertEqual(self.allocate().nonce, allocation.nonce + 3)
+        self.assertFalse(NonceAllocation.objects.filter(nonce=allocation.nonce).exists())
+
+    def test_resync_forgets_mined_allocations(self):
+        allocation = self.allocate()
+        mark_nonce_sent(allocation, "0x" + "cd" * 32)
+
+        self.w3.confirmed = self.w3.pending = allocation.nonce + 1
+        resync_nonce(allocation)
+        self.allocate()
+
+        self.assertFalse(NonceAllocation.objects.filter(nonce=allocation.nonce).exists())
+        self.assertEqual(AccountNonce.objects.get().confirmed_nonce, allocation.nonce + 1)
+
+
+__all__ = ["NonceAllocationTestCase"]
@@ -0,0 +1,87 @@
+import pytest
+from django.db import connection
+from django.test import TestCase
+
+from hub20.apps.blockchain.factories import BlockFactory, SyncedChainFactory, TransactionFactory
+from hub20.apps.blockchain.models import Block, Transaction
+from hub20.apps.blockchain.partitions import (
+    Partition,
+    convert_to_partitioned_tables,
+    create_partitions,
+    get_default_partition,
+    get_partitions,
+    is_partitioned,
+)
+
+PARTITION_SIZE = 100
+
+
+def count_rows(table: str) -> int:
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+        return cursor.fetchone()[0]
+
+
+@pytest.mark.django_db(transaction=True)
+class PartitionTestCase(TestCase):
+    # Schema changes are transactional on postgres, so they are rolled back after each test
+    def setUp(self):
+        self.chain = SyncedChainFactory()
+        self.table = Transaction._meta.db_table
+        TransactionFactory(block__chain=self.chain, block__number=10)
+
+        with connection.cursor() as cursor:
+            # Tables with pending (deferred) constraint checks can not be altered
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        convert_to_partitioned_tables(partition_size=PARTITION_SIZE)
+
+    def make_transaction(self, block_number: int) -> Transaction:
+        return TransactionFactory(
+            block=BlockFactory(chain=self.chain, number=block_number), block_number=block_number
+        )
+
+    def test_tables_are_converted_with_default_partition(self):
+        self.assertTrue(is_partitioned(self.table))
+        self.assertEqual(get_partitions(self.table), [Partition(f"{self.table}_p0", 0, 100)])
+        self.assertEqual(get_default_partition(self.table), f"{self.table}_default")
+        self.assertEqual(count_rows(f"{self.table}_p0"), 1)
+
+    def test_rows_past_last_partition_go_to_default_partition(self):
+        self.make_transaction(50)
+        self.make_transaction(250)
+
+        self.assertEqual(count_rows(f"{self.table}_p0"), 2)
+        self.assertEqual(count_rows(f"{self.table}_default"), 1)
+        self.assertEqual(Transaction.objects.filter(block_number=250).count(), 1)
+
+    def test_created_partitions_take_rows_from_default_partition(self):
+        tx = self.make_transaction(250)
+
+        created = create_partitions(highest_block=250, ahead=1, partition_size=PARTITION_SIZE)
+
+        self.assertIn(f"{self.table}_p100", created)
+        self.assertIn(f"{self.table}_p300", created)
+        self.assertEqual(
+            [partition.lower for partition in get_partitions(self.table)], [0, 100, 200, 300]
+        )
+        self.assertEqual(count_rows(f"{self.table}_p200"), 1)
+        self.assertEqual(count_rows(f"{self.table}_default"), 0)
+        self.assertEqual(Transaction.objects.get(block_number=250), tx)
+
+        self.make_transaction(350)
+        self.assertEqual(count_rows(f"{self.table}_p300"), 1)
+
+    def test_default_partition_is_created_when_missing(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE "{self.table}_default"')
+
+        created = create_partitions(highest_block=0, ahead=0, partition_size=PARTITION_SIZE)
+
+        self.assertIn(f"{self.table}_default", created)
+        self.assertEqual(get_default_partition(self.table), f"{self.table}_default")
+        self.assertEqual(
+            get_default_partition(Block._meta.db_table), f"{Block._meta.db_table}_default"
+        )
+
+
+__all__ = ["PartitionTestCase"]
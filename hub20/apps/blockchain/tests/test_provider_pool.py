@@ -0,0 +1,192 @@
+import asyncio
+from unittest import TestCase
+from unittest.mock import patch
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.datastructures import AttributeDict
+
+from hub20.apps.blockchain import async_provider, batch
+from hub20.apps.blockchain.async_provider import AsyncHTTPProvider
+from hub20.apps.blockchain.batch import get_block_receipts
+from hub20.apps.blockchain.provider_pool import (
+    MAX_RETRY_BACKOFF,
+    RETRY_BACKOFF,
+    EndpointUnavailable,
+    ProviderPool,
+)
+from hub20.apps.blockchain.tests.base import JSONRPCServer
+
+BLOCK_NUMBER_REQUEST = b'{"jsonrpc": "2.0", "method": "eth_blockNumber", "params": [], "id": 1}'
+BLOCK_HASH = "0x" + "aa" * 32
+TX_HASH = "0x" + "bb" * 32
+
+
+def make_node(block_number=100, syncing=False, **methods) -> JSONRPCServer:
+    node = JSONRPCServer(
+        {
+            "eth_blockNumber": lambda: hex(node.block_number),
+            "eth_syncing": lambda: node.syncing,
+            **methods,
+        }
+    )
+    node.block_number = block_number
+    node.syncing = syncing
+    return node.start()
+
+
+def make_receipt(tx_hash):
+    return {
+        "transactionHash": tx_hash,
+        "blockHash": BLOCK_HASH,
+        "blockNumber": "0x1",
+        "transactionIndex": "0x0",
+        "status": "0x1",
+        "logs": [],
+    }
+
+
+class ProviderPoolTestCase(TestCase):
+    def setUp(self):
+        self.nodes = []
+
+    def tearDown(self):
+        for node in self.nodes:
+            node.stop()
+
+    def make_pool(self, *nodes, **kw) -> ProviderPool:
+        self.nodes.extend(nodes)
+        return ProviderPool([node.uri for node in nodes], health_check_interval=0, **kw)
+
+    def make_unreachable_uri(self) -> str:
+        node = JSONRPCServer({})
+        node.stop()
+        return node.uri
+
+    def test_requests_are_weighted_towards_fastest_endpoint(self):
+        fast, slow = make_node(), make_node()
+        pool = self.make_pool(fast, slow)
+        fast_endpoint, slow_endpoint = pool.endpoints
+        fast_endpoint.latency, slow_endpoint.latency = 0.01, 1.0
+
+        with patch.object(fast_endpoint, "record_success"), patch.object(
+            slow_endpoint, "record_success"
+        ):
+            for _ in range(200):
+                pool.make_request("eth_blockNumber", [])
+
+        self.assertGreater(fast.count("eth_blockNumber"), 180)
+        self.assertGreater(slow.count("eth_blockNumber"), 0)
+
+    def test_failed_endpoints_are_put_aside_with_growing_backoff(self):
+        node = make_node()
+        self.nodes.append(node)
+        pool = ProviderPool([self.make_unreachable_uri(), node.uri], health_check_interval=0)
+        dead_endpoint, live_endpoint = pool.endpoints
+
+        with patch("hub20.apps.blockchain.provider_pool.time.monotonic", return_value=1000):
+            endpoint, response = pool._send(BLOCK_NUMBER_REQUEST, pool.endpoints)
+            self.assertEqual(endpoint, live_endpoint)
+            self.assertEqual(response["result"], hex(100))
+            self.assertEqual(dead_endpoint.unavailable_until, 1000 + RETRY_BACKOFF)
+            self.assertEqual(pool.get_endpoints(), [live_endpoint, dead_endpoint])
+
+            pool._send(BLOCK_NUMBER_REQUEST, pool.endpoints)
+            self.assertEqual(dead_endpoint.unavailable_until, 1000 + 2 * RETRY_BACKOFF)
+
+            for _ in range(10):
+                pool._send(BLOCK_NUMBER_REQUEST, pool.endpoints)
+            self.assertEqual(dead_endpoint.unavailable_until, 1000 + MAX_RETRY_BACKOFF)
+
+        self.assertEqual(dead_endpoint.consecutive_failures, 12)
+        self.assertEqual(live_endpoint.consecutive_failures, 0)
+
+    def test_pool_fails_when_no_endpoint_is_reachable(self):
+        pool = ProviderPool([self.make_unreachable_uri()], health_check_interval=0)
+
+        with self.assertRaises(EndpointUnavailable):
+            pool.make_request("eth_blockNumber", [])
+        self.assertFalse(pool.isConnected())
+
+    def test_health_checks_route_around_lagging_nodes_until_they_recover(self):
+        synced, lagging = make_node(block_number=100), make_node(block_number=10)
+        pool = self.make_pool(synced, lagging, max_block_lag=5)
+        synced_endpoint, lagging_endpoint = pool.endpoints
+
+        pool.check_health()
+        self.assertEqual(pool.get_endpoints(), [synced_endpoint, lagging_endpoint])
+
+        lagging.block_number = 100
+        synced.syncing = True
+        pool.check_health()
+        self.assertEqual(pool.get_endpoints(), [lagging_endpoint, synced_endpoint])
+
+    def test_health_checks_bring_failed_endpoints_back(self):
+        node = make_node()
+        pool = self.make_pool(node)
+        endpoint = pool.endpoints[0]
+        endpoint.record_failure(now=10**9)
+        self.assertFalse(pool.isConnected())
+
+        pool.check_health()
+
+        self.assertTrue(pool.isConnected())
+        self.assertEqual(endpoint.block_number, 100)
+        self.assertEqual(endpoint.consecutive_failures, 0)
+
+    def test_each_endpoint_keeps_its_own_session(self):
+        first, second = make_node(), make_node()
+        pool = self.make_pool(first, second)
+        first_endpoint, second_endpoint = pool.endpoints
+
+        session = first_endpoint.session
+        self.assertIs(first_endpoint.session, session)
+        self.assertIsNot(second_endpoint.session, session)
+
+        # Forked processes (e.g, celery workers) open their own connections
+        with patch("hub20.apps.blockchain.provider_pool.os.getpid", return_value=-1):
+            self.assertIsNot(first_endpoint.session, session)
+
+    def test_block_receipts_support_is_kept_per_endpoint(self):
+        receipts_node = make_node(eth_getBlockReceipts=lambda block_hash: [make_receipt(TX_HASH)])
+        legacy_node = make_node(eth_getTransactionReceipt=make_receipt)
+        pool = self.make_pool(legacy_node, receipts_node)
+        w3 = Web3(pool)
+        blocks = [AttributeDict({"hash": HexBytes(BLOCK_HASH), "transactions": [TX_HASH]})]
+
+        with patch.dict(batch.BLOCK_RECEIPTS_SUPPORT, clear=True), patch.object(
+            pool, "get_endpoints", return_value=pool.endpoints
+        ):
+            receipts = get_block_receipts(w3, blocks)
+            self.assertEqual(batch.BLOCK_RECEIPTS_SUPPORT, {legacy_node.uri: False})
+            self.assertIn(HexBytes(TX_HASH), receipts[HexBytes(BLOCK_HASH)])
+
+            # Nodes that have the method are still asked for it
+            get_block_receipts(w3, blocks)
+            self.assertEqual(receipts_node.count("eth_getBlockReceipts"), 1)
+            self.assertEqual(legacy_node.count("eth_getBlockReceipts"), 1)
+
+    def test_async_block_receipts_support_is_kept_per_endpoint(self):
+        legacy_node = make_node(eth_getTransactionReceipt=make_receipt)
+        receipts_node = make_node(eth_getBlockReceipts=lambda block_hash: [make_receipt(TX_HASH)])
+        self.nodes.extend([legacy_node, receipts_node])
+        block_data = AttributeDict({"hash": HexBytes(BLOCK_HASH), "transactions": [TX_HASH]})
+
+        async def get_receipts(node):
+            provider = AsyncHTTPProvider(node.uri)
+            try:
+                return await async_provider.get_block_receipts(provider, block_data)
+            finally:
+                await provider.close()
+
+        with patch.dict(batch.BLOCK_RECEIPTS_SUPPORT, clear=True):
+            for node in (legacy_node, receipts_node, legacy_node):
+                receipts = asyncio.run(get_receipts(node))
+                self.assertIn(HexBytes(TX_HASH), receipts)
+            self.assertEqual(batch.BLOCK_RECEIPTS_SUPPORT, {legacy_node.uri: False})
+
+        self.assertEqual(legacy_node.count("eth_getBlockReceipts"), 1)
+        self.assertEqual(legacy_node.count("eth_getTransactionReceipt"), 2)
+
+
+__all__ = ["ProviderPoolTestCase"]
@@ -0,0 +1,237 @@
+import fcntl
+import os
+import tempfile
+import threading
+from unittest import TestCase
+
+from hexbytes import HexBytes
+
+from hub20.apps.blockchain.batch import _format_result
+from hub20.apps.blockchain.store import INDEX_FILE_NAME, SEGMENT_FILE_PREFIX, BlockStore
+
+
+def make_tx_hash(block_number: int, index: int) -> str:
+    return "0x" + f"{block_number:032x}{index:032x}"
+
+
+def make_block(block_number: int, total_transactions: int = 2):
+    """
+    Block and receipts as the batch requests give them, ie, formatted from the node results
+    """
+    block_hash = "0x" + f"{block_number:064x}"
+    transactions = [
+        {
+            "hash": make_tx_hash(block_number, index),
+            "blockHash": block_hash,
+            "blockNumber": hex(block_number),
+            "from": "0x" + "11" * 20,
+            "to": "0x" + "22" * 20,
+            "value": hex(10**18 + index),
+            "gas": "0x5208",
+            "gasPrice": "0x3b9aca00",
+            "nonce": hex(index),
+            "input": "0x",
+            "transactionIndex": hex(index),
+        }
+        for index in range(total_transactions)
+    ]
+    receipts = [
+        {
+            "transactionHash": tx["hash"],
+            "blockHash": block_hash,
+            "blockNumber": hex(block_number),
+            "transactionIndex": tx["transactionIndex"],
+            "status": "0x1",
+            "gasUsed": "0x5208",
+            "logs": [
+                {
+                    "address": "0x" + "33" * 20,
+                    "topics": ["0x" + "44" * 32],
+                    "data": "0x01",
+                    "blockHash": block_hash,
+                    "blockNumber": hex(block_number),
+                    "transactionHash": tx["hash"],
+                    "transactionIndex": tx["transactionIndex"],
+                    "logIndex": tx["transactionIndex"],
+                    "removed": False,
+                }
+            ],
+        }
+        for tx in transactions
+    ]
+    block_data = _format_result(
+        "eth_getBlockByHash",
+        {
+            "number": hex(block_number),
+            "hash": block_hash,
+            "parentHash": "0x" + f"{block_number - 1:064x}",
+            "timestamp": hex(1600000000 + block_number),
+            "extraData": "0x" + "55" * 97,
+            "transactions": transactions,
+        },
+    )
+    tx_receipts = {
+        receipt.transactionHash: receipt
+        for receipt in _format_result("eth_getBlockReceipts", receipts)
+    }
+    return block_data, tx_receipts
+
+
+class BlockStoreTestCase(TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = temp_dir.name
+
+    def open_store(self, **kw) -> BlockStore:
+        store = BlockStore(self.path, **kw)
+        self.addCleanup(store.close)
+        return store
+
+    def get_segment_files(self):
+        return sorted(
+            name for name in os.listdir(self.path) if name.startswith(SEGMENT_FILE_PREFIX)
+        )
+
+    def test_blocks_and_receipts_are_read_back_as_stored(self):
+        store = self.open_store()
+        block_data, tx_receipts = make_block(10)
+
+        store.put_block(block_data, tx_receipts)
+
+        self.assertTrue(store.has_block(block_data.hash))
+        self.assertEqual(store.get_block(block_data.hash), block_data)
+        self.assertEqual(store.get_block(block_data.hash.hex()), block_data)
+        self.assertEqual(store.get_receipts(block_data.hash), tx_receipts)
+
+        tx_data, tx_receipt = store.get_transaction(make_tx_hash(10, 1))
+        self.assertEqual(tx_data, block_data.transactions[1])
+        self.assertEqual(tx_receipt, tx_receipts[tx_data.hash])
+        self.assertEqual(tx_data.value, 10**18 + 1)
+        self.assertEqual(tx_receipt.logs[0].topics, [HexBytes("0x" + "44" * 32)])
+
+        self.assertIsNone(store.get_block("0x" + "ff" * 32))
+        self.assertIsNone(store.get_transaction("0x" + "ff" * 32))
+
+    def test_only_finalized_blocks_are_indexed_by_number(self):
+        store = self.open_store()
+        store.put_blocks(
+            [make_block(number) for number in (10, 11, 12)], finalized_block_number=11
+        )
+
+        self.assertEqual(store.get_block_by_number(11).number, 11)
+        self.assertIsNone(store.get_block_by_number(12))
+
+    def test_blocks_are_stored_once(self):
+        store = self.open_store()
+        block_data, tx_receipts = make_block(10)
+
+        store.put_block(block_data, tx_receipts)
+        size = os.path.getsize(os.path.join(self.path, self.get_segment_files()[0]))
+        store.put_blocks([(block_data, tx_receipts), (block_data, tx_receipts)])
+
+        self.assertEqual(
+            os.path.getsize(os.path.join(self.path, self.get_segment_files()[0])), size
+        )
+
+    def test_full_segments_are_rolled_over(self):
+        store = self.open_store(segment_size=1)
+        blocks = [make_block(number) for number in range(10, 13)]
+
+        for block_data, tx_receipts in blocks:
+            store.put_block(block_data, tx_receipts)
+
+        self.assertEqual(
+            self.get_segment_files(), [f"{SEGMENT_FILE_PREFIX}{n:05d}" for n in range(3)]
+        )
+        for block_data, tx_receipts in blocks:
+            self.assertEqual(store.get_block(block_data.hash), block_data)
+            self.assertEqual(store.get_receipts(block_data.hash), tx_receipts)
+
+    def test_segments_are_remapped_when_they_grow(self):
+        store = self.open_store()
+        first_block, second_block = make_block(10), make_block(11)
+
+        store.put_block(*first_block)
+        self.assertEqual(store.get_block(first_block[0].hash), first_block[0])
+        store.put_block(*second_block)
+
+        self.assertEqual(len(self.get_segment_files()), 1)
+        self.assertEqual(store.get_block(second_block[0].hash), second_block[0])
+
+    def test_records_from_other_writers_are_found(self):
+        reader = self.open_store()
+        writer = self.open_store()
+        block_data, tx_receipts = make_block(10)
+
+        self.assertIsNone(reader.get_block(block_data.hash))
+        writer.put_block(block_data, tx_receipts, finalized=True)
+
+        self.assertEqual(reader.get_block(block_data.hash), block_data)
+        self.assertEqual(reader.get_block_by_number(10), block_data)
+        self.assertEqual(self.open_store().get_receipts(block_data.hash), tx_receipts)
+
+    def test_incomplete_index_entries_are_not_loaded(self):
+        writer = self.open_store()
+        block_data, tx_receipts = make_block(10)
+        writer.put_block(block_data, tx_receipts)
+
+        index_path = os.path.join(self.path, INDEX_FILE_NAME)
+        with open(index_path, "rb") as index_file:
+            index_data = index_file.read()
+
+        # Cut the index as if it was read while the last entry was being written
+        with open(index_path, "r+b") as index_file:
+            index_file.truncate(len(index_data) - 1)
+        reader = self.open_store()
+        self.assertTrue(reader.has_block(block_data.hash))
+        self.assertIsNone(reader.get_transaction(make_tx_hash(10, 1)))
+
+        with open(index_path, "ab") as index_file:
+            index_file.write(index_data[-1:])
+        self.assertEqual(
+            reader.get_transaction(make_tx_hash(10, 1))[0].hash, HexBytes(make_tx_hash(10, 1))
+        )
+
+    def test_writers_wait_for_the_index_lock(self):
+        store = self.open_store()
+        block_data, tx_receipts = make_block(10)
+
+        with open(os.path.join(self.path, INDEX_FILE_NAME), "rb") as index_file:
+            fcntl.flock(index_file.fileno(), fcntl.LOCK_EX)
+            writer = threading.Thread(target=store.put_block, args=(block_data, tx_receipts))
+            writer.start()
+            writer.join(timeout=0.2)
+            self.assertTrue(writer.is_alive())
+            self.assertEqual(self.get_segment_files(), [])
+            fcntl.flock(index_file.fileno(), fcntl.LOCK_UN)
+
+        writer.join(timeout=5)
+        self.assertFalse(writer.is_alive())
+        self.assertEqual(store.get_block(block_data.hash), block_data)
+
+    def test_concurrent_writers_do_not_overwrite_each_other(self):
+        stores = [self.open_store() for _ in range(4)]
+        blocks = [
+            [make_block(100 * index + number + 1) for number in range(10)] for index in range(4)
+        ]
+
+        writers = [
+            threading.Thread(
+                target=lambda store, store_blocks: [store.put_block(*b) for b in store_blocks],
+                args=(store, store_blocks),
+            )
+            for store, store_blocks in zip(stores, blocks)
+        ]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+
+        reader = self.open_store()
+        for block_data, tx_receipts in sum(blocks, []):
+            self.assertEqual(reader.get_block(block_data.hash), block_data)
+            self.assertEqual(reader.get_receipts(block_data.hash), tx_receipts)
+
+
+__all__ = ["BlockStoreTestCase"]
@@ -0,0 +1,135 @@
+import asyncio
+from unittest import TestCase
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from django.conf import settings
+from django.test import TransactionTestCase
+
+from hub20.apps.blockchain import supervisor
+from hub20.apps.blockchain.factories import ChainFactory
+from hub20.apps.blockchain.supervisor import (
+    MAX_RESTART_BACKOFF,
+    RESTART_BACKOFF,
+    run_all_chain_listeners,
+    run_chain_listeners,
+    supervise,
+)
+
+
+def make_flaky_coroutine(failures: int):
+    calls = []
+
+    async def run():
+        calls.append(len(calls))
+        if len(calls) <= failures:
+            raise ConnectionError("node went away")
+
+    return run, calls
+
+
+class SuperviseTestCase(TestCase):
+    def setUp(self):
+        self.sleep = AsyncMock()
+        patcher = patch.object(supervisor.asyncio, "sleep", self.sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_delays(self):
+        return [call[0][0] for call in self.sleep.await_args_list]
+
+    def test_failing_coroutines_are_restarted_with_backoff(self):
+        run, calls = make_flaky_coroutine(failures=4)
+
+        asyncio.run(supervise("flaky", run))
+
+        self.assertEqual(len(calls), 5)
+        self.assertEqual(self.get_delays(), [RESTART_BACKOFF * 2**n for n in range(4)])
+
+    def test_backoff_is_capped(self):
+        run, calls = make_flaky_coroutine(failures=12)
+
+        asyncio.run(supervise("flaky", run))
+
+        self.assertEqual(max(self.get_delays()), MAX_RESTART_BACKOFF)
+        self.assertEqual(self.get_delays()[-1], MAX_RESTART_BACKOFF)
+
+    def test_backoff_is_reset_after_a_stable_run(self):
+        run, calls = make_flaky_coroutine(failures=3)
+
+        with patch.object(supervisor, "STABLE_RUN_INTERVAL", 0):
+            asyncio.run(supervise("flaky", run))
+
+        self.assertEqual(self.get_delays(), [RESTART_BACKOFF] * 3)
+
+    def test_coroutines_that_finish_are_not_restarted(self):
+        run, calls = make_flaky_coroutine(failures=0)
+
+        asyncio.run(supervise("stable", run))
+
+        self.assertEqual(len(calls), 1)
+        self.sleep.assert_not_awaited()
+
+    def test_cancellation_is_not_handled_as_failure(self):
+        async def run():
+            raise asyncio.CancelledError()
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(supervise("cancelled", run))
+        self.sleep.assert_not_awaited()
+
+
+@pytest.mark.django_db(transaction=True)
+class ChainListenersTestCase(TransactionTestCase):
+    def setUp(self):
+        self.chain = ChainFactory()
+        self.other_chain = ChainFactory(id=self.chain.id + 1, provider_url="https://other.test")
+
+    def run_all(self, chain_ids=None):
+        run_chain_listeners = AsyncMock()
+        with patch.object(supervisor, "run_chain_listeners", run_chain_listeners):
+            asyncio.run(run_all_chain_listeners(["listener"], chain_ids))
+        return [call[0] for call in run_chain_listeners.await_args_list]
+
+    def test_listeners_run_for_every_chain(self):
+        self.assertEqual(
+            self.run_all(),
+            [
+                (self.chain.id, self.chain.provider_url, ["listener"]),
+                (self.other_chain.id, self.other_chain.provider_url, ["listener"]),
+            ],
+        )
+
+    def test_listeners_run_only_for_selected_chains(self):
+        self.assertEqual(
+            self.run_all([self.other_chain.id]),
+            [(self.other_chain.id, self.other_chain.provider_url, ["listener"])],
+        )
+        self.assertEqual(self.run_all([self.other_chain.id + 1]), [])
+
+    def test_default_provider_is_used_before_any_chain_is_recorded(self):
+        self.chain.delete()
+        self.other_chain.delete()
+
+        self.assertEqual(self.run_all(), [(None, settings.WEB3_PROVIDER_URI, ["listener"])])
+
+    def test_listeners_do_not_run_against_provider_of_other_chain(self):
+        listener = AsyncMock()
+        with patch.object(
+            supervisor, "_get_provider_chain_id", AsyncMock(return_value=self.other_chain.id)
+        ), patch.object(supervisor, "import_string", return_value=listener), patch.object(
+            supervisor, "sync_chain", AsyncMock(__name__="sync_chain")
+        ) as sync_chain, patch.object(
+            supervisor, "make_web3", Mock()
+        ):
+            asyncio.run(run_chain_listeners(self.chain.id, self.chain.provider_url, ["listener"]))
+            listener.assert_not_awaited()
+
+            asyncio.run(
+                run_chain_listeners(self.other_chain.id, self.chain.provider_url, ["listener"])
+            )
+            listener.assert_awaited_once()
+            sync_chain.assert_awaited_once()
+
+
+__all__ = ["SuperviseTestCase", "ChainListenersTestCase"]
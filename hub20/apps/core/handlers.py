@@ -1,6 +1,6 @@
 import logging
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from psycopg2.extras import NumericRange
 
@@ -34,6 +34,8 @@ from .models import (
     Store,
     StoreRSAKeyPair,
     Transfer,
+    UserBalance,
+    UserBalanceEntry,
 )
 from .settings import app_settings
 from .signals import (
@@ -83,10 +85,13 @@ def on_account_deposit_check_blockchain_payments(sender, **kw):
         order=order, payment_window__contains=transaction.block.number
     ).first()
 
-    payment = BlockchainPayment.objects.create(
-        route=route, amount=amount.amount, currency=amount.currency, transaction=transaction
+    payment, created = BlockchainPayment.objects.get_or_create(
+        transaction=transaction,
+        log_index=kw.get("log_index"),
+        defaults=dict(route=route, amount=amount.amount, currency=amount.currency),
     )
-    payment_received.send(sender=BlockchainPayment, payment=payment)
+    if created:
+        payment_received.send(sender=BlockchainPayment, payment=payment)
 
 
 @receiver(incoming_transfer_broadcast, sender=EthereumToken)
@@ -185,7 +190,7 @@ def on_block_added_check_confirmed_payments(sender, **kw):
         payments = BlockchainPayment.objects.all()
 
         for payment in payments.filter(
-            transaction__block__number=block_number_to_confirm,
+            transaction__block_number=block_number_to_confirm,
             transaction__block__chain=block.chain,
         ):
             logger.info(f"Confirming {payment}")
@@ -226,10 +231,12 @@ def on_block_added_check_confirmed_transfers(sender, **kw):
     block_number_to_confirm = block.number - app_settings.Transfer.minimum_confirmations
     if created and block_number_to_confirm >= 0:
         transactions = Transaction.objects.filter(
-            block__number=block_number_to_confirm, block__chain=block.chain
+            block_number=block_number_to_confirm, block__chain=block.chain
         )
 
-        tx_hashes = transactions.values_list("hash", flat=True)
+        # Transaction hashes are bytea and transfers keep them as text, so a
+        # subquery can not compare them
+        tx_hashes = list(transactions.values_list("hash", flat=True))
         transfers = ExternalTransfer.objects.all()
         for transfer in transfers.filter(chain_transaction__transaction_hash__in=tx_hashes):
             logger.info(f"Confirming {transfer}")
@@ -345,6 +352,12 @@ def on_internal_transfer_confirmed_move_balances(sender, **kw):
     transfer.sender.balance_entries.create(amount=-transfer.amount, currency=transfer.currency)
 
 
+@receiver(post_delete, sender=UserBalanceEntry)
+def on_user_balance_entry_deleted_update_balance(sender, **kw):
+    entry = kw["instance"]
+    UserBalance.objects.subtract(entry.user_id, entry.currency_id, entry.amount)
+
+
 @receiver(post_save, sender=Store)
 def on_store_created_generate_key_pair(sender, **kw):
     store = kw["instance"]
@@ -373,5 +386,6 @@ __all__ = [
     "on_external_transfer_executed_mark_as_executed",
     "on_external_transfer_confirmed_destroy_reserve",
     "on_internal_transfer_confirmed_move_balances",
+    "on_user_balance_entry_deleted_update_balance",
     "on_store_created_generate_key_pair",
 ]
@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from hub20.apps.core.models import UserBalance, UserBalanceEntry
+
+
+def get_ledger_total(user_id: int, currency_id: int) -> Decimal:
+    entries = UserBalanceEntry.objects.filter(user_id=user_id, currency_id=currency_id)
+    return entries.aggregate(total=Sum("amount")).get("total") or Decimal(0)
+
+
+class Command(BaseCommand):
+    help = "Checks the running balance of every user against the sum of their ledger entries"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix", action="store_true", help="Set the balances that differ to the ledger total"
+        )
+
+    def _reconcile(self, user_id: int, currency_id: int, fix: bool) -> bool:
+        # With the balance locked no entries can be added, so the comparison is exact
+        with transaction.atomic():
+            balance = UserBalance.objects.lock(user_id, currency_id)
+            ledger_total = get_ledger_total(user_id, currency_id)
+            if balance.amount == ledger_total:
+                return True
+
+            self.stdout.write(
+                f"User {user_id}, token {currency_id}: "
+                f"balance is {balance.amount}, ledger total is {ledger_total}"
+            )
+            if fix:
+                balance.amount = ledger_total
+                balance.save(update_fields=["amount", "modified"])
+            return False
+
+    def handle(self, *args, **options):
+        ledger_totals = {
+            (row["user_id"], row["currency_id"]): row["total"]
+            for row in UserBalanceEntry.objects.values("user_id", "currency_id").annotate(
+                total=Sum("amount")
+            )
+        }
+        balances = {
+            (user_id, currency_id): amount
+            for user_id, currency_id, amount in UserBalance.objects.values_list(
+                "user_id", "currency_id", "amount"
+            )
+        }
+
+        # Entries may be added while the totals are read, so differences are checked again
+        suspects = [
+            key
+            for key in sorted(set(ledger_totals) | set(balances))
+            if ledger_totals.get(key, 0) != balances.get(key, 0)
+        ]
+        mismatches = [key for key in suspects if not self._reconcile(*key, fix=options["fix"])]
+
+        checked = len(set(ledger_totals) | set(balances))
+        outcome = "fixed" if options["fix"] else "mismatched"
+        self.stdout.write(f"{checked} balance(s) checked, {len(mismatches)} {outcome}")
+
+        if mismatches and not options["fix"]:
+            raise CommandError(
+                f"{len(mismatches)} of {checked} balance(s) do not match the ledger, "
+                "run with --fix to set them to the ledger total"
+            )
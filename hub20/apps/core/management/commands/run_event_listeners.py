@@ -1,11 +1,9 @@
 import asyncio
 import logging
 
-from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.utils.module_loading import import_string
 
-from hub20.apps.blockchain.client import make_web3, sync_chain
+from hub20.apps.blockchain.supervisor import run_all_chain_listeners
 from hub20.apps.core.settings import app_settings
 
 from .utils import add_shutdown_handlers
@@ -14,7 +12,16 @@ logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
-    help = "Runs all the defined event listeners"
+    help = "Runs all the defined event listeners, for each of the configured chains"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chain",
+            type=int,
+            action="append",
+            dest="chains",
+            help="Only run the listeners of this chain (can be repeated)",
+        )
 
     def handle(self, *args, **options):
         loop = asyncio.get_event_loop()
@@ -22,17 +29,11 @@ class Command(BaseCommand):
         add_shutdown_handlers(loop)
 
         try:
-            tasks = []
-
-            for listener_dotted_name in app_settings.Web3.event_listeners:
-                listener = import_string(listener_dotted_name)
-                tasks.append(listener(make_web3(settings.WEB3_PROVIDER_URI)))
-
-            # No matter the user settings, we always want to run the routing to
-            # update the chain status
-            tasks.append(sync_chain(make_web3(settings.WEB3_PROVIDER_URI)))
-
-            asyncio.gather(*tasks)
+            # No matter the user settings, the supervisor always runs sync_chain
+            # for every chain to update the chain status
+            asyncio.ensure_future(
+                run_all_chain_listeners(app_settings.Web3.event_listeners, options["chains"])
+            )
             loop.run_forever()
         finally:
             loop.close()
@@ -9,7 +9,15 @@ from .utils import add_shutdown_handlers
 
 
 class Command(BaseCommand):
-    help = "Downloads all blocks from ethereum client and save the data on the database"
+    help = "Scans the blockchain once for the transactions of all accounts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start",
+            type=int,
+            default=None,
+            help="First block to scan (default: where the previous scan stopped)",
+        )
 
     def handle(self, *args, **options):
         w3 = get_web3()
@@ -18,7 +26,6 @@ class Command(BaseCommand):
         add_shutdown_handlers(loop)
 
         try:
-            asyncio.gather(*(download_all_account_transactions(w3),))
-            loop.run_forever()
+            loop.run_until_complete(download_all_account_transactions(w3, start=options["start"]))
         finally:
             loop.close()
@@ -0,0 +1,76 @@
+# Generated by Django 3.0.7 on 2026-10-17 17:15
+
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+from django.conf import settings
+from django.db import migrations, models
+
+import hub20.apps.ethereum_money.models
+
+POPULATE_USER_BALANCES = """
+INSERT INTO core_userbalance (user_id, currency_id, amount, created, modified)
+SELECT user_id, currency_id, SUM(amount), now(), now()
+FROM core_userbalanceentry
+GROUP BY user_id, currency_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("ethereum_money", "0004_accountbalance"),
+        ("core", "0002_blockchainpayment_transaction_no_constraint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserBalance",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "amount",
+                    hub20.apps.ethereum_money.models.EthereumTokenAmountField(
+                        decimal_places=18, max_digits=32
+                    ),
+                ),
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now, editable=False, verbose_name="created"
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now, editable=False, verbose_name="modified"
+                    ),
+                ),
+                (
+                    "currency",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        to="ethereum_money.EthereumToken",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balances",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("user", "currency")},
+            },
+        ),
+        migrations.RunSQL(POPULATE_USER_BALANCES, reverse_sql=migrations.RunSQL.noop),
+    ]
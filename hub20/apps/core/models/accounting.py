@@ -1,19 +1,23 @@
 import logging
-from typing import List, Union
+from typing import List
 
 from django.conf import settings
 from django.contrib.sites.models import Site
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, FilteredRelation, Q
 from model_utils.models import TimeStampedModel
 
 from hub20.apps.ethereum_money import get_ethereum_account_model
 from hub20.apps.ethereum_money.models import (
+    AccountBalance,
     EthereumToken,
     EthereumTokenAmount,
     EthereumTokenValueModel,
 )
 from hub20.apps.raiden.models import Channel
 
+from .managers import UserBalanceManager
+
 EthereumAccount = get_ethereum_account_model()
 
 logger = logging.getLogger(__name__)
@@ -24,6 +28,33 @@ class UserBalanceEntry(TimeStampedModel, EthereumTokenValueModel):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="balance_entries"
     )
 
+    def save(self, *args, **kw):
+        if not self._state.adding:
+            return super().save(*args, **kw)
+
+        with transaction.atomic():
+            balance = UserBalance.objects.lock(self.user_id, self.currency_id)
+            super().save(*args, **kw)
+            balance.amount += self.amount
+            balance.save(update_fields=["amount", "modified"])
+
+
+class UserBalance(TimeStampedModel, EthereumTokenValueModel):
+    """
+    Running total of the balance entries of a user for one token. Entries
+    are only added with this row locked, so the balance can be checked
+    and spent without races by holding the lock.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="balances"
+    )
+
+    objects = UserBalanceManager()
+
+    class Meta:
+        unique_together = ("user", "currency")
+
 
 class UserReserve(TimeStampedModel, EthereumTokenValueModel):
     user = models.ForeignKey(
@@ -36,19 +67,25 @@ class UserAccount:
         self.user = user
 
     def get_balance(self, currency: EthereumToken) -> EthereumTokenAmount:
-        return EthereumTokenAmount.aggregated(self.user.balance_entries.all(), currency=currency)
+        balance = self.user.balances.filter(currency=currency).values_list("amount", flat=True)
+        return EthereumTokenAmount(amount=balance.first() or 0, currency=currency)
 
     def get_balances(self) -> List[EthereumTokenAmount]:
-        return [self.get_balance(token) for token in EthereumToken.objects.all()]
+        # Every token is listed, the ones the user never had with zero, all in one query
+        tokens = EthereumToken.objects.annotate(
+            user_balance=FilteredRelation("userbalance", condition=Q(userbalance__user=self.user))
+        ).annotate(balance=F("user_balance__amount"))
+        return [
+            EthereumTokenAmount(amount=token.balance or 0, currency=token)
+            for token in tokens.order_by("id")
+        ]
 
 
 class HubSite(Site):
-    def get_funds(self, currency: EthereumToken) -> Union[int, EthereumTokenAmount]:
-        account_funds = sum(
-            [account.get_balance(currency) for account in EthereumAccount.objects.all()]
-        )
-        channel_funds = sum([c.balance_amount for c in Channel.objects.filter(currency=currency)])
-        return account_funds + channel_funds
+    def get_funds(self, currency: EthereumToken) -> EthereumTokenAmount:
+        account_funds = EthereumTokenAmount.aggregated(AccountBalance.objects.all(), currency)
+        channel_funds = [c.balance_amount for c in Channel.objects.filter(currency=currency)]
+        return sum(channel_funds, account_funds)
 
     class Meta:
         proxy = True
@@ -57,6 +94,7 @@ class HubSite(Site):
 __all__ = [
     "HubSite",
     "UserBalanceEntry",
+    "UserBalance",
     "UserAccount",
     "UserReserve",
 ]
@@ -27,6 +27,24 @@ class BlockchainRouteManager(models.Manager):
         return qs.filter(start_block__lte=at_block, expiration_block__gte=at_block)
 
 
+class UserBalanceManager(models.Manager):
+    def lock(self, user_id: int, currency_id: int):
+        """
+        Returns the balance of the user, locked (SELECT ... FOR UPDATE)
+        until the end of the current transaction.
+        """
+        self.get_or_create(user_id=user_id, currency_id=currency_id, defaults={"amount": 0})
+        return self.select_for_update().get(user_id=user_id, currency_id=currency_id)
+
+    def subtract(self, user_id: int, currency_id: int, amount):
+        """
+        Takes the amount out of an existing balance. Never creates one, so
+        it is safe to use while the user is deleted in cascade.
+        """
+        balances = self.filter(user_id=user_id, currency_id=currency_id)
+        balances.update(amount=F("amount") - amount, modified=timezone.now())
+
+
 class RaidenRouteManager(models.Manager):
     def with_expiration(self) -> models.QuerySet:
         qs = super().get_queryset()
@@ -47,4 +65,4 @@ class RaidenRouteManager(models.Manager):
         )
 
 
-__all__ = ["BlockchainRouteManager", "RaidenRouteManager"]
+__all__ = ["BlockchainRouteManager", "UserBalanceManager", "RaidenRouteManager"]
@@ -217,7 +217,9 @@ class InternalPayment(Payment):
 
 
 class BlockchainPayment(Payment):
-    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE)
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, db_constraint=False)
+    # Index of the Transfer log of token payments, one transaction may carry several of them
+    log_index = models.SmallIntegerField(null=True)
 
     @property
     def is_confirmed(self):
@@ -228,6 +230,20 @@ class BlockchainPayment(Payment):
     def identifier(self):
         return str(self.transaction.hash)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["transaction", "log_index"],
+                condition=Q(log_index__isnull=False),
+                name="unique_token_payment",
+            ),
+            models.UniqueConstraint(
+                fields=["transaction"],
+                condition=Q(log_index__isnull=True),
+                name="unique_eth_payment",
+            ),
+        ]
+
 
 class RaidenPayment(Payment):
     payment = models.OneToOneField(RaidenPaymentEvent, on_delete=models.CASCADE)
@@ -15,7 +15,7 @@ from hub20.apps.ethereum_money import get_ethereum_account_model
 from hub20.apps.ethereum_money.models import EthereumTokenValueModel
 from hub20.apps.raiden.models import Channel, Payment
 
-from .accounting import UserAccount, UserReserve
+from .accounting import UserAccount, UserBalance, UserReserve
 
 logger = logging.getLogger(__name__)
 
@@ -60,6 +60,12 @@ class Transfer(TimeStampedModel, EthereumTokenValueModel):
     def _make_reserve(self):
         pass
 
+    def _cancel_reserve(self):
+        pass
+
+    def _lock_balances(self):
+        UserBalance.objects.lock(self.sender_id, self.currency_id)
+
     def verify_conditions(self):
 
         transfer_amount = self.as_token_amount
@@ -75,11 +81,18 @@ class Transfer(TimeStampedModel, EthereumTokenValueModel):
             return
 
         try:
-            self.verify_conditions()
-            self._make_reserve()
+            # Balances are locked only while funds are checked and reserved,
+            # so that parallel transfers can not spend the same funds. The
+            # reserve is committed before anything leaves the hub, and can
+            # not be rolled back once the funds are gone.
+            with transaction.atomic():
+                self._lock_balances()
+                self.verify_conditions()
+                self._make_reserve()
             self._execute()
         except TransferError as exc:
             logger.info(f"{self} failed: {exc}")
+            self._cancel_reserve()
             transfer_failed.send_robust(sender=Transfer, transfer=self, reason=str(exc))
         except Exception as exc:
             logger.exception(exc)
@@ -98,8 +111,16 @@ class InternalTransfer(Transfer):
         if self.sender == self.receiver:
             raise ValidationError("Sender and Receiver are the same")
 
+    def _lock_balances(self):
+        # Always in the same order, so that transfers in opposite directions can not deadlock
+        for user_id in sorted([self.sender_id, self.receiver_id]):
+            UserBalance.objects.lock(user_id, self.currency_id)
+
     @transaction.atomic()
     def _execute(self):
+        # Nothing leaves the hub, so funds are moved with both balances locked
+        self._lock_balances()
+        self.verify_conditions()
         transfer_confirmed.send_robust(sender=InternalTransfer, transfer=self)
 
 
@@ -110,7 +131,6 @@ class ExternalTransfer(Transfer):
     def target(self):
         return self.recipient_address
 
-    @transaction.atomic()
     def _execute(self):
         transfer_amount = self.as_token_amount
         channel = Channel.select_for_transfer(self.recipient_address, transfer_amount)
@@ -125,18 +145,31 @@ class ExternalTransfer(Transfer):
             account = EthereumAccount.select_for_transfer(transfer_amount)
             if account is None:
                 raise TransferError("No channel nor account with funds to make transfer found")
-            tx_hash = account.send(self.recipient_address, transfer_amount)
+            try:
+                tx_hash = account.send(self.recipient_address, transfer_amount)
+            except ValueError as exc:
+                # The node rejected the transaction, so nothing was sent
+                raise TransferError(f"Transaction not accepted: {exc}")
+
+            logger.info(f"{self} sent on transaction {tx_hash}")
             BlockchainTransaction.objects.create(transfer=self, transaction_hash=tx_hash)
         transfer_executed.send_robust(sender=ExternalTransfer, transfer=self)
 
     @transaction.atomic()
     def _make_reserve(self):
         self.sender.balance_entries.create(amount=-self.amount, currency=self.currency)
-        self.sender.reserves.update_or_create(
-            usertransferreserve__transfer=self,
-            defaults={"amount": self.amount, "currency": self.currency},
+        UserTransferReserve.objects.update_or_create(
+            transfer=self,
+            defaults={"user": self.sender, "amount": self.amount, "currency": self.currency},
         )
 
+    @transaction.atomic()
+    def _cancel_reserve(self):
+        reserve = UserTransferReserve.objects.filter(transfer=self).first()
+        if reserve is not None:
+            self.sender.balance_entries.create(amount=self.amount, currency=self.currency)
+            reserve.delete()
+
 
 class UserTransferReserve(UserReserve):
     transfer = models.OneToOneField(Transfer, on_delete=models.CASCADE, related_name="reserve")
@@ -1,3 +1,4 @@
+from .test_commands import *  # noqa
 from .test_consumers import *  # noqa
 from .test_managers import *  # noqa
 from .test_models import *  # noqa
@@ -0,0 +1,99 @@
+import asyncio
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from hub20.apps.core.factories import Erc20TokenUserBalanceEntryFactory
+from hub20.apps.core.management.commands import run_event_listeners, sync_accounts
+from hub20.apps.core.models import UserAccount, UserBalance
+from hub20.apps.core.settings import app_settings
+
+
+class ReconcileUserBalancesTestCase(TestCase):
+    def setUp(self):
+        self.credit = Erc20TokenUserBalanceEntryFactory()
+        self.user_account = UserAccount(self.credit.user)
+
+    def _reconcile(self, *args) -> str:
+        out = StringIO()
+        call_command("reconcile_user_balances", *args, stdout=out)
+        return out.getvalue()
+
+    def _drift_balance(self):
+        UserBalance.objects.filter(user=self.credit.user).update(amount=0)
+
+    def test_matching_balances_pass(self):
+        self.assertIn("1 balance(s) checked, 0 mismatched", self._reconcile())
+
+    def test_mismatched_balances_are_reported(self):
+        self._drift_balance()
+
+        with self.assertRaises(CommandError):
+            self._reconcile()
+        self.assertEqual(self.user_account.get_balance(self.credit.currency).amount, 0)
+
+    def test_mismatched_balances_can_be_fixed(self):
+        self._drift_balance()
+
+        self.assertIn("1 balance(s) checked, 1 fixed", self._reconcile("--fix"))
+        balance = self.user_account.get_balance(self.credit.currency)
+        self.assertEqual(balance, self.credit.as_token_amount)
+
+
+class RunEventListenersTestCase(TestCase):
+    def setUp(self):
+        # The command closes the event loop when done
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        self.addCleanup(asyncio.set_event_loop, None)
+
+    def _run(self, *args):
+        calls = []
+
+        async def run_all_chain_listeners(listener_names, chain_ids):
+            calls.append((listener_names, chain_ids))
+            asyncio.get_event_loop().stop()
+
+        with patch.object(run_event_listeners, "run_all_chain_listeners", run_all_chain_listeners):
+            call_command("run_event_listeners", *args)
+        return calls
+
+    def test_listeners_run_for_all_chains(self):
+        self.assertEqual(self._run(), [(app_settings.Web3.event_listeners, None)])
+
+    def test_listeners_run_for_selected_chains(self):
+        calls = self._run("--chain", "1", "--chain", "100")
+        self.assertEqual(calls, [(app_settings.Web3.event_listeners, [1, 100])])
+
+
+class SyncAccountsTestCase(TestCase):
+    def setUp(self):
+        # The command closes the event loop when done
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        self.addCleanup(asyncio.set_event_loop, None)
+
+    def _sync(self, *args):
+        starts = []
+
+        async def download_all_account_transactions(w3, start):
+            starts.append(start)
+
+        with patch.object(sync_accounts, "get_web3"), patch.object(
+            sync_accounts, "download_all_account_transactions", download_all_account_transactions
+        ):
+            call_command("sync_accounts", *args)
+        return starts
+
+    def test_scan_resumes_by_default(self):
+        self.assertEqual(self._sync(), [None])
+
+    def test_scan_can_start_from_a_given_block(self):
+        self.assertEqual(self._sync("--start", "1000"), [1000])
+
+
+__all__ = [
+    "ReconcileUserBalancesTestCase",
+    "RunEventListenersTestCase",
+    "SyncAccountsTestCase",
+]
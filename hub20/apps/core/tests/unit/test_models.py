@@ -3,6 +3,7 @@ from unittest.mock import patch
 
 import pytest
 from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
 
 from hub20.apps.blockchain.factories import BlockFactory, TransactionFactory
@@ -18,9 +19,12 @@ from hub20.apps.core.factories import (
 )
 from hub20.apps.core.models import (
     BlockchainPaymentRoute,
+    BlockchainTransaction,
     ExternalTransfer,
     RaidenPaymentRoute,
     UserAccount,
+    UserBalance,
+    UserReserve,
 )
 from hub20.apps.core.settings import app_settings
 from hub20.apps.ethereum_money import get_ethereum_account_model
@@ -126,6 +130,44 @@ class StoreTestCase(BaseTestCase):
         )
 
 
+class UserBalanceTestCase(BaseTestCase):
+    def setUp(self):
+        self.credit = Erc20TokenUserBalanceEntryFactory()
+        self.user = self.credit.user
+        self.user_account = UserAccount(self.user)
+
+    def test_balance_entries_are_added_to_balance(self):
+        Erc20TokenUserBalanceEntryFactory(
+            user=self.user, currency=self.credit.currency, amount=self.credit.amount
+        )
+
+        balance = self.user_account.get_balance(self.credit.currency)
+        self.assertEqual(balance, 2 * self.credit.as_token_amount)
+        self.assertEqual(UserBalance.objects.filter(user=self.user).count(), 1)
+
+    def test_deleted_entries_are_taken_from_balance(self):
+        self.credit.delete()
+
+        balance = self.user_account.get_balance(self.credit.currency)
+        self.assertEqual(balance.amount, 0)
+
+    def test_balances_list_every_token_in_one_query(self):
+        token = ETHFactory()
+
+        with self.assertNumQueries(1):
+            balances = self.user_account.get_balances()
+
+        self.assertIn(self.credit.as_token_amount, balances)
+        self.assertIn(EthereumTokenAmount(amount=0, currency=token), balances)
+
+    def test_user_with_balance_can_be_deleted(self):
+        user_id = self.user.id
+
+        self.user.delete()
+        connection.check_constraints()
+        self.assertFalse(UserBalance.objects.filter(user_id=user_id).exists())
+
+
 class TransferTestCase(BaseTestCase):
     def setUp(self):
         self.sender_account = UserAccountFactory()
@@ -207,6 +249,44 @@ class ExternalTransferTestCase(TransferTestCase):
         self.assertIsNotNone(transfer.status)
         self.assertEqual(transfer.status, TRANSFER_EVENT_TYPES.failed)
 
+    def test_failed_transfers_give_reserved_funds_back(self, select_for_transfer):
+        select_for_transfer.return_value = None
+        ExternalTransferFactory(
+            sender=self.sender, currency=self.credit.currency, amount=self.credit.amount
+        )
+
+        balance = self.sender_account.get_balance(self.credit.currency)
+        self.assertEqual(balance, self.credit.as_token_amount)
+        self.assertFalse(UserReserve.objects.filter(user=self.sender).exists())
+
+    def test_rejected_transactions_give_reserved_funds_back(self, select_for_transfer):
+        account = EthereumAccountFactory()
+        select_for_transfer.return_value = account
+
+        with patch.object(account, "send", side_effect=ValueError("insufficient funds")):
+            transfer = ExternalTransferFactory(
+                sender=self.sender, currency=self.credit.currency, amount=self.credit.amount
+            )
+
+        self.assertEqual(transfer.status, TRANSFER_EVENT_TYPES.failed)
+        balance = self.sender_account.get_balance(self.credit.currency)
+        self.assertEqual(balance, self.credit.as_token_amount)
+
+    def test_reserve_is_kept_once_transaction_is_sent(self, select_for_transfer):
+        account = EthereumAccountFactory()
+        select_for_transfer.return_value = account
+
+        # Funds are gone once the transaction is sent, whatever fails after that
+        with patch.object(account, "send", return_value="0x" + "ab" * 32):
+            with patch.object(BlockchainTransaction.objects, "create", side_effect=Exception):
+                transfer = ExternalTransferFactory(
+                    sender=self.sender, currency=self.credit.currency, amount=self.credit.amount
+                )
+
+        self.assertNotEqual(transfer.status, TRANSFER_EVENT_TYPES.failed)
+        self.assertEqual(self.sender_account.get_balance(self.credit.currency).amount, 0)
+        self.assertTrue(UserReserve.objects.filter(user=self.sender).exists())
+
     def test_transfers_can_be_executed_with_enough_balance(self, select_for_transfer):
         account = EthereumAccountFactory()
         add_token_to_account(account, self.credit.as_token_amount, self.ETH.chain)
@@ -240,6 +320,7 @@ class ExternalTransferTestCase(TransferTestCase):
         )
         self.assertTrue(transfer.is_finalized)
         self.assertEqual(transfer.status, TRANSFER_EVENT_TYPES.confirmed)
+        self.assertFalse(UserReserve.objects.filter(user=self.sender).exists())
 
 
 __all__ = [
@@ -247,6 +328,7 @@ __all__ = [
     "CheckoutTestCase",
     "RaidenPaymentTestCase",
     "StoreTestCase",
+    "UserBalanceTestCase",
     "TransferTestCase",
     "InternalTransferTestCase",
     "ExternalTransferTestCase",
@@ -48,8 +48,9 @@ class PaymentTransferTestCase(BaseTestCase):
 
         with patch.object(self.block_filter, "get_new_entries", return_value=[block_data.hash]):
             with patch.object(self.w3.eth, "getBlock", return_value=block_data):
-                with patch.object(
-                    self.w3.eth, "waitForTransactionReceipt", return_value=tx_receipt
+                with patch(
+                    "hub20.apps.ethereum_money.client.fetch_block_receipts",
+                    return_value={tx_data.hash: tx_receipt},
                 ):
                     process_latest_transfers(self.w3, self.checkout.chain, self.block_filter)
 
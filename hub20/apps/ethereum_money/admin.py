@@ -15,9 +15,18 @@ class TokenAdmin(admin.ModelAdmin):
     list_filter = ["chain"]
 
 
+class AccountBalanceInline(admin.TabularInline):
+    model = models.AccountBalance
+    fields = ["currency", "amount"]
+    readonly_fields = ["currency", "amount"]
+    extra = 0
+    can_delete = False
+
+
 @admin.register(EthereumAccount)
 class EthereumAccountAdmin(admin.ModelAdmin):
     list_display = ["address"]
+    inlines = [AccountBalanceInline]
 
     def has_add_permission(
         self, request: HttpRequest, obj: Optional[EthereumAccount] = None
@@ -4,3 +4,4 @@ TRACKED_TOKENS = getattr(settings, "ETHEREUM_MONEY_TRACKED_TOKENS", [])
 TRANSFER_GAS_LIMIT = getattr(settings, "ETHEREUM_MONEY_TRANSFER_GAS_LIMIT", 200_000)
 HD_WALLET_ROOT_KEY = getattr(settings, "ETHEREUM_HD_WALLET_ROOT_KEY", None)
 HD_WALLET_MNEMONIC = getattr(settings, "ETHEREUM_HD_WALLET_MNEMONIC", None)
+ACCOUNT_SCAN_CONCURRENCY = getattr(settings, "ETHEREUM_MONEY_ACCOUNT_SCAN_CONCURRENCY", 4)
@@ -1,48 +1,60 @@
 import asyncio
 import logging
-from typing import Optional
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
 from asgiref.sync import sync_to_async
+from django.db import transaction
 from eth_utils import to_checksum_address
-from ethereum.abi import ContractTranslator
 from ethtoken.abi import EIP20_ABI
+from hexbytes import HexBytes
 from web3 import Web3
-from web3.exceptions import TimeExhausted, TransactionNotFound
-
-from hub20.apps.blockchain.client import BLOCK_CREATION_INTERVAL, BLOCK_SCAN_RANGE
-from hub20.apps.blockchain.models import Block, Chain, Transaction
+from web3.datastructures import AttributeDict
+from web3.exceptions import TransactionNotFound
+
+from hub20.apps.blockchain import async_provider, signals as blockchain_signals
+from hub20.apps.blockchain.app_settings import RPC_BATCH_SIZE, START_BLOCK_NUMBER
+from hub20.apps.blockchain.batch import (
+    MissingReceiptsError,
+    get_block_receipts,
+    get_blocks_by_number,
+)
+from hub20.apps.blockchain.bulk import bulk_record_block, send_created_signals
+from hub20.apps.blockchain.client import (
+    BLOCK_CREATION_INTERVAL,
+    BLOCK_SCAN_RANGE,
+    fetch_block_receipts,
+    get_catch_up_ranges,
+    get_resume_block_number,
+    split_block_ranges,
+    wait_for_block_receipts,
+)
+from hub20.apps.blockchain.constants import ERC20_721_TRANSFER_TOPIC
+from hub20.apps.blockchain.models import Block, Chain, ListenerCursor, Transaction
 from hub20.apps.ethereum_money import get_ethereum_account_model, signals
-from hub20.apps.ethereum_money.app_settings import TRANSFER_GAS_LIMIT
-from hub20.apps.ethereum_money.models import EthereumToken, EthereumTokenAmount
+from hub20.apps.ethereum_money.app_settings import ACCOUNT_SCAN_CONCURRENCY, TRANSFER_GAS_LIMIT
+from hub20.apps.ethereum_money.codec import (
+    decode_block_transfers,
+    decode_transfer_input,
+    decode_transfer_log,
+)
+from hub20.apps.ethereum_money.models import (
+    EthereumToken,
+    EthereumTokenAmount,
+    TokenTransfer,
+    encode_transfer_data,
+)
+from hub20.apps.ethereum_money.registry import watched_addresses
 
 logger = logging.getLogger(__name__)
+LATEST_TRANSFERS_CURSOR = "listen_latest_transfers"
+ACCOUNT_TRANSACTIONS_CURSOR = "download_all_account_transactions"
+TOKEN_TRANSFERS_CURSOR = "download_all_token_transfers"
 EthereumAccount = get_ethereum_account_model()
 
 
-def _decode_transfer_arguments(w3: Web3, token: EthereumToken, tx_data):
-    try:
-        contract = w3.eth.contract(abi=EIP20_ABI, address=token.address)
-        fn, args = contract.decode_function_input(tx_data.input)
-
-        # TODO: is this really the best way to identify the transaction as a value transfer?
-        transfer_idenfifier = contract.functions.transfer.function_identifier
-        if not transfer_idenfifier == fn.function_identifier:
-            return None
-
-        return args
-    except ValueError:
-        return None
-    except Exception as exc:
-        logger.exception(exc)
-
-
-def encode_transfer_data(recipient_address, amount: EthereumTokenAmount):
-    translator = ContractTranslator(EIP20_ABI)
-    encoded_data = translator.encode_function_call("transfer", (recipient_address, amount.as_wei))
-    return f"0x{encoded_data.hex()}"
-
-
-def build_transfer_transaction(w3: Web3, sender, recipient, amount: EthereumTokenAmount):
+def build_transfer_transaction(
+    w3: Web3, sender, recipient, amount: EthereumTokenAmount, nonce: int
+):
     token = amount.currency
     chain_id = int(w3.net.version)
     message = f"Web3 client is on network {chain_id}, token {token.code} is on {token.chain_id}"
@@ -50,7 +62,7 @@ def build_transfer_transaction(w3: Web3, sender, recipient, amount: EthereumToke
 
     transaction_params = {
         "chainId": chain_id,
-        "nonce": w3.eth.getTransactionCount(sender),
+        "nonce": nonce,
         "gasPrice": w3.eth.generateGasPrice(),
         "gas": TRANSFER_GAS_LIMIT,
         "from": sender,
@@ -68,23 +80,25 @@ def build_transfer_transaction(w3: Web3, sender, recipient, amount: EthereumToke
 def get_transfer_value_by_tx_data(
     w3: Web3, token: EthereumToken, tx_data
 ) -> Optional[EthereumTokenAmount]:
-    args = _decode_transfer_arguments(w3, token, tx_data)
-    if args is not None:
-        return token.from_wei(args["_value"])
+    transfer = decode_transfer_input(tx_data.input)
+    if transfer is not None:
+        return token.from_wei(transfer.amount)
 
 
 def get_transfer_recipient_by_tx_data(w3: Web3, token: EthereumToken, tx_data):
-    args = _decode_transfer_arguments(w3, token, tx_data)
-    if args is not None:
-        return args["_to"]
+    transfer = decode_transfer_input(tx_data.input)
+    if transfer is not None:
+        return transfer.recipient
 
 
 def get_transfer_recipient_by_receipt(w3: Web3, token: EthereumToken, tx_receipt):
-    contract = w3.eth.contract(abi=EIP20_ABI, address=token.address)
-    tx_logs = contract.events.Transfer().processReceipt(tx_receipt)
-    assert len(tx_logs) == 1, "There should be only one log entry on transfer function"
+    transfers = [
+        decode_transfer_log(log_data.topics, log_data.data) for log_data in tx_receipt.logs
+    ]
+    transfers = [transfer for transfer in transfers if transfer is not None]
+    assert len(transfers) == 1, "There should be only one log entry on transfer function"
 
-    return tx_logs[0].args["_to"]
+    return transfers[0].recipient
 
 
 def get_account_balance(w3: Web3, token: EthereumToken, address) -> EthereumTokenAmount:
@@ -104,82 +118,165 @@ def get_token_information(w3: Web3, address):
     }
 
 
-def sync_token_transfers(w3: Web3, token: EthereumToken, starting_block: int, end_block: int):
-    chain_id = int(w3.net.version)
-    chain = Chain.make(chain_id=chain_id)
-    accounts_by_address = {a.address: a for a in EthereumAccount.objects.all()}
+def record_matched_transactions(chain_id: int, matches: List[Tuple]) -> int:
+    """
+    Records the (block data, {tx hash: receipt}) pairs found by the
+    historical scans, with one bulk insert per block. Only the
+    transactions that have a receipt in the pair are recorded.
+    """
+    recorded_count = 0
+    for block_data, tx_receipts in matches:
+        with transaction.atomic():
+            recorded = bulk_record_block(block_data, tx_receipts, chain_id=chain_id)
+            send_created_signals(recorded)
+        recorded_count += len(recorded.transactions)
+    return recorded_count
+
+
+async def scan_account_transactions(
+    provider: async_provider.BaseAsyncProvider,
+    chain_id: int,
+    addresses: FrozenSet[str],
+    starting_block: int,
+    end_block: int,
+    concurrency: int = ACCOUNT_SCAN_CONCURRENCY,
+) -> int:
+    """
+    Records every transaction from or to any of `addresses` between
+    `starting_block` and `end_block` (exclusive), fetching each block
+    only once no matter how many addresses are watched. Batches of
+    blocks are fetched with up to `concurrency` requests in flight.
+
+    Returns the number of transactions recorded.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def scan_range(lower: int, upper: int) -> int:
+        async with semaphore:
+            blocks = await async_provider.batch_request(
+                provider,
+                "eth_getBlockByNumber",
+                [(hex(number), True) for number in range(lower, upper)],
+            )
+            matched_txs = {
+                HexBytes(tx_data.hash): block_data
+                for block_data in blocks
+                if block_data is not None
+                for tx_data in block_data.transactions
+                if tx_data["from"] in addresses or tx_data.to in addresses
+            }
+            if not matched_txs:
+                return 0
+
+            receipts = await async_provider.batch_request(
+                provider,
+                "eth_getTransactionReceipt",
+                [(tx_hash.hex(),) for tx_hash in matched_txs],
+            )
+
+        receipts_by_block: Dict[HexBytes, Dict] = {}
+        for tx_hash, tx_receipt in zip(matched_txs, receipts):
+            block_data = matched_txs[tx_hash]
+            if tx_receipt is None:
+                raise MissingReceiptsError(block_data.hash, [tx_hash])
+            receipts_by_block.setdefault(HexBytes(block_data.hash), {})[tx_hash] = tx_receipt
+
+        matches = [
+            (block_data, receipts_by_block[HexBytes(block_data.hash)])
+            for block_data in blocks
+            if block_data is not None and HexBytes(block_data.hash) in receipts_by_block
+        ]
+        return await sync_to_async(record_matched_transactions)(chain_id, matches)
+
+    recorded_counts = await asyncio.gather(
+        *(
+            scan_range(lower, upper)
+            for lower, upper in split_block_ranges(starting_block, end_block, RPC_BATCH_SIZE)
+        )
+    )
+    return sum(recorded_counts)
+
+
+async def record_token_transfer_logs(
+    provider: async_provider.BaseAsyncProvider,
+    chain_id: int,
+    logs: List,
+    addresses: FrozenSet[str],
+) -> int:
+    """
+    Records the transactions of the Transfer logs that have any of
+    `addresses` as sender or recipient and that were not recorded yet.
+    Returns the number of transactions recorded.
+    """
+    tx_hashes = set()
+    for log_data in logs:
+        decoded = TokenTransfer.decode_log(log_data)
+        if decoded is not None and (decoded[0] in addresses or decoded[1] in addresses):
+            tx_hashes.add(HexBytes(log_data.transactionHash).hex())
+
+    unrecorded = await sync_to_async(get_unrecorded_transaction_hashes)(list(tx_hashes))
+    if not unrecorded:
+        return 0
+
+    txs = await async_provider.get_transactions(provider, unrecorded)
+    receipts = await async_provider.batch_request(
+        provider, "eth_getTransactionReceipt", [(tx_hash,) for tx_hash in unrecorded]
+    )
 
-    contract = w3.eth.contract(abi=EIP20_ABI, address=token.address)
-    tx_filter = contract.events.Transfer.createFilter(fromBlock=starting_block, toBlock=end_block)
+    txs_by_block: Dict[HexBytes, List] = {}
+    for tx_hash, tx_data, tx_receipt in zip(unrecorded, txs, receipts):
+        if tx_data is None or tx_receipt is None:
+            raise MissingReceiptsError(getattr(tx_receipt, "blockHash", b""), [tx_hash])
+        txs_by_block.setdefault(HexBytes(tx_data.blockHash), []).append((tx_data, tx_receipt))
 
-    pending_txs = [entry.transactionHash.hex() for entry in tx_filter.get_all_entries()]
-    recorded_txs = tuple(
-        Transaction.objects.filter(hash__in=pending_txs).values_list("hash", flat=True)
+    headers = await async_provider.batch_request(
+        provider, "eth_getBlockByHash", [(block_hash.hex(), False) for block_hash in txs_by_block]
     )
-    for tx_hash in set(pending_txs) - set(recorded_txs):
-        try:
-            tx_data = w3.eth.getTransaction(tx_hash)
-            recipient_address = get_transfer_recipient_by_tx_data(w3, token, tx_data)
-            recipient = accounts_by_address.get(recipient_address)
-            sender = accounts_by_address.get(tx_data["from"])
-
-            if recipient is not None or sender is not None:
-                block_data = w3.eth.getBlock(tx_data.blockHash)
-                block = Block.make(block_data, chain=chain)
-                tx_receipt = w3.eth.getTransactionReceipt(tx_hash)
-                Transaction.make(tx_data, tx_receipt, block)
-        except TimeoutError:
-            logger.error(f"Failed request to get or check {tx_hash}")
-        except TransactionNotFound:
-            logger.info(f"Tx {tx_hash} has not yet been mined")
-        except ValueError as exc:
-            logger.exception(exc)
-        except Exception as exc:
-            logger.exception(exc)
 
+    # Blocks only carry the matched transactions, the others are not recorded anyway
+    matches = [
+        (
+            AttributeDict({**header, "transactions": [tx for tx, _ in txs_by_block[block_hash]]}),
+            {tx_receipt.transactionHash: tx_receipt for _, tx_receipt in txs_by_block[block_hash]},
+        )
+        for block_hash, header in zip(txs_by_block, headers)
+    ]
+    return await sync_to_async(record_matched_transactions)(chain_id, matches)
 
-def sync_account_transactions(
-    w3: Web3, account: EthereumAccount, starting_block: int, end_block: int
-):
-    chain_id = int(w3.net.version)
 
-    txs = {}
-    blocks = {}
-    for block_number in range(starting_block, end_block):
-        block_data = w3.eth.getBlock(block_number, full_transactions=True)
-        blocks[block_data.hash] = block_data
-        for tx in block_data.transactions:
-            if account.address in (tx.to, tx["from"]):
-                txs.append({tx.hash.hex(): tx})
+def get_scan_start(w3: Web3, chain_id: int, cursor_name: str) -> int:
+    cursor = ListenerCursor.objects.filter(chain_id=chain_id, name=cursor_name).first()
+    return START_BLOCK_NUMBER if cursor is None else get_resume_block_number(w3, cursor)
 
-    recorded_txs = Transaction.objects.filter(hash__in=txs.keys())
-    recorded_hashes = recorded_txs.values_list("hash", flat=True)
 
-    for tx_hash in set(txs.keys()) - set(recorded_hashes):
-        tx_data = txs[tx_hash]
-        block = Block.make(tx_data.blockHash, chain_id=chain_id)
-        tx_receipt = w3.eth.getTransactionReceipt(tx_hash)
+def get_watched_addresses(chain: Chain) -> Tuple[Dict, Dict]:
+    # Called once per batch of blocks, which is when changes of other processes are picked up
+    watched_addresses.refresh()
+    return watched_addresses.accounts_by_address, watched_addresses.get_tokens_by_address(chain.id)
 
-        Transaction.make(tx_data, tx_receipt, block)
 
+def get_watched_address_sets(chain_id: int) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """
+    Addresses of the accounts and the token contracts that are relevant
+    to the selective ingest of blocks from the chain.
+    """
+    return watched_addresses.account_addresses, watched_addresses.get_token_addresses(chain_id)
 
-def process_pending_transfers(w3: Web3, chain: Chain, tx_filter):
+
+def get_unrecorded_transaction_hashes(tx_hashes: List[str]) -> List[str]:
+    recorded_txs = Transaction.objects.filter(hash__in=tx_hashes).values_list("hash", flat=True)
+    return list(set(tx_hashes) - set(recorded_txs))
+
+
+def process_pending_transactions(w3: Web3, chain: Chain, transactions: List):
     chain.refresh_from_db()
 
-    # Convert the querysets to lists of addresses
-    accounts_by_addresses = {account.address: account for account in EthereumAccount.objects.all()}
-    tokens_by_address = {
-        token.address: token for token in EthereumToken.ERC20tokens.filter(chain=chain)
-    }
+    accounts_by_addresses, tokens_by_address = get_watched_addresses(chain)
     ETH = EthereumToken.ETH(chain=chain)
 
-    pending_txs = [entry.hex() for entry in tx_filter.get_new_entries()]
-    recorded_txs = tuple(
-        Transaction.objects.filter(hash__in=pending_txs).values_list("hash", flat=True)
-    )
-    for tx_hash in set(pending_txs) - set(recorded_txs):
+    for tx_data in transactions:
+        tx_hash = tx_data.hash.hex()
         try:
-            tx_data = w3.eth.getTransaction(tx_hash)
             token = tokens_by_address.get(tx_data.to)
             if token:
                 recipient_address = get_transfer_recipient_by_tx_data(w3, token, tx_data)
@@ -199,104 +296,370 @@ def process_pending_transfers(w3: Web3, chain: Chain, tx_filter):
                     amount=amount,
                     transaction_hash=tx_hash,
                 )
+        except Exception as exc:
+            logger.exception(exc)
+
+
+def process_pending_transfers(w3: Web3, chain: Chain, tx_filter):
+    pending_txs = [entry.hex() for entry in tx_filter.get_new_entries()]
+
+    transactions = []
+    for tx_hash in get_unrecorded_transaction_hashes(pending_txs):
+        try:
+            transactions.append(w3.eth.getTransaction(tx_hash))
         except TimeoutError:
             logger.error(f"Failed request to get or check {tx_hash}")
         except TransactionNotFound:
             logger.info(f"Tx {tx_hash} has not yet been mined")
-        except ValueError as exc:
-            logger.exception(exc)
-        except Exception as exc:
-            logger.exception(exc)
+
+    process_pending_transactions(w3, chain, transactions)
+
+
+def get_relevant_transactions(
+    w3: Web3, block_data, accounts_by_address: Dict, tokens_by_address: Dict
+) -> List:
+    relevant_txs = []
+    token_transfers = decode_block_transfers(block_data, tokens_by_address)
+    for tx_data in block_data.transactions:
+        sender = tx_data["from"]
+        sender_account = accounts_by_address.get(sender)
+
+        if tx_data.to in tokens_by_address:
+            transfer = token_transfers.get(tx_data.hash)
+            recipient = transfer and transfer.recipient
+        else:
+            recipient = tx_data.to
+
+        recipient_account = accounts_by_address.get(recipient)
+
+        if sender_account or recipient_account:
+            logger.info(f"Saving tx {tx_data.hash.hex()}: {sender} -> {recipient}")
+            relevant_txs.append(tx_data)
+    return relevant_txs
+
+
+def record_relevant_transactions(chain: Chain, block_data, relevant_txs: List, tx_receipts: Dict):
+    # Receipts of the other transactions of the block are left out, so they are not recorded
+    relevant_receipts = {tx_data.hash: tx_receipts[tx_data.hash] for tx_data in relevant_txs}
+    record_matched_transactions(chain.id, [(block_data, relevant_receipts)])
+
+
+def process_transfer_blocks(w3: Web3, chain: Chain, blocks: List):
+    """
+    Records the relevant transactions of a sequence of blocks, with the
+    receipts of all blocks that have any fetched in one batch.
+    """
+    accounts_by_address, tokens_by_address = get_watched_addresses(chain)
+    relevant_txs_by_block = [
+        (
+            block_data,
+            get_relevant_transactions(w3, block_data, accounts_by_address, tokens_by_address),
+        )
+        for block_data in blocks
+    ]
+
+    receipt_blocks = [
+        block_data for block_data, relevant_txs in relevant_txs_by_block if relevant_txs
+    ]
+    receipts_by_block = get_block_receipts(w3, receipt_blocks) if receipt_blocks else {}
+
+    for block_data, relevant_txs in relevant_txs_by_block:
+        if not relevant_txs:
+            continue
+
+        tx_receipts = receipts_by_block.get(HexBytes(block_data.hash), {})
+        missing = [tx_data.hash for tx_data in relevant_txs if tx_data.hash not in tx_receipts]
+        if missing:
+            raise MissingReceiptsError(block_data.hash, missing)
+        record_relevant_transactions(chain, block_data, relevant_txs, tx_receipts)
+
+
+def catch_up_latest_transfers(w3: Web3, chain: Chain, until_block: int):
+    """
+    Processes the blocks mined since the last one seen by
+    `listen_latest_transfers`, moving its cursor after every batch.
+    """
+    for lower, upper in get_catch_up_ranges(w3, chain.id, LATEST_TRANSFERS_CURSOR, until_block):
+        blocks = [block for block in get_blocks_by_number(w3, range(lower, upper)) if block]
+        if not blocks:
+            return
+
+        process_transfer_blocks(w3, chain, blocks)
+        last_block = blocks[-1]
+        ListenerCursor.objects.move_to(
+            chain.id, LATEST_TRANSFERS_CURSOR, last_block.number, last_block.hash
+        )
 
 
 def process_latest_transfers(w3: Web3, chain: Chain, block_filter):
     chain.refresh_from_db()
 
-    accounts_by_address = {a.address: a for a in EthereumAccount.objects.all()}
-    tokens = EthereumToken.ERC20tokens.filter(chain=chain).select_related("chain")
-    tokens_by_address = {token.address: token for token in tokens}
+    accounts_by_address, tokens_by_address = get_watched_addresses(chain)
 
     for block_hash in block_filter.get_new_entries():
         block_data = w3.eth.getBlock(block_hash.hex(), full_transactions=True)
 
         logger.info(f"Checking block {block_hash.hex()} for relevant transfers")
-        for tx_data in block_data.transactions:
-            tx_hash = tx_data.hash
+        relevant_txs = get_relevant_transactions(
+            w3, block_data, accounts_by_address, tokens_by_address
+        )
+        if not relevant_txs:
+            continue
 
-            token = tokens_by_address.get(tx_data.to)
-            sender = tx_data["from"]
-            sender_account = accounts_by_address.get(sender)
+        try:
+            tx_receipts = fetch_block_receipts(w3, block_data)
+        except MissingReceiptsError as exc:
+            logger.warning(f"Could not get receipts for block {block_hash.hex()}: {exc}")
+            continue
 
-            if token:
-                recipient = get_transfer_recipient_by_tx_data(w3, token, tx_data)
-            else:
-                recipient = tx_data.to
+        record_relevant_transactions(chain, block_data, relevant_txs, tx_receipts)
 
-            recipient_account = accounts_by_address.get(recipient)
 
-            try:
-                if sender_account or recipient_account:
-                    logger.info(f"Saving tx {tx_hash.hex()}: {sender} -> {recipient}")
-                    tx_receipt = w3.eth.waitForTransactionReceipt(tx_data.hash)
-                    block = Block.make(block_data, chain_id=chain.id)
-                    Transaction.make(tx_data=tx_data, tx_receipt=tx_receipt, block=block)
-            except TimeExhausted:
-                logger.warning(f"Timeout when waiting for receipt of tx {tx_hash.hex()}")
+async def listen_latest_transfers(w3: Web3):
+    provider = async_provider.make_async_provider(w3)
+    try:
+        chain_id = await async_provider.get_chain_id(provider)
+        chain = await sync_to_async(Chain.make)(chain_id=chain_id)
+        current_block = await async_provider.get_block(
+            provider, await async_provider.get_block_number(provider)
+        )
+
+        # On the very first run there is nothing to catch up on, we start from here
+        await sync_to_async(ListenerCursor.objects.get_or_create)(
+            chain_id=chain_id,
+            name=LATEST_TRANSFERS_CURSOR,
+            defaults={"block_number": current_block.number, "block_hash": current_block.hash},
+        )
+        await sync_to_async(catch_up_latest_transfers)(w3, chain, current_block.number)
+        last_block_number = current_block.number
+
+        async for block_hash in async_provider.block_hash_stream(
+            provider, poll_interval=BLOCK_CREATION_INTERVAL
+        ):
+            accounts_by_address, tokens_by_address = await sync_to_async(get_watched_addresses)(
+                chain
+            )
 
+            block_data = await async_provider.get_block(
+                provider, block_hash, full_transactions=True
+            )
+            if block_data is None:
+                continue
 
-async def listen_latest_transfers(w3: Web3):
-    block_filter = w3.eth.filter("latest")
-    chain_id = int(w3.net.version)
+            if block_data.number > last_block_number + 1:
+                # Blocks were skipped, e.g, when the node dropped our filter
+                await sync_to_async(catch_up_latest_transfers)(w3, chain, block_data.number - 1)
 
-    while True:
-        chain = await sync_to_async(Chain.make)(chain_id=chain_id)
-        await asyncio.sleep(BLOCK_CREATION_INTERVAL)
-        await sync_to_async(process_latest_transfers)(w3, chain, block_filter)
+            await sync_to_async(blockchain_signals.block_data_received.send)(
+                sender=Block,
+                chain_id=chain_id,
+                block_data=block_data,
+                transactions=block_data.transactions,
+            )
+
+            logger.info(f"Checking block {block_hash.hex()} for relevant transfers")
+            relevant_txs = get_relevant_transactions(
+                w3, block_data, accounts_by_address, tokens_by_address
+            )
+            if relevant_txs:
+                # Failures propagate, so that the block is picked up again on restart
+                tx_receipts = await wait_for_block_receipts(provider, block_data)
+                await sync_to_async(record_relevant_transactions)(
+                    chain, block_data, relevant_txs, tx_receipts
+                )
+
+            last_block_number = block_data.number
+            await sync_to_async(ListenerCursor.objects.move_to)(
+                chain_id, LATEST_TRANSFERS_CURSOR, block_data.number, block_data.hash
+            )
+    finally:
+        await provider.close()
 
 
 async def listen_pending_transfers(w3: Web3):
-    tx_filter = w3.eth.filter("pending")
-    chain_id = int(w3.net.version)
+    provider = async_provider.make_async_provider(w3)
+    try:
+        chain_id = await async_provider.get_chain_id(provider)
+        tx_filter_id = await async_provider.new_pending_transaction_filter(provider)
 
-    while True:
-        chain = await sync_to_async(Chain.make)(chain_id=chain_id)
-        await asyncio.sleep(BLOCK_CREATION_INTERVAL / 2)
-        await sync_to_async(process_pending_transfers)(w3, chain, tx_filter)
+        while True:
+            chain = await sync_to_async(Chain.make)(chain_id=chain_id)
+            await asyncio.sleep(BLOCK_CREATION_INTERVAL / 2)
 
+            try:
+                pending_txs = await async_provider.get_filter_changes(provider, tx_filter_id)
+            except async_provider.RPCError as exc:
+                # Pending txs missed meanwhile are still caught once mined by the block listener
+                logger.info(f"Pending tx filter failed ({exc}), installing a new one")
+                tx_filter_id = await async_provider.new_pending_transaction_filter(provider)
+                continue
 
-async def download_all_token_transfers(w3: Web3):
-    chain_id = int(w3.net.version)
-    chain = await sync_to_async(Chain.make)(chain_id=chain_id)
+            tx_hashes = await sync_to_async(get_unrecorded_transaction_hashes)(
+                [tx_hash.hex() for tx_hash in pending_txs]
+            )
+            try:
+                found = await async_provider.get_transactions(provider, tx_hashes)
+            except (asyncio.TimeoutError, async_provider.RPCError) as exc:
+                logger.error(f"Failed request to get pending transactions: {exc}")
+                continue
+
+            transactions = [tx_data for tx_data in found if tx_data is not None]
+            await sync_to_async(process_pending_transactions)(w3, chain, transactions)
+    finally:
+        await provider.close()
 
-    tokens = await sync_to_async(list)(EthereumToken.ERC20tokens.filter(chain=chain))
 
-    for token in tokens:
-        current_block = await sync_to_async(Transaction.objects.last_block_with)(
-            chain=chain, address=token.address
+async def sweep_token_transfers(
+    w3: Web3,
+    provider: async_provider.BaseAsyncProvider,
+    chain_id: int,
+    start: Optional[int] = None,
+):
+    """
+    Sweeps the chain with eth_getLogs for the Transfer events of all
+    tracked tokens at once, from `start` or from where the previous
+    sweep stopped, and records the transfers of our accounts.
+    """
+    await sync_to_async(watched_addresses.refresh)()
+    token_addresses = await sync_to_async(watched_addresses.get_token_addresses)(chain_id)
+    addresses = await sync_to_async(lambda: watched_addresses.account_addresses)()
+    if not token_addresses or not addresses:
+        return
+
+    if start is None:
+        start = await sync_to_async(get_scan_start)(w3, chain_id, TOKEN_TRANSFERS_CURSOR)
+    current_block = await async_provider.get_block_number(provider)
+
+    filter_params = {"address": sorted(token_addresses), "topics": [ERC20_721_TRANSFER_TOPIC]}
+    log_ranges = async_provider.log_range_stream(
+        provider, filter_params, start, current_block + 1, range_size=BLOCK_SCAN_RANGE
+    )
+    async for lower, upper, logs in log_ranges:
+        recorded = await record_token_transfer_logs(provider, chain_id, logs, addresses)
+        logger.info(
+            f"{len(logs)} token transfers between {lower} and {upper}, {recorded} recorded"
         )
-        while current_block < chain.highest_block:
-            start, end = current_block, current_block + BLOCK_SCAN_RANGE
-            logger.info(f"Checking {token.code} transfers between {start} and {end}")
-            await sync_to_async(sync_token_transfers)(
-                w3=w3, token=token, starting_block=start, end_block=end
+
+        last_block = await async_provider.get_block(provider, upper - 1)
+        await sync_to_async(ListenerCursor.objects.move_to)(
+            chain_id, TOKEN_TRANSFERS_CURSOR, last_block.number, last_block.hash
+        )
+
+
+async def follow_token_transfer_logs(
+    w3: Web3,
+    provider: async_provider.BaseAsyncProvider,
+    chain_id: int,
+    token_addresses: FrozenSet[str],
+):
+    """
+    Records the transfers of our accounts from the Transfer logs of
+    `token_addresses`, as the node announces them. Once a log of a newer
+    block comes in, all logs of the previous one were seen and the
+    cursor is moved there.
+    """
+    filter_params = {"address": sorted(token_addresses), "topics": [ERC20_721_TRANSFER_TOPIC]}
+    last_block: Optional[Tuple[int, HexBytes]] = None
+
+    logs = async_provider.log_stream(
+        provider, filter_params, poll_interval=BLOCK_CREATION_INTERVAL
+    )
+    async for log_data in logs:
+        if log_data.get("removed"):
+            continue
+
+        if last_block is None:
+            # Covers the blocks mined between the last sweep and the start of the stream
+            await sweep_token_transfers(w3, provider, chain_id)
+        elif log_data.blockNumber > last_block[0]:
+            await sync_to_async(ListenerCursor.objects.move_to)(
+                chain_id, TOKEN_TRANSFERS_CURSOR, *last_block
             )
-            current_block += BLOCK_SCAN_RANGE
 
+        addresses = await sync_to_async(lambda: watched_addresses.account_addresses)()
+        await record_token_transfer_logs(provider, chain_id, [log_data], addresses)
+        last_block = (log_data.blockNumber, log_data.blockHash)
 
-async def download_all_account_transactions(w3: Web3):
-    chain_id = int(w3.net.version)
-    chain = await sync_to_async(Chain.make)(chain_id=chain_id)
 
-    accounts = await sync_to_async(list)(EthereumAccount.objects.all())
+async def download_all_token_transfers(w3: Web3, start: Optional[int] = None):
+    provider = async_provider.make_async_provider(w3)
+    try:
+        chain_id = await async_provider.get_chain_id(provider)
+        await sync_to_async(Chain.make)(chain_id=chain_id)
+        await sweep_token_transfers(w3, provider, chain_id, start=start)
+    finally:
+        await provider.close()
+
+
+async def listen_token_transfers(w3: Web3):
+    """
+    Follows the Transfer logs of the tracked tokens, which catches the
+    transfers to our accounts made by any contract (routers, multisend,
+    etc) and not only the token calls that `listen_latest_transfers`
+    decodes. Blocks missed while not listening are swept first, and the
+    stream is renewed whenever the set of tracked tokens changes.
+    """
+    provider = async_provider.make_async_provider(w3)
+    try:
+        chain_id = await async_provider.get_chain_id(provider)
+        await sync_to_async(Chain.make)(chain_id=chain_id)
 
-    for account in accounts:
-        current_block = await sync_to_async(Transaction.objects.last_block_with)(
-            chain=chain, address=account.address
-        )
-        while current_block < chain.highest_block:
-            start, end = current_block, current_block + BLOCK_SCAN_RANGE
-            logger.info(f"Checking {account.address} txs between {start} and {end}")
-            await sync_to_async(sync_account_transactions)(
-                w3=w3, account=account, starting_block=start, end_block=end
+        while True:
+            await sweep_token_transfers(w3, provider, chain_id)
+
+            token_addresses = await sync_to_async(watched_addresses.get_token_addresses)(chain_id)
+            if not token_addresses:
+                # An empty address list would give us the transfers of every token
+                await asyncio.sleep(BLOCK_CREATION_INTERVAL)
+                continue
+
+            follower = asyncio.ensure_future(
+                follow_token_transfer_logs(w3, provider, chain_id, token_addresses)
+            )
+            try:
+                while not follower.done():
+                    await asyncio.wait({follower}, timeout=BLOCK_CREATION_INTERVAL)
+                    await sync_to_async(watched_addresses.refresh)()
+                    current = await sync_to_async(watched_addresses.get_token_addresses)(chain_id)
+                    if current != token_addresses:
+                        logger.info("Tracked tokens changed, renewing the Transfer log stream")
+                        break
+                else:
+                    # Failures of the stream propagate, so that the supervisor restarts us
+                    follower.result()
+            finally:
+                follower.cancel()
+                await asyncio.gather(follower, return_exceptions=True)
+    finally:
+        await provider.close()
+
+
+async def download_all_account_transactions(w3: Web3, start: Optional[int] = None):
+    """
+    Scans the chain once for transactions of all accounts, from `start`
+    or from where the previous scan stopped.
+    """
+    provider = async_provider.make_async_provider(w3)
+    try:
+        chain_id = await async_provider.get_chain_id(provider)
+        await sync_to_async(Chain.make)(chain_id=chain_id)
+        addresses = await sync_to_async(lambda: watched_addresses.account_addresses)()
+        if not addresses:
+            return
+
+        if start is None:
+            start = await sync_to_async(get_scan_start)(w3, chain_id, ACCOUNT_TRANSACTIONS_CURSOR)
+        current_block = await async_provider.get_block_number(provider)
+
+        for lower, upper in split_block_ranges(start, current_block + 1, BLOCK_SCAN_RANGE):
+            logger.info(f"Checking txs of {len(addresses)} accounts between {lower} and {upper}")
+            recorded = await scan_account_transactions(provider, chain_id, addresses, lower, upper)
+            if recorded:
+                logger.info(f"Recorded {recorded} txs between {lower} and {upper}")
+
+            last_block = await async_provider.get_block(provider, upper - 1)
+            await sync_to_async(ListenerCursor.objects.move_to)(
+                chain_id, ACCOUNT_TRANSACTIONS_CURSOR, last_block.number, last_block.hash
             )
-            current_block += BLOCK_SCAN_RANGE
+    finally:
+        await provider.close()
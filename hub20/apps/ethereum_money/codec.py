@@ -0,0 +1,136 @@
+import functools
+from typing import Dict, Iterable, NamedTuple, Optional, Union
+
+from eth_utils import to_checksum_address
+from hexbytes import HexBytes
+
+from hub20.apps.blockchain.constants import ERC20_721_TRANSFER_TOPIC
+
+# Selectors of transfer(address,uint256) and transferFrom(address,address,uint256)
+TRANSFER_SELECTOR = bytes.fromhex("a9059cbb")
+TRANSFER_FROM_SELECTOR = bytes.fromhex("23b872dd")
+TRANSFER_TOPIC = bytes(HexBytes(ERC20_721_TRANSFER_TOPIC))
+
+WORD_SIZE = 32
+ADDRESS_PADDING = bytes(WORD_SIZE - 20)
+MAX_UINT256 = 2**256 - 1
+
+HexData = Union[bytes, str]
+
+
+class TransferCall(NamedTuple):
+    sender: Optional[str]  # Only set on transferFrom, transfer is sent by the caller
+    recipient: str
+    amount: int
+
+
+class TransferEvent(NamedTuple):
+    sender: str
+    recipient: str
+    amount: int
+
+
+def _to_bytes(value: HexData) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    digits = value[2:] if value[:2] in ("0x", "0X") else value
+    # Like HexBytes, accept hex strings with odd length
+    return bytes.fromhex(digits if len(digits) % 2 == 0 else f"0{digits}")
+
+
+@functools.lru_cache(maxsize=4096)
+def _to_address(value: bytes) -> str:
+    # The same few addresses show up over and over, and checksumming means hashing
+    return to_checksum_address(value)
+
+
+def _decode_address(word: bytes) -> Optional[str]:
+    if word[:12] != ADDRESS_PADDING:
+        return None
+    return _to_address(word[12:])
+
+
+def decode_transfer_input(tx_input: HexData) -> Optional[TransferCall]:
+    """
+    Decodes the arguments of a call to transfer or transferFrom, reading
+    them at their fixed offsets. Returns None on any other input, which
+    includes arguments that would not pass ABI decoding (data too short,
+    non-zero address padding).
+    """
+    data = _to_bytes(tx_input)
+    selector = data[:4]
+
+    if selector == TRANSFER_SELECTOR and len(data) >= 4 + 2 * WORD_SIZE:
+        recipient = _decode_address(data[4:36])
+        if recipient is None:
+            return None
+        return TransferCall(None, recipient, int.from_bytes(data[36:68], "big"))
+
+    if selector == TRANSFER_FROM_SELECTOR and len(data) >= 4 + 3 * WORD_SIZE:
+        sender = _decode_address(data[4:36])
+        recipient = _decode_address(data[36:68])
+        if sender is None or recipient is None:
+            return None
+        return TransferCall(sender, recipient, int.from_bytes(data[68:100], "big"))
+
+    return None
+
+
+def encode_transfer_input(recipient_address: str, amount: int) -> str:
+    address = _to_bytes(recipient_address)
+    if len(address) != 20:
+        raise ValueError(f"{recipient_address} is not a valid address")
+    if not 0 <= amount <= MAX_UINT256:
+        raise ValueError(f"{amount} is not a valid uint256")
+
+    encoded = TRANSFER_SELECTOR + ADDRESS_PADDING + address + amount.to_bytes(WORD_SIZE, "big")
+    return f"0x{encoded.hex()}"
+
+
+def decode_transfer_log(topics: Iterable[HexData], data: HexData) -> Optional[TransferEvent]:
+    """
+    Decodes a Transfer event from the topics and data of a log. ERC721
+    uses the same event signature, but its token id is indexed as a 4th
+    topic, so those logs are not taken as ERC20 transfers.
+    """
+    topics = [_to_bytes(topic) for topic in topics]
+    if len(topics) != 3 or topics[0] != TRANSFER_TOPIC:
+        return None
+
+    return TransferEvent(
+        _to_address(topics[1][-20:]),
+        _to_address(topics[2][-20:]),
+        int.from_bytes(_to_bytes(data), "big"),
+    )
+
+
+def decode_block_transfers(
+    block_data, token_addresses: Iterable[str]
+) -> Dict[bytes, TransferCall]:
+    """
+    Decodes, in one pass over the transactions of a block, all calls to
+    transfer and transferFrom that were sent to one of the tokens.
+    Returns the decoded arguments by transaction hash.
+    """
+    token_addresses = frozenset(token_addresses)
+    transfers = {}
+    for tx_data in block_data.transactions:
+        if tx_data.to not in token_addresses:
+            continue
+        transfer = decode_transfer_input(tx_data.input)
+        if transfer is not None:
+            transfers[tx_data.hash] = transfer
+    return transfers
+
+
+__all__ = [
+    "TRANSFER_SELECTOR",
+    "TRANSFER_FROM_SELECTOR",
+    "TRANSFER_TOPIC",
+    "TransferCall",
+    "TransferEvent",
+    "decode_transfer_input",
+    "encode_transfer_input",
+    "decode_transfer_log",
+    "decode_block_transfers",
+]
@@ -1,12 +1,21 @@
 import logging
 
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from eth_utils import from_wei
 
-from hub20.apps.blockchain.models import Transaction, TransactionLog
+from hub20.apps.blockchain.models import Block, Transaction, TransactionLog
+from hub20.apps.blockchain.signals import block_batch_started
 from hub20.apps.ethereum_money import get_ethereum_account_model
-from hub20.apps.ethereum_money.models import EthereumToken, EthereumTokenAmount
+from hub20.apps.ethereum_money.models import (
+    AccountBalance,
+    AccountBalanceEntry,
+    EthereumToken,
+    EthereumTokenAmount,
+    TokenTransfer,
+)
+from hub20.apps.ethereum_money.registry import watched_addresses
 from hub20.apps.ethereum_money.signals import account_deposit_received
 
 logger = logging.getLogger(__name__)
@@ -17,57 +26,99 @@ EthereumAccount = get_ethereum_account_model()
 def on_transaction_mined_check_for_deposit(sender, **kw):
     tx = kw["instance"]
     if kw["created"]:
+        account = watched_addresses.get_account(tx.to_address)
 
-        accounts = EthereumAccount.objects.all()
-        accounts_by_address = {account.address: account for account in accounts}
-
-        if tx.to_address in accounts_by_address.keys():
+        if account is not None:
             ETH = EthereumToken.ETH(tx.block.chain)
             eth_amount = EthereumTokenAmount(amount=from_wei(tx.value, "ether"), currency=ETH)
             account_deposit_received.send(
                 sender=Transaction,
-                account=accounts_by_address[tx.to_address],
+                account=account,
                 transaction=tx,
                 amount=eth_amount,
+                log_index=None,
             )
 
 
 @receiver(post_save, sender=TransactionLog)
-def on_transaction_event_check_for_token_transfer(sender, **kw):
+def on_transaction_log_created_record_token_transfer(sender, **kw):
+    if not kw["created"]:
+        return
+
     tx_log = kw["instance"]
+    tx = tx_log.transaction
+    # Logs recorded before their address was stored only have the called contract
+    token_address = tx_log.address or tx.to_address
+    token = watched_addresses.get_tokens_by_address(tx.block.chain_id).get(token_address)
+    if token is not None:
+        TokenTransfer.make(tx_log, token)
+
+
+@receiver(post_save, sender=TokenTransfer)
+def on_token_transfer_created_check_for_deposit(sender, **kw):
+    token_transfer = kw["instance"]
 
-    logger.info(f"Event log for {tx_log.transaction} created")
     if kw["created"]:
-        tx = tx_log.transaction
-        token = EthereumToken.ERC20tokens.filter(address=tx.to_address).first()
+        account = watched_addresses.get_account(token_transfer.to_address)
+        if account is not None:
+            account_deposit_received.send(
+                sender=Transaction,
+                account=account,
+                transaction=token_transfer.transaction,
+                amount=token_transfer.as_token_amount,
+                log_index=token_transfer.log.index,
+            )
 
-        if token is not None:
-            recipient_address, transfer_amount = token._decode_transaction(tx)
-            is_token_transfer = recipient_address is not None and transfer_amount is not None
 
-            account = EthereumAccount.objects.filter(address=recipient_address).first()
-            if is_token_transfer and account:
-                account_deposit_received.send(
-                    sender=Transaction, account=account, transaction=tx, amount=transfer_amount
-                )
+@receiver(post_save, sender=EthereumAccount)
+@receiver(post_delete, sender=EthereumAccount)
+@receiver(post_save, sender=EthereumToken)
+@receiver(post_delete, sender=EthereumToken)
+def on_watched_address_changed_invalidate_registry(sender, **kw):
+    # The change is visible right away to this process (it may still be
+    # inside the same transaction), and to the others once committed
+    watched_addresses.reset()
+    transaction.on_commit(watched_addresses.invalidate)
+
+
+@receiver(block_batch_started, sender=Block)
+def on_block_batch_started_refresh_registry(sender, **kw):
+    # Picks up the changes committed by other processes before the blocks are recorded
+    watched_addresses.refresh()
 
 
 @receiver(account_deposit_received, sender=Transaction)
 def on_account_deposit_create_balance_entry(sender, **kw):
     account = kw["account"]
-    transaction = kw["transaction"]
+    tx = kw["transaction"]
     amount = kw["amount"]
 
     try:
-        account.balance_entries.create(
-            amount=amount.amount, currency=amount.currency, transaction=transaction
-        )
+        # A savepoint, so that a failure does not abort the transaction recording the block
+        with transaction.atomic():
+            account.balance_entries.create(
+                amount=amount.amount,
+                currency=amount.currency,
+                transaction=tx,
+                log_index=kw.get("log_index"),
+            )
     except Exception as exc:
         logger.exception(exc)
 
 
+@receiver(post_delete, sender=AccountBalanceEntry)
+def on_balance_entry_deleted_update_account_balance(sender, **kw):
+    # Entries are also deleted in cascade (e.g, with the transactions of blocks dropped on a reorg)
+    entry = kw["instance"]
+    AccountBalance.objects.subtract(entry.account_id, entry.currency_id, entry.amount)
+
+
 __all__ = [
     "on_transaction_mined_check_for_deposit",
-    "on_transaction_event_check_for_token_transfer",
+    "on_transaction_log_created_record_token_transfer",
+    "on_token_transfer_created_check_for_deposit",
+    "on_watched_address_changed_invalidate_registry",
+    "on_block_batch_started_refresh_registry",
     "on_account_deposit_create_balance_entry",
+    "on_balance_entry_deleted_update_account_balance",
 ]
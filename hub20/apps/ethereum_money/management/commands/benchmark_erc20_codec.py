@@ -0,0 +1,133 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from ethtoken.abi import EIP20_ABI
+from web3 import Web3
+
+from hub20.apps.ethereum_money.codec import (
+    TRANSFER_FROM_SELECTOR,
+    TRANSFER_SELECTOR,
+    TRANSFER_TOPIC,
+    decode_transfer_input,
+    decode_transfer_log,
+)
+
+APPROVE_SELECTOR = bytes.fromhex("095ea7b3")
+UNKNOWN_SELECTOR = bytes.fromhex("deadbeef")
+
+
+def _make_address_word(rnd: random.Random, dirty: bool) -> bytes:
+    padding = rnd.getrandbits(96) if dirty else 0
+    return padding.to_bytes(12, "big") + rnd.getrandbits(160).to_bytes(20, "big")
+
+
+def make_input_corpus(rnd: random.Random, size: int):
+    selectors = [TRANSFER_SELECTOR, TRANSFER_FROM_SELECTOR, APPROVE_SELECTOR, UNKNOWN_SELECTOR]
+    corpus = []
+    for _ in range(size):
+        words = [
+            _make_address_word(rnd, dirty=rnd.random() < 0.05)
+            if position < 2 and rnd.random() < 0.9
+            else rnd.getrandbits(256).to_bytes(32, "big")
+            for position in range(rnd.choice([1, 2, 3, 3, 4]))
+        ]
+        data = rnd.choice(selectors) + b"".join(words)
+        if rnd.random() < 0.05:
+            data = data[: -rnd.randint(1, 31)]
+        corpus.append(f"0x{data.hex()}")
+    return corpus
+
+
+def make_log_corpus(rnd: random.Random, size: int):
+    corpus = []
+    for _ in range(size):
+        # ERC721 transfers have the token id as a 4th topic
+        topics = [
+            TRANSFER_TOPIC if rnd.random() < 0.9 else rnd.getrandbits(256).to_bytes(32, "big")
+        ]
+        topics += [_make_address_word(rnd, dirty=False) for _ in range(2)]
+        if rnd.random() < 0.1:
+            topics.append(rnd.getrandbits(256).to_bytes(32, "big"))
+        corpus.append({"topics": topics, "data": rnd.getrandbits(256).to_bytes(32, "big")})
+    return corpus
+
+
+class Command(BaseCommand):
+    help = "Checks the ERC20 codec against ABI decoding on a random corpus and times both"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=20000, help="Entries in each corpus")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def _decode_input_with_abi(self, data):
+        try:
+            fn, args = self.contract.decode_function_input(data)
+        except Exception:
+            return None
+
+        if fn.fn_name == "transfer":
+            return (None, args["_to"], args["_value"])
+        if fn.fn_name == "transferFrom":
+            return (args["_from"], args["_to"], args["_value"])
+        return None
+
+    def _decode_log_with_abi(self, log_data):
+        try:
+            event = self.transfer_event.processLog(
+                {
+                    "topics": log_data["topics"],
+                    "data": f"0x{log_data['data'].hex()}",
+                    "address": self.contract.address,
+                    "logIndex": 0,
+                    "transactionIndex": 0,
+                    "transactionHash": b"",
+                    "blockHash": b"",
+                    "blockNumber": 0,
+                }
+            )
+        except Exception:
+            return None
+        return (event.args["_from"], event.args["_to"], event.args["_value"])
+
+    def _compare(self, name, corpus, reference, candidate):
+        started = time.perf_counter()
+        expected = [reference(entry) for entry in corpus]
+        reference_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        results = [candidate(entry) for entry in corpus]
+        codec_time = time.perf_counter() - started
+
+        mismatches = [
+            entry
+            for entry, result, expected_result in zip(corpus, results, expected)
+            if (result and tuple(result)) != expected_result
+        ]
+        if mismatches:
+            raise CommandError(f"{name}: {len(mismatches)} mismatches, first is {mismatches[0]}")
+
+        decoded = sum(result is not None for result in results)
+        self.stdout.write(
+            f"{name}: {len(corpus)} entries ({decoded} decoded), "
+            f"ABI {reference_time:.3f}s, codec {codec_time:.3f}s, "
+            f"{reference_time / codec_time:.1f}x faster"
+        )
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options["seed"])
+        self.contract = Web3().eth.contract(abi=EIP20_ABI, address=f"0x{'11' * 20}")
+        self.transfer_event = self.contract.events.Transfer()
+
+        self._compare(
+            "calldata",
+            make_input_corpus(rnd, options["size"]),
+            self._decode_input_with_abi,
+            decode_transfer_input,
+        )
+        self._compare(
+            "logs",
+            make_log_corpus(rnd, options["size"]),
+            self._decode_log_with_abi,
+            lambda log_data: decode_transfer_log(log_data["topics"], log_data["data"]),
+        )
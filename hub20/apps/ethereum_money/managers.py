@@ -0,0 +1,18 @@
+from decimal import Decimal
+
+from django.db import models
+from django.db.models import F
+
+
+class AccountBalanceManager(models.Manager):
+    def add(self, account_id: int, currency_id: int, amount: Decimal):
+        balance, _ = self.get_or_create(
+            account_id=account_id, currency_id=currency_id, defaults={"amount": 0}
+        )
+        # Relative update, so that concurrent entries do not overwrite each other
+        self.filter(pk=balance.pk).update(amount=F("amount") + amount)
+
+    def subtract(self, account_id: int, currency_id: int, amount: Decimal):
+        # Never creates a balance, the account may be in the middle of a cascade delete
+        balances = self.filter(account_id=account_id, currency_id=currency_id)
+        balances.update(amount=F("amount") - amount)
@@ -0,0 +1,24 @@
+# Generated by Django 3.0.7 on 2026-10-17 13:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blockchain", "0005_partition_ready_constraints"),
+        ("ethereum_money", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="accountbalanceentry",
+            name="transaction",
+            field=models.OneToOneField(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="blockchain.Transaction",
+            ),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 3.0.7 on 2026-10-17 15:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import hub20.apps.blockchain.fields
+
+# Decodes the Transfer events of known tokens that were already recorded. Logs
+# recorded before their emitting address was stored are attributed to the
+# contract that was called by the transaction.
+POPULATE_TOKEN_TRANSFERS = """
+INSERT INTO ethereum_money_tokentransfer
+    (log_id, transaction_id, token_id, block_number, from_address, to_address, amount)
+SELECT
+    tx_log.id,
+    tx.id,
+    token.id,
+    tx_log.block_number,
+    substring(tx_log.topics[2] FROM 13),
+    substring(tx_log.topics[3] FROM 13),
+    COALESCE(
+        (
+            SELECT SUM(
+                get_byte(tx_log.data, position)::numeric
+                * 256::numeric ^ (length(tx_log.data) - 1 - position)
+            )
+            FROM generate_series(0, length(tx_log.data) - 1) AS position
+        ),
+        0
+    )
+FROM blockchain_transactionlog AS tx_log
+JOIN blockchain_transaction AS tx ON tx.id = tx_log.transaction_id
+JOIN blockchain_block AS block ON block.hash = tx.block_id
+JOIN ethereum_money_ethereumtoken AS token
+    ON token.chain_id = block.chain_id
+    AND decode(substr(token.address, 3), 'hex') = COALESCE(tx_log.address, tx.to_address)
+WHERE array_length(tx_log.topics, 1) = 3
+AND tx_log.topics[1] = decode(
+    'ddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef', 'hex'
+)
+AND token.address != '0x0000000000000000000000000000000000000000'
+ON CONFLICT DO NOTHING
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blockchain", "0007_transactionlog_address"),
+        ("ethereum_money", "0002_accountbalanceentry_transaction_no_constraint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TokenTransfer",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("block_number", models.PositiveIntegerField(db_index=True)),
+                ("from_address", hub20.apps.blockchain.fields.BinaryEthereumAddressField()),
+                ("to_address", hub20.apps.blockchain.fields.BinaryEthereumAddressField()),
+                ("amount", hub20.apps.blockchain.fields.Uint256Field()),
+                (
+                    "log",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="token_transfer",
+                        to="blockchain.TransactionLog",
+                    ),
+                ),
+                (
+                    "token",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="transfers",
+                        to="ethereum_money.EthereumToken",
+                    ),
+                ),
+                (
+                    "transaction",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="token_transfers",
+                        to="blockchain.Transaction",
+                    ),
+                ),
+            ],
+            options={
+                "index_together": {("token", "to_address"), ("token", "from_address")},
+            },
+        ),
+        migrations.RunSQL(POPULATE_TOKEN_TRANSFERS, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.0.7 on 2026-10-17 16:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+import hub20.apps.ethereum_money.models
+
+POPULATE_ACCOUNT_BALANCES = """
+INSERT INTO ethereum_money_accountbalance (account_id, currency_id, amount)
+SELECT account_id, currency_id, SUM(amount)
+FROM ethereum_money_accountbalanceentry
+GROUP BY account_id, currency_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.ETHEREUM_ACCOUNT_MODEL),
+        ("ethereum_money", "0003_tokentransfer"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AccountBalance",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "amount",
+                    hub20.apps.ethereum_money.models.EthereumTokenAmountField(
+                        decimal_places=18, max_digits=32
+                    ),
+                ),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balances",
+                        to=settings.ETHEREUM_ACCOUNT_MODEL,
+                    ),
+                ),
+                (
+                    "currency",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        to="ethereum_money.EthereumToken",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("account", "currency")},
+                "index_together": {("currency", "amount")},
+            },
+        ),
+        migrations.RunSQL(POPULATE_ACCOUNT_BALANCES, reverse_sql=migrations.RunSQL.noop),
+    ]
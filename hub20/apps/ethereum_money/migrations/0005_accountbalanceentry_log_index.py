@@ -0,0 +1,44 @@
+# Generated by Django 3.0.7 on 2026-10-17 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ethereum_money", "0004_accountbalance"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="accountbalanceentry",
+            name="log_index",
+            field=models.SmallIntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name="accountbalanceentry",
+            name="transaction",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="blockchain.Transaction",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="accountbalanceentry",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(log_index__isnull=False),
+                fields=("transaction", "log_index"),
+                name="unique_token_deposit_entry",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="accountbalanceentry",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(log_index__isnull=True),
+                fields=("transaction",),
+                name="unique_eth_deposit_entry",
+            ),
+        ),
+    ]
@@ -2,26 +2,32 @@ from __future__ import annotations
 
 import logging
 import os
-import random
 from decimal import Decimal
 from typing import Any, List, Optional, Tuple, Union
 
 import ethereum
 from django.conf import settings
-from django.db import models
-from django.db.models import Max, Q, Sum
-from eth_utils import to_checksum_address
+from django.db import models, transaction
+from django.db.models import F, FilteredRelation, Max, Q, Sum
 from eth_wallet import Wallet
-from ethereum.abi import ContractTranslator
 from ethtoken.abi import EIP20_ABI
 from model_utils.managers import QueryManager
 from web3 import Web3
 from web3.contract import Contract
 
-from hub20.apps.blockchain.fields import EthereumAddressField, HexField
-from hub20.apps.blockchain.models import Chain, Transaction
+from hub20.apps.blockchain.client import get_web3
+from hub20.apps.blockchain.fields import (
+    BinaryEthereumAddressField,
+    EthereumAddressField,
+    HexField,
+    Uint256Field,
+)
+from hub20.apps.blockchain.models import Chain, Transaction, TransactionLog
+from hub20.apps.blockchain.nonces import is_nonce_error, reserve_nonce, send_raw_transaction
 
 from .app_settings import HD_WALLET_MNEMONIC, HD_WALLET_ROOT_KEY, TRANSFER_GAS_LIMIT
+from .codec import decode_transfer_log, encode_transfer_input
+from .managers import AccountBalanceManager
 from .typing import EthereumAccount_T
 
 logger = logging.getLogger(__name__)
@@ -36,9 +42,7 @@ def get_max_fee(chain: Chain) -> EthereumTokenAmount:
 
 
 def encode_transfer_data(recipient_address, amount: EthereumTokenAmount):
-    translator = ContractTranslator(EIP20_ABI)
-    encoded_data = translator.encode_function_call("transfer", (recipient_address, amount.as_wei))
-    return f"0x{encoded_data.hex()}"
+    return encode_transfer_input(recipient_address, amount.as_wei)
 
 
 class EthereumToken(models.Model):
@@ -71,7 +75,9 @@ class EthereumToken(models.Model):
 
         return w3.eth.contract(abi=EIP20_ABI, address=self.address)
 
-    def build_transfer_transaction(self, w3: Web3, sender, recipient, amount: EthereumTokenAmount):
+    def build_transfer_transaction(
+        self, w3: Web3, sender, recipient, amount: EthereumTokenAmount, nonce: int
+    ):
 
         chain_id = int(w3.net.version)
         message = f"Web3 client is on network {chain_id}, token {self.code} is on {self.chain_id}"
@@ -79,7 +85,7 @@ class EthereumToken(models.Model):
 
         transaction_params = {
             "chainId": chain_id,
-            "nonce": w3.eth.getTransactionCount(sender),
+            "nonce": nonce,
             "gasPrice": w3.eth.generateGasPrice(),
             "gas": TRANSFER_GAS_LIMIT,
             "from": sender,
@@ -115,32 +121,6 @@ class EthereumToken(models.Model):
             logger.warning(exc)
             return None, None
 
-    def _decode_transaction(self, transaction: Transaction) -> Tuple:
-        # A transfer transaction input is 'function,address,uint256'
-        # i.e, 16 bytes + 20 bytes + 32 bytes = hex string of length 136
-        try:
-            # transaction input strings are '0x', so we they should be 138 chars long
-            assert len(transaction.data) == 138, "Not a ERC20 transfer transaction"
-            assert transaction.logs.count() == 1, "Transaction does not contain log changes"
-
-            recipient_address = to_checksum_address(transaction.data[-104:-64])
-
-            wei_transferred = int(transaction.data[-64:], 16)
-            tx_log = transaction.logs.first()
-
-            assert int(tx_log.data, 16) == wei_transferred, "Log data and tx amount do not match"
-
-            return recipient_address, self.from_wei(wei_transferred)
-        except AssertionError as exc:
-            logger.info(f"Failed to get transfer data from transaction: {exc}")
-            return None, None
-        except ValueError:
-            logger.info(f"Failed to extract transfer amounts from {transaction.hash.hex()}")
-            return None, None
-        except Exception as exc:
-            logger.exception(exc)
-            return None, None
-
     def from_wei(self, wei_amount: int) -> EthereumTokenAmount:
         value = Decimal(wei_amount) / (10 ** self.decimals)
         return EthereumTokenAmount(amount=value, currency=self)
@@ -191,14 +171,29 @@ class EthereumTokenValueModel(models.Model):
 class AbstractEthereumAccount(models.Model):
     address = EthereumAddressField(unique=True, db_index=True)
 
+    def _send(self, w3: Web3, recipient_address, transfer_amount: EthereumTokenAmount) -> str:
+        token = transfer_amount.currency
+        with reserve_nonce(w3, token.chain_id, self.address) as allocation:
+            transaction_data = token.build_transfer_transaction(
+                w3=w3,
+                sender=self.address,
+                recipient=recipient_address,
+                amount=transfer_amount,
+                nonce=allocation.nonce,
+            )
+            signed_tx = self.sign_transaction(w3=w3, transaction_data=transaction_data)
+            return send_raw_transaction(w3, allocation, signed_tx.rawTransaction)
+
     def send(self, recipient_address, transfer_amount: EthereumTokenAmount, *args, **kw) -> str:
         chain = transfer_amount.currency.chain
-        w3 = chain.get_web3()
-        transaction_data = transfer_amount.currency.build_transfer_transaction(
-            w3=w3, sender=self.address, recipient=recipient_address, amount=transfer_amount
-        )
-        signed_tx = self.sign_transaction(w3=w3, transaction_data=transaction_data)
-        return w3.eth.sendRawTransaction(signed_tx.rawTransaction)
+        w3 = get_web3(provider_url=chain.provider_url)
+        try:
+            return self._send(w3, recipient_address, transfer_amount)
+        except ValueError as exc:
+            if not is_nonce_error(exc):
+                raise
+            # Another transaction took the nonce, the retry syncs with the chain first
+            return self._send(w3, recipient_address, transfer_amount)
 
     def sign_transaction(self, w3: Web3, transaction_data, *args, **kw):
         if not hasattr(self, "private_key"):
@@ -206,10 +201,20 @@ class AbstractEthereumAccount(models.Model):
         return w3.eth.account.signTransaction(transaction_data, self.private_key)
 
     def get_balance(self, currency: EthereumToken) -> EthereumTokenAmount:
-        return EthereumTokenAmount.aggregated(self.balance_entries.all(), currency=currency)
+        balance = self.balances.filter(currency=currency).values_list("amount", flat=True)
+        return EthereumTokenAmount(amount=balance.first() or 0, currency=currency)
 
     def get_balances(self, chain: Chain) -> List[EthereumTokenAmount]:
-        return [self.get_balance(token) for token in EthereumToken.objects.filter(chain=chain)]
+        # Tokens the account never had are listed with zero, in the same query
+        tokens = EthereumToken.objects.filter(chain=chain).annotate(
+            account_balance=FilteredRelation(
+                "accountbalance", condition=Q(accountbalance__account=self)
+            )
+        ).annotate(balance=F("account_balance__amount"))
+        return [
+            EthereumTokenAmount(amount=token.balance or 0, currency=token)
+            for token in tokens.order_by("id")
+        ]
 
     @classmethod
     def select_for_transfer(cls, amount: EthereumTokenAmount) -> Optional[EthereumAccount_T]:
@@ -219,26 +224,20 @@ class AbstractEthereumAccount(models.Model):
         ETH = max_fee_amount.currency
 
         eth_required = max_fee_amount
-        token_required = EthereumTokenAmount(amount=amount.amount, currency=amount.currency)
         accounts = cls.objects.all()
 
         if amount.is_ETH:
-            token_required += eth_required
-            funded_accounts = [
-                account for account in accounts if account.get_balance(ETH) >= token_required
-            ]
+            eth_required += amount
         else:
-            funded_accounts = [
-                account
-                for account in accounts
-                if account.get_balance(token_required.currency) >= token_required
-                and account.get_balance(ETH) >= eth_required
-            ]
+            accounts = accounts.filter(
+                balances__currency=amount.currency, balances__amount__gte=amount.amount
+            )
 
-        try:
-            return random.choice(funded_accounts)
-        except IndexError:
-            return None
+        # Separate filter() calls, so that each condition is on its own balance row
+        accounts = accounts.filter(
+            balances__currency=ETH, balances__amount__gte=eth_required.amount
+        )
+        return accounts.order_by("?").first()
 
     class Meta:
         abstract = True
@@ -291,7 +290,105 @@ class AccountBalanceEntry(EthereumTokenValueModel):
     account = models.ForeignKey(
         settings.ETHEREUM_ACCOUNT_MODEL, on_delete=models.CASCADE, related_name="balance_entries"
     )
-    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE)
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, db_constraint=False)
+    # Index of the Transfer log of token deposits, one transaction may carry several of them
+    log_index = models.SmallIntegerField(null=True)
+
+    def save(self, *args, **kw):
+        is_new = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kw)
+            if is_new:
+                AccountBalance.objects.add(self.account_id, self.currency_id, self.amount)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["transaction", "log_index"],
+                condition=Q(log_index__isnull=False),
+                name="unique_token_deposit_entry",
+            ),
+            models.UniqueConstraint(
+                fields=["transaction"],
+                condition=Q(log_index__isnull=True),
+                name="unique_eth_deposit_entry",
+            ),
+        ]
+
+
+class AccountBalance(EthereumTokenValueModel):
+    """
+    Sum of the balance entries of an account for one token, kept up to
+    date as entries are added or deleted.
+    """
+
+    account = models.ForeignKey(
+        settings.ETHEREUM_ACCOUNT_MODEL, on_delete=models.CASCADE, related_name="balances"
+    )
+
+    objects = AccountBalanceManager()
+
+    class Meta:
+        unique_together = ("account", "currency")
+        index_together = (("currency", "amount"),)
+
+
+class TokenTransfer(models.Model):
+    """
+    ERC20 `Transfer` event, decoded once when its log is recorded. It
+    catches every transfer of a known token, regardless of the contract
+    call (transfer, transferFrom, multisig, etc) that made it.
+    """
+
+    log = models.OneToOneField(
+        TransactionLog,
+        on_delete=models.CASCADE,
+        related_name="token_transfer",
+        db_constraint=False,
+    )
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.CASCADE,
+        related_name="token_transfers",
+        db_constraint=False,
+    )
+    token = models.ForeignKey(EthereumToken, on_delete=models.CASCADE, related_name="transfers")
+    block_number = models.PositiveIntegerField(db_index=True)
+    from_address = BinaryEthereumAddressField()
+    to_address = BinaryEthereumAddressField()
+    amount = Uint256Field()
+
+    @property
+    def as_token_amount(self) -> EthereumTokenAmount:
+        return self.token.from_wei(self.amount)
+
+    @staticmethod
+    def decode_log(tx_log: TransactionLog) -> Optional[Tuple[str, str, int]]:
+        return decode_transfer_log(tx_log.topics, tx_log.data)
+
+    @classmethod
+    def make(cls, tx_log: TransactionLog, token: EthereumToken) -> Optional[TokenTransfer]:
+        decoded = cls.decode_log(tx_log)
+        if decoded is None:
+            return None
+
+        tx = tx_log.transaction
+        sender, recipient, wei_amount = decoded
+        token_transfer, _ = cls.objects.get_or_create(
+            log=tx_log,
+            defaults={
+                "transaction": tx,
+                "token": token,
+                "block_number": tx_log.block_number,
+                "from_address": sender,
+                "to_address": recipient,
+                "amount": wei_amount,
+            },
+        )
+        return token_transfer
+
+    class Meta:
+        index_together = (("token", "to_address"), ("token", "from_address"))
 
 
 class EthereumTokenAmount:
@@ -371,6 +468,8 @@ __all__ = [
     "KeystoreAccount",
     "HierarchicalDeterministicWallet",
     "AccountBalanceEntry",
+    "AccountBalance",
+    "TokenTransfer",
     "get_max_fee",
     "encode_transfer_data",
 ]
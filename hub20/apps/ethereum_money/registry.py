@@ -0,0 +1,108 @@
+import logging
+import threading
+from typing import Dict, FrozenSet, Optional
+
+from django.core.cache import cache
+
+from . import get_ethereum_account_model
+from .models import EthereumToken
+
+logger = logging.getLogger(__name__)
+EthereumAccount = get_ethereum_account_model()
+
+VERSION_CACHE_KEY = "ethereum_money:watched-addresses:version"
+
+
+class WatchedAddressRegistry:
+    """
+    In-memory snapshot of the ethereum accounts and of the ERC20 tokens
+    of every chain, so that checking if an address is relevant to us does
+    not need any query.
+
+    Local changes (see the handlers) drop the snapshot right away, and
+    once committed bump a version counter on the django cache. Other
+    processes compare it with the version of their snapshot on
+    `refresh`, which the block listeners call once per batch of blocks.
+    """
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self._lock = threading.Lock()
+        self._accounts_by_address: Dict[str, EthereumAccount] = {}
+        self._account_addresses: FrozenSet[str] = frozenset()
+        self._tokens_by_chain: Dict[int, Dict[str, EthereumToken]] = {}
+        self._token_addresses_by_chain: Dict[int, FrozenSet[str]] = {}
+
+    def _load(self, version: int):
+        accounts = EthereumAccount.objects.all()
+        accounts_by_address = {account.address: account for account in accounts}
+
+        tokens_by_chain: Dict[int, Dict[str, EthereumToken]] = {}
+        for token in EthereumToken.ERC20tokens.select_related("chain"):
+            tokens_by_chain.setdefault(token.chain_id, {})[token.address] = token
+
+        self._accounts_by_address = accounts_by_address
+        self._account_addresses = frozenset(accounts_by_address)
+        self._tokens_by_chain = tokens_by_chain
+        self._token_addresses_by_chain = {
+            chain_id: frozenset(tokens) for chain_id, tokens in tokens_by_chain.items()
+        }
+        self.version = version
+        logger.debug(f"Watched addresses loaded (version {version})")
+
+    def _ensure_loaded(self):
+        if self.version is None:
+            self.refresh()
+
+    def refresh(self):
+        """
+        Loads the snapshot again if accounts or tokens were changed (by
+        any process) since it was taken. Costs one cache lookup.
+        """
+        with self._lock:
+            current_version = cache.get_or_set(VERSION_CACHE_KEY, 0, timeout=None)
+            if current_version != self.version:
+                self._load(current_version)
+
+    def reset(self):
+        """
+        Drops the snapshot of this process only, it is loaded again (with
+        whatever the current transaction can see) on next use.
+        """
+        with self._lock:
+            self.version = None
+
+    def invalidate(self):
+        with self._lock:
+            try:
+                cache.incr(VERSION_CACHE_KEY)
+            except ValueError:
+                cache.set(VERSION_CACHE_KEY, 1, timeout=None)
+            self.version = None
+
+    @property
+    def accounts_by_address(self) -> Dict[str, EthereumAccount]:
+        self._ensure_loaded()
+        return self._accounts_by_address
+
+    @property
+    def account_addresses(self) -> FrozenSet[str]:
+        self._ensure_loaded()
+        return self._account_addresses
+
+    def get_account(self, address: Optional[str]) -> Optional[EthereumAccount]:
+        return self.accounts_by_address.get(address)
+
+    def get_tokens_by_address(self, chain_id: int) -> Dict[str, EthereumToken]:
+        self._ensure_loaded()
+        return self._tokens_by_chain.get(chain_id, {})
+
+    def get_token_addresses(self, chain_id: int) -> FrozenSet[str]:
+        self._ensure_loaded()
+        return self._token_addresses_by_chain.get(chain_id, frozenset())
+
+
+watched_addresses = WatchedAddressRegistry()
+
+
+__all__ = ["WatchedAddressRegistry", "watched_addresses"]
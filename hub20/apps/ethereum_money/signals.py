@@ -1,6 +1,6 @@
 from django.dispatch import Signal
 
-account_deposit_received = Signal(providing_args=["account", "transaction", "amount"])
+account_deposit_received = Signal(providing_args=["account", "transaction", "amount", "log_index"])
 incoming_transfer_broadcast = Signal(providing_args=["account", "amount", "transaction_hash"])
 incoming_transfer_mined = Signal(providing_args=["account", "transaction", "amount"])
 outgoing_transfer_broadcast = Signal(providing_args=["account", "amount", "transaction_hash"])
@@ -1 +1,2 @@
+from .test_client import *  # noqa
 from .test_views import *  # noqa
@@ -1,5 +1,6 @@
 from eth_utils import to_wei
 
+from hub20.apps.blockchain.constants import ERC20_721_TRANSFER_TOPIC
 from hub20.apps.blockchain.factories import TransactionFactory
 from hub20.apps.blockchain.models import Chain
 from hub20.apps.ethereum_money import get_ethereum_account_model
@@ -21,6 +22,12 @@ def add_token_to_account(account: EthereumAccount, amount: EthereumTokenAmount,
         to_address=amount.currency.address,
         data=transaction_data,
         value=0,
+        log__address=amount.currency.address,
         log__data=amount.as_hex,
+        log__topics=[
+            ERC20_721_TRANSFER_TOPIC,
+            "0x" + "0" * 64,
+            account.address.replace("0x", "0x000000000000000000000000"),
+        ],
         block__chain=chain,
     )
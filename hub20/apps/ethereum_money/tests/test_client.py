@@ -0,0 +1,354 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from django.test import TestCase, TransactionTestCase
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.datastructures import AttributeDict
+from web3.providers import HTTPProvider
+
+from hub20.apps.blockchain import client as blockchain_client
+from hub20.apps.blockchain.async_provider import AsyncHTTPProvider
+from hub20.apps.blockchain.factories import SyncedChainFactory
+from hub20.apps.blockchain.models import ListenerCursor, Transaction
+from hub20.apps.blockchain.tests.base import JSONRPCServer
+
+from .. import client
+from ..client import (
+    ACCOUNT_TRANSACTIONS_CURSOR,
+    LATEST_TRANSFERS_CURSOR,
+    TOKEN_TRANSFERS_CURSOR,
+    catch_up_latest_transfers,
+    download_all_account_transactions,
+    follow_token_transfer_logs,
+    listen_token_transfers,
+    scan_account_transactions,
+)
+from ..factories import EthereumAccountFactory
+
+TOKENS = frozenset({"0x" + "11" * 20})
+OTHER_ADDRESS = "0x" + "22" * 20
+
+
+def make_log(block_number: int, removed: bool = False):
+    return AttributeDict(
+        {
+            "blockNumber": block_number,
+            "blockHash": HexBytes(bytes([block_number]) * 32),
+            "removed": removed,
+        }
+    )
+
+
+def make_block_data(block_number: int):
+    return AttributeDict({"number": block_number, "hash": HexBytes(bytes([block_number]) * 32)})
+
+
+def make_log_stream(*logs):
+    async def log_stream(provider, filter_params, poll_interval):
+        for log_data in logs:
+            yield log_data
+
+    return log_stream
+
+
+class StopListener(Exception):
+    pass
+
+
+@pytest.mark.django_db(transaction=True)
+class TokenTransferListenerTestCase(TransactionTestCase):
+    def setUp(self):
+        self.chain = SyncedChainFactory()
+        self.sweep = AsyncMock()
+        self.record = AsyncMock(return_value=1)
+        patchers = [
+            patch.object(client, "sweep_token_transfers", self.sweep),
+            patch.object(client, "record_token_transfer_logs", self.record),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def follow(self, *logs):
+        with patch.object(client.async_provider, "log_stream", make_log_stream(*logs)):
+            asyncio.run(follow_token_transfer_logs(Mock(), Mock(), self.chain.id, TOKENS))
+
+    def test_logs_are_recorded_as_they_come(self):
+        self.follow(make_log(10), make_log(10), make_log(11, removed=True), make_log(12))
+
+        # Removed logs are from blocks that were reorganized away
+        self.assertEqual(self.record.await_count, 3)
+        # Blocks missed before the stream started are swept once
+        self.sweep.assert_awaited_once()
+
+    def test_cursor_moves_only_past_blocks_with_every_log_seen(self):
+        self.follow(make_log(10), make_log(10))
+        self.assertFalse(ListenerCursor.objects.filter(name=TOKEN_TRANSFERS_CURSOR).exists())
+
+        self.follow(make_log(10), make_log(12), make_log(12))
+        cursor = ListenerCursor.objects.get(chain=self.chain, name=TOKEN_TRANSFERS_CURSOR)
+        self.assertEqual(cursor.block_number, 10)
+        self.assertEqual(HexBytes(cursor.block_hash), make_log(10).blockHash)
+
+    def test_stream_is_renewed_when_tracked_tokens_change(self):
+        new_tokens = TOKENS | {"0x" + "22" * 20}
+        followed = []
+
+        async def follow(w3, provider, chain_id, token_addresses):
+            followed.append(token_addresses)
+            await asyncio.sleep(3600)
+
+        def get_token_addresses(chain_id):
+            # Tokens change once the first stream runs, and we stop once the second one does
+            if len(followed) == 2:
+                raise StopListener()
+            return new_tokens if followed else TOKENS
+
+        provider = Mock(close=AsyncMock())
+        with patch.object(client, "follow_token_transfer_logs", follow), patch.object(
+            client, "BLOCK_CREATION_INTERVAL", 0.01
+        ), patch.object(
+            client.async_provider, "make_async_provider", return_value=provider
+        ), patch.object(
+            client.async_provider, "get_chain_id", AsyncMock(return_value=self.chain.id)
+        ), patch.object(
+            client.watched_addresses, "get_token_addresses", get_token_addresses
+        ):
+            with self.assertRaises(StopListener):
+                asyncio.run(listen_token_transfers(Mock()))
+
+        self.assertEqual(followed, [TOKENS, new_tokens])
+        self.assertEqual(self.sweep.await_count, 2)
+        provider.close.assert_awaited_once()
+
+
+class LatestTransfersCatchUpTestCase(TestCase):
+    def setUp(self):
+        self.chain = SyncedChainFactory()
+        self.w3 = Mock()
+        self.w3.eth.getBlock.side_effect = make_block_data
+        self.processed = []
+
+        patchers = [
+            patch.object(blockchain_client, "RPC_BATCH_SIZE", 3),
+            patch.object(
+                client,
+                "get_blocks_by_number",
+                lambda w3, numbers: [make_block_data(number) for number in numbers],
+            ),
+            patch.object(client, "process_transfer_blocks", self.process_transfer_blocks),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def process_transfer_blocks(self, w3, chain, blocks):
+        if any(block_data.number == 17 for block_data in blocks):
+            raise ConnectionError("node went away")
+        self.processed.extend(block_data.number for block_data in blocks)
+
+    def get_cursor(self):
+        return ListenerCursor.objects.get(chain=self.chain, name=LATEST_TRANSFERS_CURSOR)
+
+    def test_listeners_without_cursor_do_not_catch_up(self):
+        catch_up_latest_transfers(self.w3, self.chain, 20)
+
+        self.assertEqual(self.processed, [])
+        self.assertFalse(ListenerCursor.objects.exists())
+
+    def test_blocks_since_the_cursor_are_processed(self):
+        ListenerCursor.objects.move_to(
+            self.chain.id, LATEST_TRANSFERS_CURSOR, 10, make_block_data(10).hash
+        )
+
+        catch_up_latest_transfers(self.w3, self.chain, 15)
+
+        self.assertEqual(self.processed, [11, 12, 13, 14, 15])
+        self.assertEqual(self.get_cursor().block_number, 15)
+        self.assertEqual(HexBytes(self.get_cursor().block_hash), make_block_data(15).hash)
+
+    def test_cursor_is_kept_at_the_last_processed_batch_on_failure(self):
+        ListenerCursor.objects.move_to(
+            self.chain.id, LATEST_TRANSFERS_CURSOR, 10, make_block_data(10).hash
+        )
+
+        with self.assertRaises(ConnectionError):
+            catch_up_latest_transfers(self.w3, self.chain, 20)
+
+        self.assertEqual(self.processed, [11, 12, 13, 14, 15, 16])
+        self.assertEqual(self.get_cursor().block_number, 16)
+
+        # On restart, it picks up from there
+        self.assertEqual(
+            blockchain_client.get_catch_up_ranges(
+                self.w3, self.chain.id, LATEST_TRANSFERS_CURSOR, 20
+            ),
+            [(17, 20), (20, 21)],
+        )
+
+
+class FakeChain:
+    """
+    Node data for a chain where `transfers` maps block numbers to the
+    (sender, recipient) of their only transaction besides the one
+    between other addresses that every block has.
+    """
+
+    def __init__(self, chain_id: int, total_blocks: int, transfers: dict):
+        self.chain_id = chain_id
+        self.total_blocks = total_blocks
+        self.transfers = transfers
+
+    @staticmethod
+    def get_block_hash(block_number: int) -> str:
+        return "0x" + f"{block_number + 1:064x}"
+
+    def get_transactions(self, block_number: int):
+        parties = [(OTHER_ADDRESS, OTHER_ADDRESS)] + (
+            [self.transfers[block_number]] if block_number in self.transfers else []
+        )
+        return [
+            {
+                "hash": "0x" + f"{block_number:032x}{index:032x}",
+                "blockHash": self.get_block_hash(block_number),
+                "blockNumber": hex(block_number),
+                "transactionIndex": hex(index),
+                "from": sender,
+                "to": recipient,
+                "value": hex(10**18),
+                "gas": "0x5208",
+                "gasPrice": "0x1",
+                "nonce": hex(block_number),
+                "input": "0x",
+            }
+            for index, (sender, recipient) in enumerate(parties)
+        ]
+
+    def get_block(self, number: str, full_transactions: bool):
+        block_number = int(number, 16)
+        return {
+            "number": number,
+            "hash": self.get_block_hash(block_number),
+            "parentHash": self.get_block_hash(block_number - 1),
+            "timestamp": hex(1600000000 + block_number),
+            "uncles": [],
+            "transactions": self.get_transactions(block_number),
+        }
+
+    def get_receipt(self, tx_hash: str):
+        tx_data = next(
+            tx for tx in self.get_transactions(int(tx_hash[2:34], 16)) if tx["hash"] == tx_hash
+        )
+        return {
+            "transactionHash": tx_hash,
+            "blockHash": tx_data["blockHash"],
+            "blockNumber": tx_data["blockNumber"],
+            "transactionIndex": tx_data["transactionIndex"],
+            "from": tx_data["from"],
+            "to": tx_data["to"],
+            "gasUsed": "0x5208",
+            "status": "0x1",
+            "logs": [],
+        }
+
+    def make_node(self) -> JSONRPCServer:
+        return JSONRPCServer(
+            {
+                "net_version": lambda: str(self.chain_id),
+                "eth_blockNumber": lambda: hex(self.total_blocks - 1),
+                "eth_getBlockByNumber": self.get_block,
+                "eth_getTransactionReceipt": self.get_receipt,
+            }
+        ).start()
+
+
+@pytest.mark.django_db(transaction=True)
+class AccountTransactionScanTestCase(TransactionTestCase):
+    def setUp(self):
+        self.chain = SyncedChainFactory()
+        self.account = EthereumAccountFactory()
+        self.other_account = EthereumAccountFactory()
+        self.fake_chain = FakeChain(
+            self.chain.id,
+            total_blocks=20,
+            transfers={
+                3: (OTHER_ADDRESS, self.account.address),
+                8: (self.other_account.address, OTHER_ADDRESS),
+                15: (self.account.address, self.other_account.address),
+            },
+        )
+        self.node = self.fake_chain.make_node()
+        self.addCleanup(self.node.stop)
+
+    def get_recorded_blocks(self):
+        return sorted(Transaction.objects.values_list("block__number", flat=True))
+
+    def get_fetched_blocks(self):
+        return sorted(
+            int(request["params"][0], 16)
+            for request in self.node.requests
+            if request["method"] == "eth_getBlockByNumber"
+        )
+
+    def scan(self, starting_block: int, end_block: int, **kw) -> int:
+        async def run():
+            provider = AsyncHTTPProvider(self.node.uri)
+            try:
+                addresses = frozenset({self.account.address, self.other_account.address})
+                return await scan_account_transactions(
+                    provider, self.chain.id, addresses, starting_block, end_block, **kw
+                )
+            finally:
+                await provider.close()
+
+        return asyncio.run(run())
+
+    def download(self, start=None):
+        w3 = Web3(HTTPProvider(self.node.uri))
+        with patch.object(client, "BLOCK_SCAN_RANGE", 8):
+            asyncio.run(download_all_account_transactions(w3, start=start))
+
+    def test_transactions_of_all_accounts_are_recorded(self):
+        with patch.object(client.async_provider, "RPC_BATCH_SIZE", 4):
+            recorded = self.scan(0, 20, concurrency=2)
+
+        self.assertEqual(recorded, 3)
+        self.assertEqual(self.get_recorded_blocks(), [3, 8, 15])
+        # Every block is fetched once, no matter how many accounts are watched
+        self.assertEqual(self.get_fetched_blocks(), list(range(20)))
+        self.assertEqual(self.node.count("eth_getTransactionReceipt"), 3)
+
+    def test_scans_are_idempotent(self):
+        self.scan(0, 10)
+        self.assertEqual(self.scan(0, 10), 0)
+        self.assertEqual(self.get_recorded_blocks(), [3, 8])
+
+    def test_downloads_resume_from_where_the_previous_one_stopped(self):
+        self.download()
+
+        self.assertEqual(self.get_recorded_blocks(), [3, 8, 15])
+        cursor = ListenerCursor.objects.get(chain=self.chain, name=ACCOUNT_TRANSACTIONS_CURSOR)
+        self.assertEqual(cursor.block_number, 19)
+
+        self.fake_chain.total_blocks = 25
+        self.fake_chain.transfers[22] = (OTHER_ADDRESS, self.other_account.address)
+        self.node.requests.clear()
+        self.download()
+
+        self.assertEqual(self.get_recorded_blocks(), [3, 8, 15, 22])
+        # The block of the cursor is only checked to still be on the chain
+        self.assertEqual(self.get_fetched_blocks(), [19] + list(range(20, 25)) + [24])
+
+    def test_downloads_can_start_from_a_given_block(self):
+        self.download(start=10)
+
+        self.assertEqual(self.get_recorded_blocks(), [15])
+
+
+__all__ = [
+    "TokenTransferListenerTestCase",
+    "LatestTransfersCatchUpTestCase",
+    "AccountTransactionScanTestCase",
+]
@@ -0,0 +1,77 @@
+import random
+
+from django.test import SimpleTestCase
+from eth_utils import to_checksum_address
+from ethereum.abi import ContractTranslator
+from ethtoken.abi import EIP20_ABI
+from web3 import Web3
+
+from ..codec import decode_transfer_input, decode_transfer_log, encode_transfer_input
+from ..management.commands.benchmark_erc20_codec import make_input_corpus, make_log_corpus
+
+
+class CodecTestCase(SimpleTestCase):
+    def setUp(self):
+        self.random = random.Random(20)
+        self.contract = Web3().eth.contract(abi=EIP20_ABI, address=f"0x{'11' * 20}")
+
+    def _make_address(self):
+        return to_checksum_address(self.random.getrandbits(160).to_bytes(20, "big"))
+
+    def test_encoding_matches_abi(self):
+        translator = ContractTranslator(EIP20_ABI)
+        for _ in range(100):
+            address = self._make_address()
+            amount = self.random.getrandbits(self.random.randint(1, 256))
+            encoded = translator.encode_function_call("transfer", (address, amount))
+            self.assertEqual(encode_transfer_input(address, amount), f"0x{encoded.hex()}")
+
+    def test_transfer_round_trip(self):
+        address = self._make_address()
+        transfer = decode_transfer_input(encode_transfer_input(address, 10**18))
+        self.assertEqual(transfer, (None, address, 10**18))
+
+    def test_calldata_decoding_matches_abi(self):
+        for data in make_input_corpus(self.random, 1000):
+            try:
+                fn, args = self.contract.decode_function_input(data)
+            except Exception:
+                fn = None
+
+            transfer = decode_transfer_input(data)
+            if fn is not None and fn.fn_name == "transfer":
+                self.assertEqual(transfer, (None, args["_to"], args["_value"]))
+            elif fn is not None and fn.fn_name == "transferFrom":
+                self.assertEqual(transfer, (args["_from"], args["_to"], args["_value"]))
+            else:
+                self.assertIsNone(transfer)
+
+    def test_log_decoding_matches_abi(self):
+        transfer_event = self.contract.events.Transfer()
+        for log_data in make_log_corpus(self.random, 1000):
+            try:
+                event = transfer_event.processLog(
+                    {
+                        "topics": log_data["topics"],
+                        "data": f"0x{log_data['data'].hex()}",
+                        "address": self.contract.address,
+                        "logIndex": 0,
+                        "transactionIndex": 0,
+                        "transactionHash": b"",
+                        "blockHash": b"",
+                        "blockNumber": 0,
+                    }
+                )
+            except Exception:
+                event = None
+
+            transfer = decode_transfer_log(log_data["topics"], log_data["data"])
+            if event is None:
+                self.assertIsNone(transfer)
+            else:
+                self.assertEqual(
+                    transfer, (event.args["_from"], event.args["_to"], event.args["_value"])
+                )
+
+
+__all__ = ["CodecTestCase"]
@@ -1,13 +1,19 @@
 from decimal import Decimal
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import pytest
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
 from eth_utils import is_checksum_address
+from hexbytes import HexBytes
+from web3 import Web3
+
+from hub20.apps.blockchain.factories import SyncedChainFactory, TransactionLogFactory
+from hub20.apps.blockchain.models import NonceAllocation
 
 from .. import get_ethereum_account_model
 from ..factories import Erc20TokenFactory, EthereumAccountFactory, ETHFactory
-from ..models import EthereumTokenAmount
+from ..models import AccountBalance, EthereumTokenAmount, TokenTransfer
 from .base import add_eth_to_account, add_token_to_account
 
 EthereumAccount = get_ethereum_account_model()
@@ -42,4 +48,142 @@ class EthereumAccountTestCase(BaseTestCase):
         self.assertIsNone(EthereumAccount.select_for_transfer(2 * fee_amount))
 
 
-__all__ = ["EthereumAccountTestCase"]
+class AccountBalanceTestCase(BaseTestCase):
+    def setUp(self):
+        self.account = EthereumAccountFactory()
+        self.ETH = ETHFactory()
+        self.amount = EthereumTokenAmount(amount=Decimal("1.5"), currency=self.ETH)
+
+    def test_deposits_are_added_to_balance(self):
+        add_eth_to_account(self.account, self.amount, self.ETH.chain)
+        add_eth_to_account(self.account, self.amount, self.ETH.chain)
+
+        self.assertEqual(self.account.get_balance(self.ETH), self.amount * 2)
+        self.assertEqual(AccountBalance.objects.filter(account=self.account).count(), 1)
+
+    def test_deleted_entries_are_taken_from_balance(self):
+        tx = add_eth_to_account(self.account, self.amount, self.ETH.chain)
+        add_eth_to_account(self.account, self.amount, self.ETH.chain)
+
+        # Balance entries are deleted in cascade with their transaction
+        tx.delete()
+        self.assertEqual(self.account.get_balance(self.ETH), self.amount)
+
+    def test_account_with_balance_can_be_deleted(self):
+        add_eth_to_account(self.account, self.amount, self.ETH.chain)
+        account_id = self.account.id
+
+        self.account.delete()
+        connection.check_constraints()
+        self.assertFalse(AccountBalance.objects.filter(account_id=account_id).exists())
+
+    def test_token_transfers_in_one_transaction_are_each_deposited(self):
+        token = Erc20TokenFactory(chain=self.ETH.chain)
+        amount = EthereumTokenAmount(amount=Decimal("2"), currency=token)
+        tx = add_token_to_account(self.account, amount, self.ETH.chain)
+        first_log = tx.logs.get()
+        TransactionLogFactory(
+            transaction=tx,
+            address=first_log.address,
+            topics=first_log.topics,
+            data=first_log.data,
+        )
+
+        self.assertEqual(self.account.balance_entries.filter(transaction=tx).count(), 2)
+        self.assertEqual(self.account.get_balance(token), amount * 2)
+
+    def test_balances_list_every_token_of_chain_in_one_query(self):
+        token = Erc20TokenFactory(chain=self.ETH.chain)
+        Erc20TokenFactory(
+            chain=SyncedChainFactory(
+                id=self.ETH.chain_id + 1, provider_url="https://other.example.com"
+            )
+        )
+        add_eth_to_account(self.account, self.amount, self.ETH.chain)
+
+        with self.assertNumQueries(1):
+            balances = self.account.get_balances(self.ETH.chain)
+
+        self.assertEqual(balances, [self.amount, EthereumTokenAmount(amount=0, currency=token)])
+
+
+class TokenTransferTestCase(BaseTestCase):
+    def setUp(self):
+        self.token = Erc20TokenFactory()
+        self.account = EthereumAccountFactory()
+        self.amount = EthereumTokenAmount(amount=Decimal("3"), currency=self.token)
+
+    def test_transfer_logs_of_known_tokens_are_recorded(self):
+        tx = add_token_to_account(self.account, self.amount, self.token.chain)
+
+        token_transfer = TokenTransfer.objects.get(transaction=tx)
+        self.assertEqual(token_transfer.token, self.token)
+        self.assertEqual(token_transfer.to_address, self.account.address)
+        self.assertEqual(token_transfer.as_token_amount, self.amount)
+
+    def test_logs_of_unknown_contracts_are_skipped_without_token_query(self):
+        tx = add_token_to_account(self.account, self.amount, self.token.chain)
+        tx_log = tx.logs.get()
+
+        # Only the insert of the log itself hits the database
+        with self.assertNumQueries(1):
+            TransactionLogFactory(
+                transaction=tx,
+                block_number=tx.block_number,
+                address=Web3.toChecksumAddress("0x" + "1" * 40),
+                topics=tx_log.topics,
+                data=tx_log.data,
+            )
+        self.assertEqual(TokenTransfer.objects.filter(transaction=tx).count(), 1)
+
+
+@pytest.mark.django_db(transaction=True)
+class AccountSendTestCase(TransactionTestCase):
+    # Nonces are allocated in their own transactions, so these can not run inside one
+    def setUp(self):
+        self.account = EthereumAccountFactory()
+        self.ETH = ETHFactory()
+        self.amount = EthereumTokenAmount(amount=Decimal("0.1"), currency=self.ETH)
+        self.recipient = EthereumAccountFactory().address
+        self.raw_transaction = b"signed transaction"
+
+        self.w3 = Mock()
+        self.w3.net.version = str(self.ETH.chain_id)
+        self.w3.eth.generateGasPrice.return_value = 10**9
+        self.w3.eth.getTransactionCount.return_value = 0
+
+    def send(self):
+        signed = Mock(rawTransaction=self.raw_transaction)
+        with patch("hub20.apps.ethereum_money.models.get_web3", return_value=self.w3):
+            with patch.object(EthereumAccount, "sign_transaction", return_value=signed):
+                return self.account.send(self.recipient, self.amount)
+
+    def test_transactions_already_known_to_node_are_not_sent_again(self):
+        self.w3.eth.sendRawTransaction.side_effect = ValueError(
+            {"code": -32000, "message": "already known"}
+        )
+
+        tx_hash = self.send()
+
+        self.assertEqual(tx_hash, Web3.keccak(self.raw_transaction))
+        self.assertEqual(self.w3.eth.sendRawTransaction.call_count, 1)
+        allocation = NonceAllocation.objects.get()
+        self.assertEqual(HexBytes(allocation.transaction_hash), tx_hash)
+
+    def test_taken_nonces_are_retried_with_next_nonce(self):
+        tx_hash = HexBytes("0x" + "ab" * 32)
+        self.w3.eth.sendRawTransaction.side_effect = [
+            ValueError({"code": -32000, "message": "nonce too low"}),
+            tx_hash,
+        ]
+
+        self.assertEqual(self.send(), tx_hash)
+        self.assertEqual(self.w3.eth.sendRawTransaction.call_count, 2)
+
+
+__all__ = [
+    "EthereumAccountTestCase",
+    "AccountBalanceTestCase",
+    "TokenTransferTestCase",
+    "AccountSendTestCase",
+]
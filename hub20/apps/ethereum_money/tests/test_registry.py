@@ -0,0 +1,69 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from hub20.apps.blockchain.models import Block
+from hub20.apps.blockchain.signals import block_batch_started
+
+from ..factories import Erc20TokenFactory, EthereumAccountFactory
+from ..registry import WatchedAddressRegistry, watched_addresses
+
+
+class WatchedAddressRegistryTestCase(TestCase):
+    def setUp(self):
+        self.account = EthereumAccountFactory()
+        self.token = Erc20TokenFactory()
+
+    def test_registry_sees_accounts_and_tokens_created_in_transaction(self):
+        self.assertEqual(watched_addresses.get_account(self.account.address), self.account)
+        self.assertIn(
+            self.token.address, watched_addresses.get_token_addresses(self.token.chain_id)
+        )
+
+        account = EthereumAccountFactory()
+        token = Erc20TokenFactory(chain=self.token.chain)
+        self.assertEqual(watched_addresses.get_account(account.address), account)
+        self.assertIn(token.address, watched_addresses.get_token_addresses(token.chain_id))
+
+    def test_registry_drops_deleted_accounts_and_tokens(self):
+        self.assertIn(self.account.address, watched_addresses.account_addresses)
+
+        address = self.account.address
+        self.account.delete()
+        self.assertIsNone(watched_addresses.get_account(address))
+
+        token_address = self.token.address
+        self.token.delete()
+        self.assertNotIn(token_address, watched_addresses.get_token_addresses(self.token.chain_id))
+
+    def test_other_processes_reload_on_refresh_after_invalidation(self):
+        # Registries of other processes only share the version on the cache
+        registry = WatchedAddressRegistry()
+        self.assertIn(self.account.address, registry.account_addresses)
+
+        with patch.object(WatchedAddressRegistry, "reset"):
+            account = EthereumAccountFactory()
+
+        self.assertNotIn(account.address, registry.account_addresses)
+
+        watched_addresses.invalidate()
+        self.assertNotIn(account.address, registry.account_addresses)
+
+        registry.refresh()
+        self.assertIn(account.address, registry.account_addresses)
+
+    def test_lookups_do_not_check_the_version(self):
+        watched_addresses.refresh()
+
+        with patch("hub20.apps.ethereum_money.registry.cache") as cache:
+            watched_addresses.get_account(self.account.address)
+            watched_addresses.get_token_addresses(self.token.chain_id)
+        cache.get_or_set.assert_not_called()
+
+    def test_registry_is_refreshed_once_per_block_batch(self):
+        with patch.object(watched_addresses, "refresh") as refresh:
+            block_batch_started.send(sender=Block, chain_id=self.token.chain_id, block_numbers=[1])
+        refresh.assert_called_once_with()
+
+
+__all__ = ["WatchedAddressRegistryTestCase"]
@@ -0,0 +1,20 @@
+# Generated by Django 3.0.7 on 2026-10-17 13:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0005_partition_ready_constraints'),
+        ('raiden', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tokennetworkchannelevent',
+            name='transaction',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='blockchain.Transaction'),
+        ),
+    ]
@@ -92,7 +92,7 @@ class TokenNetworkChannel(models.Model):
     @property
     def events(self):
         return self.tokennetworkchannelevent_set.order_by(
-            "transaction__block__number", "transaction__index"
+            "transaction__block_number", "transaction__index"
         )
 
 
@@ -115,7 +115,7 @@ class TokenNetworkChannelStatus(StatusModel):
 
 class TokenNetworkChannelEvent(models.Model):
     channel = models.ForeignKey(TokenNetworkChannel, on_delete=models.CASCADE)
-    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE)
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, db_constraint=False)
     name = models.CharField(max_length=32, db_index=True)
 
     class Meta: